@@ -9,4 +9,7 @@ pip install -r requirements.txt
 python manage.py collectstatic --no-input
 
 # Apply database migrations
-python manage.py migrate
\ No newline at end of file
+python manage.py migrate
+
+# Create the shared cache table (a no-op with REDIS_URL)
+python manage.py createcachetable
\ No newline at end of file
@@ -197,4 +197,121 @@ else:
 SITE_NAME = "BuildKit"
 
 # Default primary key field type
-DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
\ No newline at end of file
+DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+# Top-rated products leaderboard (see store/leaderboard.py)
+TOP_RATED_LIMIT = 3
+TOP_RATED_PRIOR_WEIGHT = 5
+TOP_RATED_CACHE_TIMEOUT = 60 * 60
+
+# Keyset pagination for product_list; also enabled per request with ?cursor=
+PRODUCT_LIST_CURSOR_PAGINATION = False
+APPROXIMATE_COUNT_CACHE_TIMEOUT = 5 * 60
+
+# Facet counts for catalog filtering (see store/facets.py)
+FACET_CACHE_TIMEOUT = 10 * 60
+
+# Rendered catalog fragments (see store/fragment_cache.py)
+FRAGMENT_CACHE_TIMEOUT = 60 * 60
+
+# The cache shared by every web process and management command: generation
+# tokens, cache metrics and the cached catalog data (see store/invalidation.py)
+# only work if a bump made by one process is seen by all the others, so the
+# default cache is never a per-process LocMemCache. Production should set
+# REDIS_URL. Without it, entries live in the database table created by
+# `manage.py createcachetable`, which puts fragment reads and metric flushes
+# on the primary database; `manage.py check --deploy` warns about that
+REDIS_URL = config('REDIS_URL', default='')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'store_cache',
+            'OPTIONS': {'MAX_ENTRIES': 50000},
+        }
+    }
+# Each process keeps the generation tokens it has read for TIMEOUT seconds,
+# so cache lookups do not read them from the shared cache every time; a
+# bump reaches the other processes within that time
+CACHES['generations'] = {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    'LOCATION': 'store-generations',
+    'TIMEOUT': 5,
+}
+
+# Generational cache invalidation and metrics (see store/invalidation.py)
+CACHE_INVALIDATION_BULK_THRESHOLD = 500
+CACHE_METRICS_FLUSH_EVERY = 50
+CACHE_METRICS_FLUSH_INTERVAL = 60
+
+# 'session' keeps every cart in the session; 'database' stores signed-in
+# users' carts as CartItem rows and merges the session cart on login
+CART_BACKEND = 'session'
+
+# Most lines accepted by one bulk add-to-cart request (see cart/bulk.py)
+CART_BULK_MAX_LINES = 200
+
+# Daily sales rollups (see store/reports.py): how far each run re-reads
+# before the last watermark, and how many days are rebuilt per transaction
+SALES_ROLLUP_OVERLAP_MINUTES = 10
+SALES_ROLLUP_DAYS_PER_BATCH = 31
+
+# Rows fetched per round trip by the streaming exports (see store/exports.py)
+EXPORT_CHUNK_SIZE = 2000
+
+# Duplicates repointed per UPDATE/DELETE by cleanup_duplicates (see store/dedupe.py)
+DEDUPE_BATCH_SIZE = 1000
+
+# Responsive image URLs memoized per process (see store/images.py)
+IMAGE_URL_CACHE_SIZE = 4096
+
+# Image placeholders (see store/placeholders.py): where originals are read
+# from, how many are processed at once, and whether saving a new image
+# computes its placeholder in the background. LocalSource reads
+# IMAGE_SOURCE_ROOT/<public_id>.<format> for working without Cloudinary.
+IMAGE_SOURCE = config('IMAGE_SOURCE', default='store.placeholders.CloudinarySource')
+IMAGE_SOURCE_ROOT = config('IMAGE_SOURCE_ROOT', default=str(BASE_DIR / 'media'))
+IMAGE_PLACEHOLDER_WORKERS = 4
+IMAGE_PLACEHOLDERS_ON_UPLOAD = config('IMAGE_PLACEHOLDERS_ON_UPLOAD', default=True, cast=bool)
+
+# Background jobs (see store/jobs.py): 'store.jobs.DatabaseBackend' queues
+# them for `manage.py run_jobs` or the cron below; 'store.jobs.ThreadBackend'
+# runs them in the web process for development without a worker
+JOB_BACKEND = config('JOB_BACKEND', default='store.jobs.DatabaseBackend')
+JOB_THREAD_WORKERS = 4
+JOB_BATCH_SIZE = 10
+JOB_LEASE_SECONDS = 300
+JOB_RETRY_DELAY = 30
+JOB_RETRY_MAX_DELAY = 3600
+JOB_POLL_SECONDS = 2
+JOB_RETENTION_DAYS = 14
+
+# Vercel runs no worker process: the cron in vercel.json calls /jobs/run/
+# every minute with `Authorization: Bearer <CRON_SECRET>` (Vercel sends the
+# project's CRON_SECRET), running at most JOB_CRON_LIMIT due jobs per call.
+# The endpoint is closed while CRON_SECRET is unset
+JOB_CRON_SECRET = config('CRON_SECRET', default='')
+JOB_CRON_LIMIT = 20
+
+# Where order events such as order_placed are delivered (see store/events.py).
+# The admin feed is always on; staff email and the webhook are enabled by
+# setting their environment variables
+ORDER_NOTIFY_EMAILS = config('ORDER_NOTIFY_EMAILS', default='', cast=Csv())
+ORDER_WEBHOOK_URL = config('ORDER_WEBHOOK_URL', default='')
+ORDER_EVENT_SINKS = {
+    'feed': {'BACKEND': 'store.events.AdminFeedSink'},
+}
+if ORDER_NOTIFY_EMAILS:
+    ORDER_EVENT_SINKS['staff_email'] = {'BACKEND': 'store.events.StaffEmailSink', 'RECIPIENTS': ORDER_NOTIFY_EMAILS}
+if ORDER_WEBHOOK_URL:
+    ORDER_EVENT_SINKS['webhook'] = {
+        'BACKEND': 'store.events.WebhookSink',
+        'URL': ORDER_WEBHOOK_URL,
+        'SECRET': config('ORDER_WEBHOOK_SECRET', default=''),
+    }
@@ -0,0 +1,147 @@
+"""
+Adding many products to the cart in one request.
+
+Lines arrive as JSON (``[{"product": 12, "quantity": 4}, ...]``, where
+``product`` may be an id or a slug) or as pasted CSV text with one
+``product, quantity`` pair per line. Every line is resolved with a single
+product query, stock is checked against what is already in the cart, and
+the accepted lines are written with one ``Cart.add_many()`` call. Each line
+gets its own result so the caller can show exactly what was rejected.
+"""
+import csv
+import io
+from django.conf import settings
+from django.db.models import Q
+from store.models import Product
+
+# Column names a pasted header row may use; any other first row is data
+PRODUCT_HEADERS = {'product', 'product_id', 'id', 'slug', 'sku', 'item', 'name'}
+QUANTITY_HEADERS = {'quantity', 'qty', 'count', 'amount'}
+
+
+class BulkCartError(ValueError):
+    """The request as a whole could not be read"""
+
+
+def _max_lines():
+    return getattr(settings, 'CART_BULK_MAX_LINES', 200)
+
+
+def _check_size(lines):
+    if not lines:
+        raise BulkCartError('No lines to add.')
+    if len(lines) > _max_lines():
+        raise BulkCartError(f'At most {_max_lines()} lines can be added at once.')
+    return lines
+
+
+def lines_from_json(payload):
+    """Accept a list of {product, quantity} objects or [product, quantity] pairs"""
+    if isinstance(payload, dict):
+        payload = payload.get('items')
+    if not isinstance(payload, list):
+        raise BulkCartError('Expected a list of items.')
+    lines = []
+    for entry in payload:
+        if isinstance(entry, dict):
+            lines.append((entry.get('product', entry.get('product_id', entry.get('slug'))), entry.get('quantity', 1)))
+        elif isinstance(entry, (list, tuple)) and len(entry) == 2:
+            lines.append(tuple(entry))
+        else:
+            lines.append((entry, None))
+    return _check_size(lines)
+
+
+def lines_from_text(text):
+    """Parse pasted ``product, quantity`` rows (comma, semicolon or tab separated)"""
+    sample = text[:1024]
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+    except csv.Error:
+        dialect = csv.excel
+    lines = []
+    for row in csv.reader(io.StringIO(text), dialect):
+        cells = [cell.strip() for cell in row if cell.strip()]
+        if not cells:
+            continue
+        if not lines and _is_header(cells):
+            # Header row such as "product,quantity"
+            continue
+        if len(cells) == 1:
+            cells.append('1')
+        lines.append((cells[0], cells[1]))
+    return _check_size(lines)
+
+
+def _is_header(cells):
+    names = [cell.lower().replace(' ', '_') for cell in cells]
+    return names[0] in PRODUCT_HEADERS and all(name in QUANTITY_HEADERS for name in names[1:2])
+
+
+def _parse_quantity(value):
+    try:
+        quantity = int(str(value).strip())
+    except (TypeError, ValueError):
+        return None
+    return quantity if quantity >= 1 else None
+
+
+def _product_id(reference):
+    """The id a reference names, or None for slugs (and digits such as "²")"""
+    return int(reference) if reference.isascii() and reference.isdigit() else None
+
+
+def add_lines(cart, lines, override_quantity=False):
+    """Validate ``lines`` in bulk, add the valid ones and return per-line results"""
+    ids, slugs = set(), set()
+    for reference, _ in lines:
+        reference = str(reference if reference is not None else '').strip()
+        product_id = _product_id(reference)
+        if product_id is not None:
+            ids.add(product_id)
+        elif reference:
+            slugs.add(reference)
+
+    products = Product.objects.filter(Q(id__in=ids) | Q(slug__in=slugs)).only(
+        'id', 'slug', 'name', 'price', 'stock', 'available'
+    )
+    by_id = {product.id: product for product in products}
+    by_slug = {product.slug: product for product in by_id.values()}
+
+    in_cart = {int(product_id): line['quantity'] for product_id, line in cart.cart.items()}
+    requested = {}
+    results = []
+    for number, (reference, raw_quantity) in enumerate(lines, start=1):
+        reference = str(reference if reference is not None else '').strip()
+        result = {'line': number, 'product': reference, 'status': 'error'}
+        results.append(result)
+
+        product_id = _product_id(reference)
+        product = by_id.get(product_id) if product_id is not None else by_slug.get(reference)
+        quantity = _parse_quantity(raw_quantity)
+        if product is None:
+            result['error'] = 'Unknown product.'
+            continue
+        result.update({'product_id': product.id, 'name': product.name})
+        if quantity is None:
+            result['error'] = 'Quantity must be a whole number of at least 1.'
+            continue
+        if not product.available:
+            result['error'] = 'This product is no longer available.'
+            continue
+
+        already = requested.get(product.id, 0 if override_quantity else in_cart.get(product.id, 0))
+        if already + quantity > product.stock:
+            result['error'] = f'Only {product.stock} in stock.'
+            result['available_stock'] = product.stock
+            continue
+        requested[product.id] = already + quantity
+        result.update({'status': 'added', 'quantity': quantity})
+
+    accepted = [(by_id[product_id], quantity) for product_id, quantity in requested.items()]
+    if accepted:
+        cart.add_many(accepted, override_quantity=True)
+    for result in results:
+        if result['status'] == 'added':
+            result['in_cart'] = requested[result['product_id']]
+    return results
@@ -1,30 +1,56 @@
 from decimal import Decimal
 from django.conf import settings
+from django.db import transaction
 from store.models import Product
+from .models import Cart as SavedCart, CartItem
+
+
+def get_cart(request):
+    """Return the cart backend for this request (see CART_BACKEND)"""
+    if getattr(settings, 'CART_BACKEND', 'session') == 'database' and request.user.is_authenticated:
+        return DatabaseCart(request)
+    return Cart(request)
+
 
 class Cart:
+    # Columns the cart, checkout and order pages read from each product
+    PRODUCT_FIELDS = (
+        'id', 'name', 'slug', 'image', 'price', 'stock', 'available',
+        'image_width', 'image_height', 'image_color', 'image_placeholder',
+        'category__id', 'category__name', 'category__slug',
+    )
+
     def __init__(self, request):
         self.session = request.session
-        cart = self.session.get(settings.CART_SESSION_ID)
-        if not cart:
-            cart = self.session[settings.CART_SESSION_ID] = {}
-        self.cart = cart
+        # Not written back until something is added, so merely reading the
+        # cart never marks the session as modified
+        self.cart = self.session.get(settings.CART_SESSION_ID) or {}
+        self._items = None
 
     def add(self, product, quantity=1, override_quantity=False):
         product_id = str(product.id)
         if product_id not in self.cart:
             self.cart[product_id] = {'quantity': 0, 'price': str(product.price)}
-        
+
         if override_quantity:
             self.cart[product_id]['quantity'] = quantity
         else:
             self.cart[product_id]['quantity'] += quantity
-        
+
+        self.save()
+
+    def add_many(self, lines, override_quantity=False):
+        """Add several (product, quantity) pairs with a single write"""
+        for product, quantity in lines:
+            product_id = str(product.id)
+            line = self.cart.setdefault(product_id, {'quantity': 0, 'price': str(product.price)})
+            line['quantity'] = quantity if override_quantity else line['quantity'] + quantity
         self.save()
 
     def save(self):
         self.session[settings.CART_SESSION_ID] = self.cart
         self.session.modified = True
+        self._items = None
 
     def remove(self, product):
         product_id = str(product.id)
@@ -32,18 +58,25 @@ class Cart:
             del self.cart[product_id]
             self.save()
 
+    def _line_items(self):
+        """Hydrate the session lines with their products, once per request"""
+        if self._items is None:
+            products = Product.objects.filter(id__in=self.cart.keys()).select_related(
+                'category'
+            ).only(*self.PRODUCT_FIELDS).in_bulk()
+            self._items = []
+            for product_id, line in self.cart.items():
+                # Copies, so products and Decimals never end up in the session
+                item = {'quantity': line['quantity'], 'price': Decimal(line['price'])}
+                product = products.get(int(product_id))
+                if product is not None:
+                    item['product'] = product
+                item['total_price'] = item['price'] * item['quantity']
+                self._items.append(item)
+        return self._items
+
     def __iter__(self):
-        product_ids = self.cart.keys()
-        products = Product.objects.filter(id__in=product_ids)
-        cart = self.cart.copy()
-        
-        for product in products:
-            cart[str(product.id)]['product'] = product
-        
-        for item in cart.values():
-            item['price'] = Decimal(item['price'])
-            item['total_price'] = item['price'] * item['quantity']
-            yield item
+        return iter(self._line_items())
 
     def __len__(self):
         return sum(item['quantity'] for item in self.cart.values())
@@ -52,5 +85,119 @@ class Cart:
         return sum(Decimal(item['price']) * item['quantity'] for item in self.cart.values())
 
     def clear(self):
-        del self.session[settings.CART_SESSION_ID]
-        self.save()
\ No newline at end of file
+        self.session.pop(settings.CART_SESSION_ID, None)
+        self.cart = {}
+        self._items = None
+        self.session.modified = True
+
+
+class DatabaseCart(Cart):
+    """
+    Same API, stored as CartItem rows so a signed-in user's cart follows
+    them across devices and the session stays small. ``cart`` is the same
+    {product_id: {'quantity', 'price'}} mapping the session cart exposes,
+    loaded with one query when first read.
+    """
+
+    def __init__(self, request, user=None):
+        self.session = request.session
+        self.user = user or request.user
+        self._cart_id = None
+        self._lines = None
+        self._items = None
+
+    def _items_queryset(self):
+        return CartItem.objects.filter(cart__user=self.user)
+
+    def _get_cart_id(self):
+        if self._cart_id is None:
+            self._cart_id = SavedCart.objects.get_or_create(user=self.user)[0].pk
+        return self._cart_id
+
+    @property
+    def cart(self):
+        if self._lines is None:
+            self._lines = {
+                str(product_id): {'quantity': quantity, 'price': str(price)}
+                for product_id, quantity, price in self._items_queryset().values_list(
+                    'product_id', 'quantity', 'price'
+                )
+            }
+        return self._lines
+
+    def save(self):
+        self._lines = None
+        self._items = None
+
+    def add(self, product, quantity=1, override_quantity=False):
+        self.add_many([(product, quantity)], override_quantity)
+
+    def add_many(self, lines, override_quantity=False):
+        self.merge_lines(
+            {product.id: (quantity, product.price) for product, quantity in lines},
+            override_quantity
+        )
+
+    def merge_lines(self, lines, override_quantity=False):
+        """Upsert {product_id: (quantity, price)} with one bulk_create and one bulk_update"""
+        if not lines:
+            return
+        cart_id = self._get_cart_id()
+        with transaction.atomic():
+            existing = CartItem.objects.select_for_update().filter(
+                cart_id=cart_id, product_id__in=lines.keys()
+            ).only('id', 'product_id', 'quantity')
+            changed = []
+            for item in existing:
+                quantity, _ = lines.pop(item.product_id)
+                item.quantity = quantity if override_quantity else item.quantity + quantity
+                changed.append(item)
+            CartItem.objects.bulk_update(changed, ['quantity'])
+            CartItem.objects.bulk_create([
+                CartItem(cart_id=cart_id, product_id=product_id, quantity=quantity, price=price)
+                for product_id, (quantity, price) in lines.items()
+            ])
+        self.save()
+
+    def remove(self, product):
+        self._items_queryset().filter(product_id=product.id).delete()
+        self.save()
+
+    def _line_items(self):
+        if self._items is None:
+            product_fields = [f'product__{field}' for field in self.PRODUCT_FIELDS]
+            rows = self._items_queryset().select_related('product__category').only(
+                'quantity', 'price', 'product_id', *product_fields
+            ).order_by('id')
+            self._items = [
+                {
+                    'product': row.product,
+                    'quantity': row.quantity,
+                    'price': row.price,
+                    'total_price': row.price * row.quantity,
+                }
+                for row in rows
+            ]
+        return self._items
+
+    def get_total_price(self):
+        return self._items_queryset().totals()[1]
+
+    def clear(self):
+        self._items_queryset().delete()
+        self.session.pop(settings.CART_SESSION_ID, None)
+        self.save()
+
+
+def merge_session_cart(request, user):
+    """Move the anonymous session cart into ``user``'s database cart"""
+    lines = request.session.get(settings.CART_SESSION_ID)
+    if not lines:
+        return
+    live_ids = set(Product.objects.filter(id__in=lines.keys()).values_list('id', flat=True))
+    DatabaseCart(request, user).merge_lines({
+        int(product_id): (line['quantity'], Decimal(line['price']))
+        for product_id, line in lines.items()
+        if int(product_id) in live_ids
+    })
+    request.session.pop(settings.CART_SESSION_ID, None)
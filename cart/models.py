@@ -1,3 +1,46 @@
+from decimal import Decimal
+from django.contrib.auth.models import User
 from django.db import models
+from django.db.models import DecimalField, ExpressionWrapper, F, Sum
+from django.db.models.functions import Coalesce
+from store.models import Product
 
-# Create your models here.
+
+class Cart(models.Model):
+    """Persistent cart of a signed-in user (used when CART_BACKEND = 'database')"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='saved_cart')
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'Cart of {self.user}'
+
+
+class CartItemQuerySet(models.QuerySet):
+    def totals(self):
+        """Return (item count, total price) in one aggregate query"""
+        totals = self.aggregate(
+            count=Coalesce(Sum('quantity'), 0),
+            total=Coalesce(
+                Sum(ExpressionWrapper(F('price') * F('quantity'), output_field=DecimalField(max_digits=12, decimal_places=2))),
+                Decimal('0.00'),
+                output_field=DecimalField(max_digits=12, decimal_places=2)
+            ),
+        )
+        return totals['count'], totals['total']
+
+
+class CartItem(models.Model):
+    cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name='items')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='cart_items')
+    quantity = models.PositiveIntegerField(default=1)
+    # Unit price when the product was added, as the session cart keeps it
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+
+    objects = CartItemQuerySet.as_manager()
+
+    class Meta:
+        unique_together = ['cart', 'product']
+
+    def __str__(self):
+        return f'{self.quantity} x {self.product_id} (cart {self.cart_id})'
@@ -0,0 +1,12 @@
+from django.conf import settings
+from django.contrib.auth.signals import user_logged_in
+from django.dispatch import receiver
+from .cart import merge_session_cart
+
+
+@receiver(user_logged_in)
+def merge_cart_on_login(sender, request, user, **kwargs):
+    """Carry an anonymous session cart over into the user's saved cart"""
+    if request is None or getattr(settings, 'CART_BACKEND', 'session') != 'database':
+        return
+    merge_session_cart(request, user)
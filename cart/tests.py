@@ -1,3 +1,183 @@
-from django.test import TestCase
+import json
+from decimal import Decimal
+from importlib import import_module
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from store.models import Category
+from store.tests import make_product
+from . import bulk
+from .cart import Cart
+from .models import Cart as SavedCart, CartItem
+from .context_processors import cart as cart_context
 
-# Create your tests here.
+
+class LazyCartTests(TestCase):
+    def setUp(self):
+        tools = Category.objects.create(name='Tools', slug='tools')
+        self.drill = make_product(tools, 'Drill', price=Decimal('80.00'))
+        self.saw = make_product(tools, 'Saw', price=Decimal('45.50'))
+
+    def request(self):
+        request = RequestFactory().get('/')
+        request.session = import_module(settings.SESSION_ENGINE).SessionStore()
+        request.user = AnonymousUser()
+        return request
+
+    def test_unused_cart_costs_no_queries(self):
+        request = self.request()
+        with self.assertNumQueries(0):
+            context = cart_context(request)
+        self.assertIn('cart', context)
+        self.assertFalse(request.session.accessed)
+
+    def test_reading_does_not_modify_the_session(self):
+        request = self.request()
+        cart = cart_context(request)['cart']
+        with self.assertNumQueries(0):
+            self.assertEqual((len(cart), cart.get_total_price()), (0, 0))
+        self.assertFalse(request.session.modified)
+
+    def test_line_items_are_loaded_once_per_request(self):
+        request = self.request()
+        cart = Cart(request)
+        cart.add_many([(self.drill, 2), (self.saw, 1)])
+        with self.assertNumQueries(1):
+            items = list(cart)
+            self.assertEqual(list(cart), items)
+            self.assertEqual(cart.get_total_price(), Decimal('205.50'))
+        self.assertEqual([(item['product'].name, item['total_price']) for item in items],
+                         [('Drill', Decimal('160.00')), ('Saw', Decimal('45.50'))])
+        # Only plain values are stored in the session
+        self.assertEqual(request.session[settings.CART_SESSION_ID][str(self.drill.pk)],
+                         {'quantity': 2, 'price': '80.00'})
+
+
+@override_settings(CART_BACKEND='database')
+class DatabaseCartTests(TestCase):
+    def setUp(self):
+        tools = Category.objects.create(name='Tools', slug='tools')
+        self.drill = make_product(tools, 'Drill', price=Decimal('80.00'))
+        self.saw = make_product(tools, 'Saw', price=Decimal('45.50'))
+        self.user = User.objects.create_user('kofi', 'kofi@example.com', 'password')
+
+    def add(self, product, quantity, **extra):
+        return self.client.post(reverse('cart:cart_add', args=[product.pk]), {'quantity': quantity, **extra}, secure=True)
+
+    def lines(self):
+        return dict(CartItem.objects.filter(cart__user=self.user).values_list('product__name', 'quantity'))
+
+    def test_signed_in_cart_is_stored_as_rows(self):
+        self.client.force_login(self.user)
+        self.add(self.drill, 2)
+        self.add(self.drill, 1)
+        self.add(self.saw, 4)
+        self.add(self.saw, 1, override='True')
+        self.assertEqual(self.lines(), {'Drill': 3, 'Saw': 1})
+        self.assertNotIn(settings.CART_SESSION_ID, self.client.session)
+
+        response = self.client.get(reverse('cart:cart_detail'), secure=True)
+        cart = response.context['cart']
+        self.assertEqual((len(cart), cart.get_total_price()), (4, Decimal('285.50')))
+
+        self.client.post(reverse('cart:cart_remove', args=[self.drill.pk]), secure=True)
+        self.assertEqual(self.lines(), {'Saw': 1})
+
+    def test_session_cart_is_merged_on_login(self):
+        SavedCart.objects.create(user=self.user).items.create(product=self.drill, quantity=1, price=Decimal('80.00'))
+        self.add(self.drill, 2)
+        self.add(self.saw, 1)
+        retired = make_product(self.drill.category, 'Retired')
+        self.add(retired, 1)
+        retired.delete()
+        self.assertEqual(CartItem.objects.count(), 1)
+
+        self.client.login(username='kofi', password='password')
+        self.assertEqual(self.lines(), {'Drill': 3, 'Saw': 1})
+        self.assertNotIn(settings.CART_SESSION_ID, self.client.session)
+
+    @override_settings(CART_BACKEND='session')
+    def test_session_backend_keeps_the_cart_in_the_session(self):
+        self.add(self.drill, 2)
+        self.client.login(username='kofi', password='password')
+        self.assertFalse(CartItem.objects.exists())
+        self.assertEqual(self.client.session[settings.CART_SESSION_ID][str(self.drill.pk)]['quantity'], 2)
+
+
+class BulkAddTests(TestCase):
+    def setUp(self):
+        tools = Category.objects.create(name='Tools', slug='tools')
+        self.drill = make_product(tools, 'Drill', price=Decimal('80.00'), stock=5)
+        self.saw = make_product(tools, 'Saw', price=Decimal('45.50'))
+        make_product(tools, 'Retired', available=False)
+
+    def post_json(self, payload):
+        return self.client.post(
+            reverse('cart:cart_add_many'), json.dumps(payload), content_type='application/json', secure=True
+        )
+
+    def test_valid_lines_are_added_and_bad_ones_reported(self):
+        response = self.post_json({'items': [
+            {'product': self.drill.pk, 'quantity': 2},
+            {'product': 'saw', 'quantity': '3'},
+            {'product': 'no-such-thing', 'quantity': 1},
+            {'product': 'saw', 'quantity': 0},
+            {'product': 'retired', 'quantity': 1},
+            [self.drill.pk, 4],
+            {'slug': 'drill'},
+        ]})
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual((body['success'], body['added'], body['failed']), (False, 3, 4))
+        self.assertEqual((body['cart_total_items'], body['cart_total_price']), (6, '376.50'))
+        self.assertEqual([line.get('error', line['status']) for line in body['lines']], [
+            'added', 'added', 'Unknown product.', 'Quantity must be a whole number of at least 1.',
+            'This product is no longer available.', 'Only 5 in stock.', 'added',
+        ])
+        # Lines for one product add up, and stock is checked against the total
+        self.assertEqual([line.get('in_cart') for line in body['lines'] if line['status'] == 'added'], [3, 3, 3])
+
+    def test_request_errors(self):
+        self.assertEqual(self.post_json({'items': []}).json()['error'], 'No lines to add.')
+        self.assertEqual(self.post_json({'items': 'drill'}).status_code, 400)
+        with self.settings(CART_BULK_MAX_LINES=1):
+            self.assertEqual(self.post_json([['drill', 1], ['saw', 1]]).status_code, 400)
+        response = self.client.post(
+            reverse('cart:cart_add_many'), 'not json', content_type='application/json', secure=True
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_non_ascii_digits_are_looked_up_as_slugs(self):
+        body = self.post_json([['²', 1], ['٣', 1]]).json()
+        self.assertEqual([line['error'] for line in body['lines']], ['Unknown product.', 'Unknown product.'])
+
+    def test_pasted_lines_report_each_bad_row(self):
+        response = self.client.post(reverse('cart:cart_add_many'), {
+            'lines': f'saw, two\n{self.drill.pk}, 2\nunknown, 1\n',
+        }, secure=True, follow=True)
+        errors = [str(message) for message in response.context['messages'] if message.level_tag == 'error']
+        self.assertEqual(errors, [
+            'Line 1 (saw): Quantity must be a whole number of at least 1.',
+            'Line 3 (unknown): Unknown product.',
+        ])
+        self.assertEqual(self.client.session[settings.CART_SESSION_ID],
+                         {str(self.drill.pk): {'quantity': 2, 'price': '80.00'}})
+
+
+class BulkLinesTests(TestCase):
+    def test_known_header_row_is_skipped(self):
+        self.assertEqual(
+            bulk.lines_from_text('Product,Qty\nSKU123,4\ncement-bag\n'),
+            [('SKU123', '4'), ('cement-bag', '1')]
+        )
+
+    def test_first_row_with_a_bad_quantity_is_kept_as_a_line(self):
+        self.assertEqual(
+            bulk.lines_from_text('SKU123, two\nSKU124, 3\n'),
+            [('SKU123', 'two'), ('SKU124', '3')]
+        )
+
+    def test_empty_text_is_rejected(self):
+        with self.assertRaises(bulk.BulkCartError):
+            bulk.lines_from_text('product,quantity\n')
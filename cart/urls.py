@@ -4,6 +4,7 @@ from . import views
 app_name = 'cart'
 urlpatterns = [
     path('add/<int:product_id>/', views.cart_add, name='cart_add'),
+    path('add-many/', views.cart_add_many, name='cart_add_many'),
     path('remove/<int:product_id>/', views.cart_remove, name='cart_remove'),
     path('', views.cart_detail, name='cart_detail'),
     path('calculate-delivery/', views.calculate_delivery, name='calculate_delivery'),
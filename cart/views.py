@@ -1,19 +1,27 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.views.decorators.http import require_POST
 from django.http import JsonResponse
-from store.models import Product,Order, OrderItem
-from .cart import Cart
+from django.contrib import messages
+import json
+import logging
+from store.models import Product
+from store import events
+from store.orders import OrderPlacementError, place_order
+from .cart import get_cart
+from . import bulk
 from .forms import CartAddProductForm, DeliveryCalculatorForm
 from urllib.parse import quote
 from django.contrib.auth.models import User
 from store.models import UserProfile
-from decimal import Decimal
+from decimal import Decimal, InvalidOperation
 from django.conf import settings
 
+logger = logging.getLogger(__name__)
+
 
 @require_POST
 def cart_add(request, product_id):
-    cart = Cart(request)
+    cart = get_cart(request)
     product = get_object_or_404(Product, id=product_id)
     form = CartAddProductForm(request.POST)
     print(f"POST data for product {product_id}: {request.POST}")  # Debugging
@@ -33,16 +41,61 @@ def cart_add(request, product_id):
             return JsonResponse({'success': False, 'error': form.errors.as_json()}, status=400)
     return redirect('cart:cart_detail')
 
+@require_POST
+def cart_add_many(request):
+    """Add many (product id or slug, quantity) lines in one request
+
+    Accepts a JSON body (a list of {"product", "quantity"} objects, or
+    {"items": [...], "override": true}) or a form post with a pasted
+    ``lines`` CSV. JSON callers get per-line results back.
+    """
+    wants_json = request.content_type == 'application/json'
+    try:
+        if wants_json:
+            payload = json.loads(request.body or b'null')
+            override = isinstance(payload, dict) and bool(payload.get('override'))
+            lines = bulk.lines_from_json(payload)
+        else:
+            override = request.POST.get('override') in ('1', 'true', 'on')
+            lines = bulk.lines_from_text(request.POST.get('lines', ''))
+    except (ValueError, bulk.BulkCartError) as e:
+        if wants_json:
+            return JsonResponse({'success': False, 'error': str(e)}, status=400)
+        messages.error(request, str(e))
+        return redirect('cart:cart_detail')
+
+    cart = get_cart(request)
+    results = bulk.add_lines(cart, lines, override_quantity=override)
+    added = sum(1 for result in results if result['status'] == 'added')
+    failed = len(results) - added
+
+    if wants_json or request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        return JsonResponse({
+            'success': failed == 0,
+            'added': added,
+            'failed': failed,
+            'cart_total_items': len(cart),
+            'cart_total_price': str(cart.get_total_price()),
+            'lines': results,
+        }, status=200 if added or not failed else 400)
+
+    if added:
+        messages.success(request, f'Added {added} line{"s" if added != 1 else ""} to your cart.')
+    for result in results:
+        if result['status'] == 'error':
+            messages.error(request, f"Line {result['line']} ({result['product'] or 'blank'}): {result['error']}")
+    return redirect('cart:cart_detail')
+
 @require_POST
 def cart_remove(request, product_id):
-    cart = Cart(request)
+    cart = get_cart(request)
     product = get_object_or_404(Product, id=product_id)
     cart.remove(product)
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
         return JsonResponse({'success': True})
     return redirect('cart:cart_detail')
 def checkout(request):
-    cart = Cart(request)
+    cart = get_cart(request)
     if not cart:
         return redirect('cart:cart_detail')
 
@@ -88,7 +141,7 @@ def checkout(request):
     return render(request, 'cart/checkout.html', context)
 
 def cart_detail(request):
-    cart = Cart(request)
+    cart = get_cart(request)
     
     for item in cart:
         item['update_quantity_form'] = CartAddProductForm(initial={
@@ -114,7 +167,7 @@ def cart_detail(request):
 
 @require_POST
 def calculate_delivery(request):
-    cart = Cart(request)
+    cart = get_cart(request)
     
     form = DeliveryCalculatorForm(request.POST, user_is_authenticated=request.user.is_authenticated)
     if not form.is_valid():
@@ -142,7 +195,6 @@ def calculate_delivery(request):
     return redirect('cart:cart_detail')
     
 def checkout_whatsapp(request):
-    from decimal import Decimal
     from urllib.parse import quote
     from django.shortcuts import redirect
     from django.conf import settings
@@ -151,7 +203,7 @@ def checkout_whatsapp(request):
     
     # Initialize cart
     try:
-        cart = Cart(request)
+        cart = get_cart(request)
         print(f"Cart initialized successfully. Items: {len(cart)}")
     except Exception as e:
         print(f"Error initializing cart: {e}")
@@ -181,14 +233,10 @@ def checkout_whatsapp(request):
     delivery_method = request.session.get('delivery_method', 'free')
     
     # Handle delivery_cost more carefully
-    delivery_cost_raw = request.session.get('delivery_cost', 0)
     try:
-        if isinstance(delivery_cost_raw, Decimal):
-            delivery_cost = float(delivery_cost_raw)
-        else:
-            delivery_cost = float(delivery_cost_raw)
-    except (ValueError, TypeError):
-        delivery_cost = 0.0
+        delivery_cost = Decimal(str(request.session.get('delivery_cost', 0)))
+    except InvalidOperation:
+        delivery_cost = Decimal('0.00')
 
     # Validate required fields
     required_fields = {
@@ -206,9 +254,10 @@ def checkout_whatsapp(request):
 
     print("All validations passed, creating order...")
     
-    # Create order
+    # Create the order, its items and the stock reservation in one transaction
     try:
-        order = Order.objects.create(
+        order = place_order(
+            [(product_id, line['quantity'], line['price']) for product_id, line in cart.cart.items()],
             user=request.user if request.user.is_authenticated else None,
             first_name=first_name,
             last_name=last_name,
@@ -219,79 +268,22 @@ def checkout_whatsapp(request):
             city=city,
             postal_code=postal_code,
             delivery_method=delivery_method,
-            delivery_cost=Decimal(str(delivery_cost)),
+            delivery_cost=delivery_cost,
             paid=False,
             status='pending'
         )
         print(f"Order created: #{order.id}")
-    except Exception as e:
-        print(f"Error creating order: {e}")
+    except OrderPlacementError as e:
+        logger.warning("Order not placed: %s", e)
+        for failure in e.failures:
+            messages.error(request, failure['error'])
         return redirect('cart:cart_detail')
-
-    # Create order items
-    try:
-        for item in cart:
-            item_price = item['price']
-            if not isinstance(item_price, Decimal):
-                item_price = Decimal(str(item_price))
-                
-            OrderItem.objects.create(
-                order=order,
-                product=item['product'],
-                price=item_price,
-                quantity=item['quantity']
-            )
-        print("Order items created successfully")
     except Exception as e:
-        print(f"Error creating order items: {e}")
-        order.delete()
+        print(f"Error creating order: {e}")
         return redirect('cart:cart_detail')
 
-    # Build invoice message - Convert all Decimals to basic types
-    message_parts = []
-    message_parts.append(f"Order Invoice #{int(order.id)}")
-    message_parts.append("")
-    message_parts.append("--- Customer Details ---")
-    message_parts.append(f"Name: {str(first_name)} {str(last_name)}")
-    message_parts.append(f"Email: {str(email)}")
-    message_parts.append(f"Phone: {str(phone_number)}")
-    message_parts.append("")
-    message_parts.append("--- Order Details ---")
-    
-    for item in cart:
-        product_name = str(item['product'].name)
-        quantity = int(item['quantity'])
-        price = float(item['price']) if isinstance(item['price'], Decimal) else float(item['price'])
-        total_price = float(item['total_price']) if isinstance(item['total_price'], Decimal) else float(item['total_price'])
-        
-        message_parts.append(f"Product: {product_name}")
-        message_parts.append(f"Quantity: {quantity}")
-        message_parts.append(f"Price: GH₵ {price:.2f}")
-        message_parts.append(f"Total: GH₵ {total_price:.2f}")
-        message_parts.append("")
-    
-    message_parts.append("--- Cart Totals ---")
-    
-    # Convert totals to float
-    cart_total_raw = cart.get_total_price()
-    cart_total = float(cart_total_raw) if isinstance(cart_total_raw, Decimal) else float(cart_total_raw)
-    
-    order_total_raw = order.get_total_cost()
-    order_total = float(order_total_raw) if isinstance(order_total_raw, Decimal) else float(order_total_raw)
-    
-    message_parts.append(f"Subtotal: GH₵ {cart_total:.2f}")
-    message_parts.append(f"Delivery: GH₵ {delivery_cost:.2f}")
-    message_parts.append(f"Total: GH₵ {order_total:.2f}")
-    message_parts.append("")
-    message_parts.append("--- Delivery Details ---")
-    message_parts.append(f"Region: {str(region)}")
-    message_parts.append(f"Address: {str(address)}")
-    message_parts.append(f"City: {str(city)}")
-    message_parts.append(f"Postal Code: {str(postal_code)}")
-    message_parts.append("Country: Ghana")
-    message_parts.append(f"Delivery Method: {str(delivery_method).title()}")
-    
-    message = "\n".join(message_parts)
+    # The same invoice the staff get through the order_placed event
+    message = events.invoice_text(events.order_payload(order))
 
     # CRITICAL FIX: Clear cart and all session data that might contain Decimals
     print("=== CLEARING CART AND SESSION DATA ===")
@@ -350,7 +342,7 @@ def checkout_whatsapp(request):
     
     # Verify cart is empty by creating a new cart instance
     try:
-        verification_cart = Cart(request)
+        verification_cart = get_cart(request)
         print(f"Cart verification - Items remaining: {len(verification_cart)}")
         if len(verification_cart) > 0:
             print("WARNING: Cart still contains items after clearing!")
@@ -1,11 +1,76 @@
-from django.contrib import admin
+import csv
+from django import forms
+from django.contrib import admin, messages
+from django.http import Http404, HttpResponse
+from django.template.response import TemplateResponse
+from django.urls import path
+from django.utils import timezone
 from django.utils.html import format_html
+from . import exports, inventory, pricing, reports
 from .models import (
     UserProfile, Category, Product, ProductImage, 
-    Testimonial, Order, OrderItem, TechnicalSpecification, SpecificationGroup
+    Testimonial, Order, OrderItem, TechnicalSpecification, SpecificationGroup,
+    DailySalesRollup, PriceAdjustment, PriceHistory, StockMovement, LowStockProduct, Job, StaffNotification
 )
 
 
+def export_action(name, fmt):
+    """Admin action streaming the selected rows (see store/exports.py)"""
+    def action(modeladmin, request, queryset):
+        return exports.streaming_response(name, fmt, queryset)
+    action.__name__ = f'export_{fmt}'
+    action.short_description = f'Export selected {name} as {"CSV" if fmt == "csv" else "JSON Lines"}'
+    return action
+
+
+class PriceChangeForm(forms.Form):
+    kind = forms.ChoiceField(choices=PriceAdjustment.KINDS)
+    value = forms.DecimalField(
+        max_digits=10, decimal_places=2,
+        help_text="Percent (10 = +10%) or cedis added to each price; negative values lower prices"
+    )
+    description = forms.CharField(max_length=200, required=False)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if cleaned_data.get('kind') == 'percent' and cleaned_data.get('value', 0) <= -100:
+            raise forms.ValidationError('A percentage cut must be smaller than 100%')
+        return cleaned_data
+
+
+def adjust_prices(modeladmin, request, queryset):
+    """Reprice the selection (or, with "select all", the filtered catalog) in one UPDATE"""
+    form = PriceChangeForm(request.POST if 'apply' in request.POST else None)
+    if form.is_valid():
+        data = form.cleaned_data
+        now = timezone.now()
+        adjustment = PriceAdjustment.objects.create(
+            description=data['description'] or f'{queryset.count()} selected products',
+            kind=data['kind'],
+            value=data['value'],
+            effective_at=now,
+            status='applied',
+            applied_at=now,
+            created_by=request.user,
+        )
+        changed = pricing.adjust_prices(queryset, data['kind'], data['value'], now, adjustment)
+        adjustment.products_changed = changed
+        adjustment.save(update_fields=['products_changed'])
+        modeladmin.message_user(request, f"Repriced {changed} products ({adjustment})", messages.SUCCESS)
+        return None
+    return TemplateResponse(request, 'admin/store/product/adjust_prices.html', {
+        **modeladmin.admin_site.each_context(request),
+        'title': 'Adjust prices',
+        'opts': modeladmin.model._meta,
+        'form': form,
+        'queryset': queryset,
+        'count': queryset.count(),
+        'select_across': request.POST.get('select_across') == '1',
+        'action_checkbox_name': admin.helpers.ACTION_CHECKBOX_NAME,
+    })
+adjust_prices.short_description = 'Adjust prices of selected products'
+
+
 class TechnicalSpecificationInline(admin.TabularInline):
     model = TechnicalSpecification
     extra = 1
@@ -42,19 +107,20 @@ class ProductAdmin(admin.ModelAdmin):
     ]
     list_filter = [
         'category', 'available', 'has_technical_specs', 
-        'product_type', 'featured'
+        'product_type', 'featured', 'supplier'
     ]
-    search_fields = ['name', 'description']
+    search_fields = ['name', 'description', 'supplier_sku']
     prepopulated_fields = {'slug': ('name',)}
     inlines = [TechnicalSpecificationInline, ProductImageInline]
     readonly_fields = ['has_technical_specs']
+    actions = [adjust_prices, export_action('products', 'csv'), export_action('products', 'jsonl')]
     
     fieldsets = (
         ('Basic Information', {
             'fields': ('name', 'slug', 'description', 'category', 'product_type')
         }),
         ('Pricing & Inventory', {
-            'fields': ('price', 'apply_price_increase', 'stock', 'available')
+            'fields': ('price', 'stock', 'reorder_level', 'available')
         }),
         ('Media', {
             'fields': ('image', 'featured')
@@ -63,8 +129,24 @@ class ProductAdmin(admin.ModelAdmin):
             'fields': ('has_technical_specs', 'technical_data_sheet'),
             'classes': ('collapse',)
         }),
+        ('Supplier', {
+            'fields': ('supplier', 'supplier_sku'),
+            'classes': ('collapse',)
+        }),
     )
 
+    def get_readonly_fields(self, request, obj=None):
+        if obj is None:
+            return self.readonly_fields
+        # Stock moves only through the ledger: add a stock movement instead
+        return list(self.readonly_fields) + ['stock']
+
+    def save_model(self, request, obj, form, change):
+        if change and form.changed_data:
+            # Make the next supplier sync compare this product field by field
+            obj.supplier_hash = ''
+        super().save_model(request, obj, form, change)
+
     def technical_data_link(self, obj):
         if obj.technical_data_sheet:
             return format_html(
@@ -100,7 +182,7 @@ class ProductImageAdmin(admin.ModelAdmin):
         if obj.image:
             return format_html(
                 '<img src="{}" style="width: 50px; height: 50px; object-fit: cover;" />',
-                obj.image.url
+                obj.image_url('admin')
             )
         return "No Image"
     image_preview.short_description = 'Preview'
@@ -112,6 +194,7 @@ class TestimonialAdmin(admin.ModelAdmin):
     list_filter = ['rating', 'approved', 'featured', 'created']
     search_fields = ['product__name', 'reviewer_name', 'content']
     list_editable = ['approved', 'featured']
+    actions = [export_action('testimonials', 'csv'), export_action('testimonials', 'jsonl')]
 
 
 class OrderItemInline(admin.TabularInline):
@@ -124,16 +207,19 @@ class OrderItemInline(admin.TabularInline):
 class OrderAdmin(admin.ModelAdmin):
     list_display = [
         'id', 'full_name', 'email', 'phone_number', 
-        'get_total_cost', 'paid', 'status', 'created'
+        'items_count', 'get_total_cost', 'paid', 'status', 'created'
     ]
     list_filter = ['paid', 'status', 'created', 'delivery_method']
     search_fields = ['first_name', 'last_name', 'email', 'phone_number']
     inlines = [OrderItemInline]
-    readonly_fields = ['created', 'updated']
+    readonly_fields = ['created', 'updated', 'items_subtotal', 'items_count', 'grand_total']
+    actions = [export_action('orders', 'csv'), export_action('orders', 'jsonl')]
     
     def get_total_cost(self, obj):
-        return f"₵{obj.get_total_cost():.2f}"
+        # Stored total, so the changelist needs no per-row queries
+        return f"₵{obj.grand_total:.2f}"
     get_total_cost.short_description = 'Total Cost'
+    get_total_cost.admin_order_field = 'grand_total'
 
 
 @admin.register(OrderItem)
@@ -144,4 +230,225 @@ class OrderItemAdmin(admin.ModelAdmin):
     
     def get_cost(self, obj):
         return f"₵{obj.get_cost():.2f}"
-    get_cost.short_description = 'Total Cost'
\ No newline at end of file
+    get_cost.short_description = 'Total Cost'
+
+
+@admin.register(DailySalesRollup)
+class DailySalesRollupAdmin(admin.ModelAdmin):
+    """Read-only sales report over the rollups (refreshed by manage.py rollup_sales)"""
+    list_display = ['day', 'region', 'category', 'product', 'order_lines', 'units_sold', 'revenue']
+    list_filter = ['region', 'category', 'day']
+    list_select_related = ['category', 'product']
+    search_fields = ['product__name', 'region']
+    date_hierarchy = 'day'
+    list_per_page = 50
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_urls(self):
+        return [
+            path(
+                'export/<str:by>/',
+                self.admin_site.admin_view(self.export_csv),
+                name='store_dailysalesrollup_export'
+            ),
+        ] + super().get_urls()
+
+    def filtered_rollups(self, request):
+        """The rollups matching the changelist's current filters"""
+        return self.get_changelist_instance(request).get_queryset(request)
+
+    def changelist_view(self, request, extra_context=None):
+        response = super().changelist_view(request, extra_context)
+        if not hasattr(response, 'context_data') or 'cl' not in response.context_data:
+            return response
+        rollups = response.context_data['cl'].queryset
+        response.context_data['report'] = {
+            'totals': reports.totals(rollups),
+            'by_day': reports.with_bars(reports.summarize(rollups, 'day').reverse()[:31]),
+            'by_region': reports.with_bars(reports.summarize(rollups, 'region')[:10]),
+            'top_products': reports.with_bars(reports.summarize(rollups, 'product')[:10]),
+            'inventory': reports.with_bars(reports.inventory_summary(), 'value'),
+            'groupings': list(reports.GROUPINGS),
+        }
+        return response
+
+    def export_csv(self, request, by):
+        if by not in reports.GROUPINGS and by != 'rows':
+            raise Http404('Unknown report grouping')
+        rollups = self.filtered_rollups(request)
+        response = HttpResponse(content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="sales-by-{by}.csv"'
+        writer = csv.writer(response)
+
+        if by == 'rows':
+            writer.writerow(['day', 'region', 'category', 'product', 'order_lines', 'units_sold', 'revenue'])
+            for row in rollups.values_list(
+                'day', 'region', 'category__name', 'product__name', 'order_lines', 'units_sold', 'revenue'
+            ).order_by('day', 'region'):
+                writer.writerow(row)
+            return response
+
+        fields = reports.GROUPINGS[by]
+        writer.writerow([*fields, 'order_lines', 'units_sold', 'revenue'])
+        for row in reports.summarize(rollups, by):
+            writer.writerow([*(row[field] for field in fields), row['lines'], row['units'], row['revenue']])
+        return response
+
+
+@admin.register(PriceAdjustment)
+class PriceAdjustmentAdmin(admin.ModelAdmin):
+    """Scheduled and applied price adjustments (see store/pricing.py)"""
+    list_display = [
+        '__str__', 'kind', 'value', 'category', 'product_type', 'supplier',
+        'effective_at', 'status', 'products_changed'
+    ]
+    list_filter = ['status', 'kind', 'category', 'product_type']
+    search_fields = ['description', 'supplier']
+    readonly_fields = ['status', 'applied_at', 'products_changed', 'created_by', 'created']
+    actions = ['apply_now', 'cancel']
+
+    def has_change_permission(self, request, obj=None):
+        # Applied adjustments are history; only scheduled ones can be edited
+        return super().has_change_permission(request, obj) and (obj is None or obj.status == 'scheduled')
+
+    def save_model(self, request, obj, form, change):
+        if not change:
+            obj.created_by = request.user
+        super().save_model(request, obj, form, change)
+        if obj.effective_at <= timezone.now():
+            changed = pricing.apply_adjustment(obj)
+            self.message_user(request, f"Applied now: {changed} products repriced", messages.SUCCESS)
+
+    def apply_now(self, request, queryset):
+        changed = sum(pricing.apply_adjustment(adjustment) for adjustment in queryset.filter(status='scheduled'))
+        self.message_user(request, f"{changed} products repriced", messages.SUCCESS)
+    apply_now.short_description = 'Apply selected adjustments now'
+
+    def cancel(self, request, queryset):
+        cancelled = queryset.filter(status='scheduled').update(status='cancelled')
+        self.message_user(request, f"{cancelled} adjustments cancelled", messages.SUCCESS)
+    cancel.short_description = 'Cancel selected scheduled adjustments'
+
+
+@admin.register(PriceHistory)
+class PriceHistoryAdmin(admin.ModelAdmin):
+    list_display = ['product', 'old_price', 'new_price', 'effective_at', 'source', 'adjustment']
+    list_filter = ['source', 'effective_at', 'product__category']
+    list_select_related = ['product', 'adjustment']
+    search_fields = ['product__name', 'product__supplier_sku']
+    date_hierarchy = 'effective_at'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+class StockMovementForm(forms.ModelForm):
+    class Meta:
+        model = StockMovement
+        fields = ['product', 'kind', 'quantity', 'order', 'note']
+
+    def clean(self):
+        cleaned_data = super().clean()
+        product, quantity = cleaned_data.get('product'), cleaned_data.get('quantity')
+        if product and quantity and product.stock + quantity < 0:
+            raise forms.ValidationError(f'{product.name} has only {product.stock} units in stock')
+        return cleaned_data
+
+
+@admin.register(StockMovement)
+class StockMovementAdmin(admin.ModelAdmin):
+    """The append-only stock ledger; adding a movement applies it (see store/inventory.py)"""
+    form = StockMovementForm
+    list_display = ['created', 'product', 'kind', 'quantity', 'order', 'note', 'created_by']
+    list_filter = ['kind', 'created']
+    list_select_related = ['product', 'created_by']
+    search_fields = ['product__name', 'product__supplier_sku', 'note']
+    raw_id_fields = ['product', 'order']
+    date_hierarchy = 'created'
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_actions(self, request):
+        # Movements only go away with their product
+        actions = super().get_actions(request)
+        actions.pop('delete_selected', None)
+        return actions
+
+    def save_model(self, request, obj, form, change):
+        obj.created_by = request.user
+        inventory.apply(obj)
+
+
+@admin.register(LowStockProduct)
+class LowStockProductAdmin(admin.ModelAdmin):
+    """Products at or below their reorder level, longest waiting first"""
+    list_display = ['name', 'category', 'stock', 'reorder_level', 'low_stock_since', 'available']
+    list_editable = ['reorder_level']
+    list_filter = ['category', 'available', 'supplier']
+    list_select_related = ['category']
+    search_fields = ['name', 'supplier_sku']
+    ordering = ['low_stock_since', 'pk']
+    fields = ['name', 'stock', 'reorder_level']
+    readonly_fields = ['name', 'stock']
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).low_stock_queue()
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    """Background jobs and their outcome (see store/jobs.py)"""
+    list_display = ['__str__', 'task', 'status', 'attempts', 'max_attempts', 'run_at', 'created', 'finished_at']
+    list_filter = ['status', 'task']
+    search_fields = ['task', 'idempotency_key', 'last_error']
+    date_hierarchy = 'created'
+    readonly_fields = [field.name for field in Job._meta.fields]
+    actions = ['retry_now']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def retry_now(self, request, queryset):
+        retried = queryset.filter(status__in=['queued', 'failed']).update(
+            status='queued', attempts=0, run_at=timezone.now(), finished_at=None
+        )
+        self.message_user(request, f"{retried} jobs queued to run now", messages.SUCCESS)
+    retry_now.short_description = 'Run selected queued or failed jobs now'
+
+
+@admin.register(StaffNotification)
+class StaffNotificationAdmin(admin.ModelAdmin):
+    """Feed of order events for the staff (see store/events.py)"""
+    list_display = ['title', 'event', 'order', 'read', 'created']
+    list_filter = ['read', 'event', 'created']
+    list_select_related = ['order']
+    search_fields = ['title', 'message']
+    readonly_fields = ['event', 'order', 'title', 'message', 'created']
+    fields = readonly_fields + ['read']
+    actions = ['mark_read']
+
+    def has_add_permission(self, request):
+        return False
+
+    def mark_read(self, request, queryset):
+        marked = queryset.filter(read=False).update(read=True)
+        self.message_user(request, f"{marked} notifications marked as read", messages.SUCCESS)
+    mark_read.short_description = 'Mark selected notifications as read'
@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """The catalog caches and metrics belong in Redis, not the primary database"""
+    backend = settings.CACHES.get('default', {}).get('BACKEND', '')
+    if not backend.endswith('DatabaseCache'):
+        return []
+    return [Warning(
+        'The default cache is the database, so cached catalog fragments and cache metrics '
+        'are read and written on the primary database.',
+        hint='Set REDIS_URL to use Redis for the shared cache.',
+        id='store.W001',
+    )]
@@ -0,0 +1,279 @@
+"""
+Set-based merging of duplicate products.
+
+Products are duplicates when their names match ignoring case and surrounding
+whitespace; the oldest (lowest id) of each group survives. ``find_duplicates()``
+groups the whole catalog with one window-function query and
+``merge_duplicates()`` folds every group into its survivor with bulk
+statements over all groups at once, so the number of queries does not grow
+with the number of duplicates:
+
+* order items, cart items, testimonials, images, specifications, price
+  history and stock movements of the duplicates are repointed with ``UPDATE ... SET product_id = CASE ...``
+  (``DEDUPE_BATCH_SIZE`` duplicates per statement);
+* rows that would collide with one the survivor already has are combined
+  first: two lines of one order or cart become one line with the summed
+  quantity (at the quantity-weighted price), while a review by someone who
+  already reviewed the survivor, or a specification it already has, is
+  dropped;
+* the survivors take over the duplicates' stock (so it still matches the
+  moved ledger), their rating aggregates are recounted, the totals of
+  the orders involved are refreshed and their days of sales rollups rebuilt;
+* the duplicates are deleted with one ``DELETE`` per batch. Nothing is left
+  for it to cascade to, so order history is kept.
+
+The row deletes skip the per-row ``post_delete`` handlers; everything they
+would maintain (order totals, category counts, search vectors, cached
+pages) is refreshed in bulk at the end.
+"""
+from collections import defaultdict
+from decimal import Decimal, ROUND_HALF_UP
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, Min, Sum, Value, When, Window
+from django.db.models.functions import Lower, Trim
+from cart.models import CartItem
+from . import invalidation, reports, search
+from .models import (
+    Category, DailySalesRollup, Order, OrderItem, PriceHistory, Product, ProductImage,
+    StockMovement, TechnicalSpecification, Testimonial, average_rating,
+)
+
+CENT = Decimal('0.01')
+
+
+def _batch_size():
+    return getattr(settings, 'DEDUPE_BATCH_SIZE', 1000)
+
+
+def _batches(ids):
+    ids = sorted(ids)
+    for start in range(0, len(ids), _batch_size()):
+        yield ids[start:start + _batch_size()]
+
+
+class DuplicateGroups:
+    """Products sharing a name: ``survivor_of`` maps each duplicate to the product it merges into"""
+
+    def __init__(self, rows):
+        self.products = {row['id']: row for row in rows}
+        self.survivor_of = {row['id']: row['survivor'] for row in rows if row['id'] != row['survivor']}
+
+    def __len__(self):
+        return len(self.survivors)
+
+    @property
+    def survivors(self):
+        return set(self.survivor_of.values())
+
+    @property
+    def duplicates(self):
+        return set(self.survivor_of)
+
+    def groups(self):
+        """(survivor row, [duplicate rows]) per group, by survivor id"""
+        members = defaultdict(list)
+        for pk, survivor in sorted(self.survivor_of.items()):
+            members[survivor].append(self.products[pk])
+        return [(self.products[survivor], members[survivor]) for survivor in sorted(members)]
+
+
+def find_duplicates(queryset=None):
+    """Group ``queryset`` (default: the whole catalog) by normalized name in one query"""
+    if queryset is None:
+        queryset = Product.objects.all()
+    key = [Lower(Trim('name'))]
+    rows = queryset.annotate(
+        survivor=Window(Min('id'), partition_by=key),
+        copies=Window(Count('id'), partition_by=key),
+    ).filter(copies__gt=1).values(
+        'id', 'survivor', 'name', 'slug', 'category_id', 'stock', *Product.RATING_FIELDS
+    ).order_by('id')
+    return DuplicateGroups(rows)
+
+
+# Colliding rows -----------------------------------------------------------
+
+def _combine_lines(kept, other):
+    quantity = kept.quantity + other.quantity
+    kept.price = ((kept.price * kept.quantity + other.price * other.quantity) / quantity).quantize(
+        CENT, rounding=ROUND_HALF_UP
+    )
+    kept.quantity = quantity
+
+
+def _collapse(queryset, key, survivor_of, combine=None):
+    """
+    Find rows that would share ``key`` on the same product once repointed.
+    The survivor's own row (else the oldest) is kept; the others are folded
+    into it with ``combine`` if given. Returns (changed rows, dropped ids).
+    """
+    kept, changed, dropped = {}, {}, []
+    rows = sorted(queryset, key=lambda row: (row.product_id in survivor_of, row.pk))
+    for row in rows:
+        values = tuple(getattr(row, f) for f in key)
+        if None in values:
+            # NULLs never collide under a unique constraint
+            continue
+        slot = (survivor_of.get(row.product_id, row.product_id),) + values
+        first = kept.setdefault(slot, row)
+        if first is row:
+            continue
+        if combine is not None:
+            combine(first, row)
+            changed[first.pk] = first
+        dropped.append(row.pk)
+    return list(changed.values()), dropped
+
+
+def _colliding(model, owner, groups, fields):
+    """Rows of survivors and duplicates under owners (orders, carts...) that hold a duplicate"""
+    owners = model.objects.filter(product_id__in=groups.duplicates).values(owner)
+    return model.objects.filter(
+        product_id__in=groups.duplicates | groups.survivors, **{f'{owner}__in': owners}
+    ).only('id', 'product_id', owner, *fields)
+
+
+def _raw_delete(queryset):
+    """One DELETE, without collecting the rows or sending per-row signals"""
+    return queryset._raw_delete(queryset.db)
+
+
+# Writes -------------------------------------------------------------------
+
+def _repoint(queryset, survivor_of, **fields):
+    """Point the duplicates' rows in ``queryset`` at their survivors; returns rows moved"""
+    moved = 0
+    for batch in _batches(survivor_of):
+        survivor = Case(
+            *[When(product_id=pk, then=Value(survivor_of[pk])) for pk in batch],
+            output_field=IntegerField()
+        )
+        moved += queryset.filter(product_id__in=batch).update(product=survivor, **fields)
+    return moved
+
+
+def _take_over_stock(groups):
+    """Add the duplicates' stock to their survivors, a CASE update per batch"""
+    extra = defaultdict(int)
+    for pk, survivor in groups.survivor_of.items():
+        extra[survivor] += groups.products[pk]['stock']
+    extra = {pk: units for pk, units in extra.items() if units}
+    for batch in _batches(extra):
+        products = Product.objects.filter(pk__in=batch)
+        products.update_denormalized(stock=F('stock') + Case(
+            *[When(pk=pk, then=Value(extra[pk])) for pk in batch],
+            output_field=IntegerField()
+        ))
+        products.refresh_low_stock()
+
+
+def _survivor_ratings(groups):
+    """Survivors whose rating aggregates changed, recounted from their reviews"""
+    survivors = groups.survivors
+    aggregates = {
+        row['product_id']: (row['review_count'], row['rating_total'])
+        for row in Testimonial.objects.filter(product_id__in=survivors, approved=True)
+                                      .values('product_id')
+                                      .annotate(review_count=Count('id'), rating_total=Sum('rating'))
+                                      .order_by()
+    }
+    products = []
+    for pk in survivors:
+        count, total = aggregates.get(pk, (0, 0))
+        row = groups.products[pk]
+        if (row['approved_review_count'], row['rating_sum']) == (count, total):
+            continue
+        products.append(Product(
+            pk=pk,
+            approved_review_count=count,
+            rating_sum=total,
+            avg_rating=average_rating(count, total),
+        ))
+    return products
+
+
+def merge_duplicates(groups, dry_run=False):
+    """
+    Fold every duplicate in ``groups`` into its survivor and delete it.
+    Returns counts of what was (or, with ``dry_run``, would be) changed.
+    """
+    stats = {'groups': len(groups), 'products_deleted': len(groups.survivor_of)}
+    if not groups.survivor_of:
+        return stats
+    duplicates = groups.duplicates
+
+    with transaction.atomic():
+        lines, dropped_lines = _collapse(
+            _colliding(OrderItem, 'order_id', groups, ['quantity', 'price']),
+            ['order_id'], groups.survivor_of, _combine_lines
+        )
+        cart_lines, dropped_cart_lines = _collapse(
+            _colliding(CartItem, 'cart_id', groups, ['quantity', 'price']),
+            ['cart_id'], groups.survivor_of, _combine_lines
+        )
+        specs = TechnicalSpecification.objects.filter(
+            product_id__in=duplicates | groups.survivors
+        ).only('id', 'product_id', 'group', 'spec_name')
+        _, dropped_specs = _collapse(specs, ['group', 'spec_name'], groups.survivor_of)
+        reviews = Testimonial.objects.filter(
+            product_id__in=duplicates | groups.survivors, user__isnull=False
+        ).only('id', 'product_id', 'user_id')
+        _, dropped_reviews = _collapse(reviews, ['user_id'], groups.survivor_of)
+        orders = set(OrderItem.objects.filter(product_id__in=duplicates).values_list('order_id', flat=True))
+
+        stats.update(
+            order_lines_merged=len(dropped_lines),
+            cart_lines_merged=len(dropped_cart_lines),
+            testimonials_dropped=len(dropped_reviews),
+            specifications_dropped=len(dropped_specs),
+            orders_refreshed=len(orders),
+        )
+        if dry_run:
+            stats.update(
+                order_items=OrderItem.objects.filter(product_id__in=duplicates).count() - len(dropped_lines),
+                cart_items=CartItem.objects.filter(product_id__in=duplicates).count() - len(dropped_cart_lines),
+                testimonials=Testimonial.objects.filter(product_id__in=duplicates).count() - len(dropped_reviews),
+                images=ProductImage.objects.filter(product_id__in=duplicates).count(),
+                specifications=(
+                    TechnicalSpecification.objects.filter(product_id__in=duplicates).count()
+                    - len(dropped_specs)
+                ),
+            )
+            return stats
+
+        OrderItem.objects.bulk_update(lines, ['quantity', 'price'])
+        _raw_delete(OrderItem.objects.filter(pk__in=dropped_lines))
+        CartItem.objects.bulk_update(cart_lines, ['quantity', 'price'])
+        _raw_delete(CartItem.objects.filter(pk__in=dropped_cart_lines))
+        _raw_delete(Testimonial.objects.filter(pk__in=dropped_reviews))
+        _raw_delete(TechnicalSpecification.objects.filter(pk__in=dropped_specs))
+
+        stats.update(
+            order_items=_repoint(OrderItem.objects.all(), groups.survivor_of),
+            cart_items=_repoint(CartItem.objects.all(), groups.survivor_of),
+            testimonials=_repoint(Testimonial.objects.all(), groups.survivor_of),
+            # The survivor keeps its own primary image
+            images=_repoint(ProductImage.objects.all(), groups.survivor_of, is_primary=False),
+            specifications=_repoint(TechnicalSpecification.objects.all(), groups.survivor_of),
+            price_history=_repoint(PriceHistory.objects.all(), groups.survivor_of),
+            stock_movements=_repoint(StockMovement.objects.all(), groups.survivor_of),
+        )
+        _take_over_stock(groups)
+        Product.objects.bulk_update(_survivor_ratings(groups), Product.RATING_FIELDS)
+
+        # Lines were combined and moved to other products: refresh the
+        # stored totals and the sales rollups of those days
+        Order.objects.filter(pk__in=orders).refresh_totals()
+        days = list(Order.objects.filter(pk__in=orders).dates('created', 'day'))
+        DailySalesRollup.objects.filter(product_id__in=duplicates).delete()
+        reports.rebuild_days(days)
+
+        for batch in _batches(duplicates):
+            _raw_delete(Product.objects.filter(pk__in=batch))
+
+        category_ids = {row['category_id'] for row in groups.products.values()}
+        Category.objects.filter(pk__in=category_ids).refresh_available_product_counts()
+        search.rebuild_search_vectors(groups.survivors)
+        invalidation.invalidate_all()
+    return stats
@@ -0,0 +1,212 @@
+"""
+Order events fanned out to notification sinks.
+
+``place_order()`` emits ``order_placed`` by queuing one ``order_event`` job
+in the order's own transaction (see store/jobs.py): the event exists exactly
+when the order was committed, and checkout costs one INSERT however many
+sinks are configured. The job snapshots the order into a JSON payload once
+and queues one ``deliver_order_event`` job per sink, keyed on (event, order,
+sink), so a failing webhook is retried on its own without emailing the
+staff twice.
+
+Both jobs are run by whatever drains the job queue: on Vercel, the cron
+calling the ``run_jobs`` view every minute, which runs the delivery jobs in
+the same call that fans the event out; elsewhere ``manage.py run_jobs``.
+Staff therefore hear about an order within about a minute of checkout.
+
+Sinks are configured like caches, by name in ``ORDER_EVENT_SINKS``:
+
+    ORDER_EVENT_SINKS = {
+        'feed': {'BACKEND': 'store.events.AdminFeedSink'},
+        'staff_email': {'BACKEND': 'store.events.StaffEmailSink', 'RECIPIENTS': ['orders@example.com']},
+        'webhook': {'BACKEND': 'store.events.WebhookSink', 'URL': 'https://...', 'SECRET': '...'},
+    }
+
+Other keys are passed lowercased to the sink's constructor. ``LocalSink``
+keeps deliveries in ``LocalSink.outbox``, like Django's locmem email
+backend, for tests and development.
+"""
+import hashlib
+import hmac
+import json
+from decimal import Decimal
+import requests
+from django.conf import settings
+from django.core.mail import send_mail
+from django.utils.module_loading import import_string
+from . import jobs
+from .models import Order, StaffNotification
+
+
+def emit(event, order):
+    """Queue ``event`` about ``order`` for every sink; call inside the order's transaction"""
+    return jobs.enqueue('order_event', {'event': event, 'order_id': order.pk})
+
+
+def sinks():
+    return getattr(settings, 'ORDER_EVENT_SINKS', {})
+
+
+def get_sink(name):
+    options = dict(sinks()[name])
+    backend = import_string(options.pop('BACKEND'))
+    return backend(**{key.lower(): value for key, value in options.items()})
+
+
+def fan_out(event, order_id):
+    """Snapshot the order and queue one delivery per configured sink"""
+    order = Order.objects.filter(pk=order_id).first()
+    if order is None:
+        return
+    payload = order_payload(order)
+    for name in sinks():
+        jobs.enqueue(
+            'deliver_order_event', {'sink': name, 'event': event, 'payload': payload},
+            key=f'{event}:{order_id}:{name}',
+        )
+
+
+def deliver(sink, event, payload):
+    get_sink(sink).deliver(event, payload)
+
+
+# Payload ------------------------------------------------------------------
+
+def _money(value):
+    return str(Decimal(value).quantize(Decimal('0.01')))
+
+
+def order_payload(order):
+    """JSON-safe snapshot of an order and its lines (amounts as strings)"""
+    items = order.items.select_related('product').only('quantity', 'price', 'product__id', 'product__name')
+    return {
+        'order_id': order.pk,
+        'created': order.created.isoformat(),
+        'status': order.status,
+        'paid': order.paid,
+        'customer': {
+            'name': order.full_name,
+            'email': order.email,
+            'phone_number': order.phone_number,
+        },
+        'delivery': {
+            'region': order.region,
+            'address': order.address,
+            'city': order.city,
+            'postal_code': order.postal_code,
+            'method': order.delivery_method,
+            'cost': _money(order.delivery_cost),
+        },
+        'items': [
+            {
+                'product_id': item.product.pk,
+                'name': item.product.name,
+                'quantity': item.quantity,
+                'price': _money(item.price),
+                'total': _money(item.price * item.quantity),
+            }
+            for item in items.order_by('id')
+        ],
+        'subtotal': _money(order.items_subtotal),
+        'total': _money(order.grand_total),
+    }
+
+
+def invoice_text(payload):
+    """The plain-text invoice sent to WhatsApp and to the staff"""
+    customer, delivery = payload['customer'], payload['delivery']
+    lines = [
+        f"Order Invoice #{payload['order_id']}",
+        "",
+        "--- Customer Details ---",
+        f"Name: {customer['name']}",
+        f"Email: {customer['email']}",
+        f"Phone: {customer['phone_number']}",
+        "",
+        "--- Order Details ---",
+    ]
+    for item in payload['items']:
+        lines += [
+            f"Product: {item['name']}",
+            f"Quantity: {item['quantity']}",
+            f"Price: GH₵ {item['price']}",
+            f"Total: GH₵ {item['total']}",
+            "",
+        ]
+    lines += [
+        "--- Cart Totals ---",
+        f"Subtotal: GH₵ {payload['subtotal']}",
+        f"Delivery: GH₵ {delivery['cost']}",
+        f"Total: GH₵ {payload['total']}",
+        "",
+        "--- Delivery Details ---",
+        f"Region: {delivery['region']}",
+        f"Address: {delivery['address']}",
+        f"City: {delivery['city']}",
+        f"Postal Code: {delivery['postal_code']}",
+        "Country: Ghana",
+        f"Delivery Method: {delivery['method'].title()}",
+    ]
+    return "\n".join(lines)
+
+
+def _title(event, payload):
+    return f"{event.replace('_', ' ').capitalize()}: order #{payload['order_id']}, GH₵ {payload['total']}"
+
+
+# Sinks --------------------------------------------------------------------
+
+class AdminFeedSink:
+    """Adds the event to the staff notification feed in the admin"""
+
+    def deliver(self, event, payload):
+        StaffNotification.objects.get_or_create(
+            event=event, order_id=payload['order_id'],
+            defaults={'title': _title(event, payload), 'message': invoice_text(payload)},
+        )
+
+
+class StaffEmailSink:
+    """Emails the invoice to ``recipients``"""
+
+    def __init__(self, recipients=()):
+        self.recipients = list(recipients)
+
+    def deliver(self, event, payload):
+        if self.recipients:
+            send_mail(_title(event, payload), invoice_text(payload), None, self.recipients)
+
+
+class WebhookSink:
+    """
+    POSTs ``{"event": ..., "data": payload}`` to ``url``. With a ``secret``
+    the body is signed: ``X-BuildKit-Signature: sha256=<hex HMAC>``.
+    """
+
+    def __init__(self, url, secret='', timeout=10):
+        self.url = url
+        self.secret = secret
+        self.timeout = timeout
+
+    def deliver(self, event, payload):
+        body = json.dumps({'event': event, 'data': payload}, sort_keys=True).encode()
+        headers = {
+            'Content-Type': 'application/json',
+            'X-BuildKit-Event': event,
+            'X-BuildKit-Delivery': f"{event}:{payload['order_id']}",
+        }
+        if self.secret:
+            digest = hmac.new(self.secret.encode(), body, hashlib.sha256).hexdigest()
+            headers['X-BuildKit-Signature'] = f'sha256={digest}'
+        response = requests.post(self.url, data=body, headers=headers, timeout=self.timeout)
+        # Anything but 2xx is retried by the job queue
+        response.raise_for_status()
+
+
+class LocalSink:
+    """Keeps (event, payload) pairs in ``LocalSink.outbox``; for tests and development"""
+
+    outbox = []
+
+    def deliver(self, event, payload):
+        self.outbox.append((event, payload))
@@ -0,0 +1,191 @@
+"""
+Streaming exports of orders, products and testimonials as CSV or JSON Lines.
+
+Rows are read with ``QuerySet.iterator(chunk_size=EXPORT_CHUNK_SIZE)``;
+related rows (order items, specifications, images) are prefetched once per
+chunk, and every line is yielded as soon as it is built. Neither the admin
+actions (``StreamingHttpResponse``) nor ``manage.py export_data`` ever hold
+more than one chunk in memory, however many rows are exported.
+
+In CSV, list values (items, specifications, image URLs) are joined with
+``; `` in a single cell, nested fields written as ``key=value``; JSON Lines
+keeps them as lists of objects.
+"""
+import csv
+import json
+from django.conf import settings
+from django.db.models import Prefetch
+from django.http import StreamingHttpResponse
+from .models import Order, OrderItem, Product, ProductImage, TechnicalSpecification, Testimonial
+
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'jsonl': ('application/x-ndjson', 'jsonl'),
+}
+
+
+def _chunk_size():
+    return getattr(settings, 'EXPORT_CHUNK_SIZE', 2000)
+
+
+def _image_url(image):
+    return image.url if image else ''
+
+
+# Row builders -------------------------------------------------------------
+
+def _orders(queryset):
+    items = OrderItem.objects.select_related('product').only(
+        'order_id', 'quantity', 'price', 'product__name', 'product__slug'
+    ).order_by('id')
+    return queryset.prefetch_related(Prefetch('items', queryset=items))
+
+
+def _order_row(order):
+    return {
+        'id': order.id,
+        'created': order.created.isoformat(),
+        'status': order.status,
+        'paid': order.paid,
+        'customer': order.full_name,
+        'email': order.email,
+        'phone_number': order.phone_number,
+        'region': order.region,
+        'city': order.city,
+        'address': order.address,
+        'delivery_method': order.delivery_method,
+        'delivery_cost': str(order.delivery_cost),
+        'items_count': order.items_count,
+        'items_subtotal': str(order.items_subtotal),
+        'grand_total': str(order.grand_total),
+        'items': [
+            {
+                'product': item.product.name,
+                'slug': item.product.slug,
+                'quantity': item.quantity,
+                'price': str(item.price),
+            }
+            for item in order.items.all()
+        ],
+    }
+
+
+def _products(queryset):
+    specs = TechnicalSpecification.objects.only(
+        'product_id', 'spec_name', 'spec_value', 'spec_unit', 'group', 'display_order'
+    ).order_by('group', 'display_order')
+    images = ProductImage.objects.only('product_id', 'image', 'display_order').order_by('display_order')
+    return queryset.select_related('category').prefetch_related(
+        Prefetch('technical_specs', queryset=specs),
+        Prefetch('images', queryset=images),
+    )
+
+
+def _product_row(product):
+    return {
+        'id': product.id,
+        'name': product.name,
+        'slug': product.slug,
+        'category': product.category.name,
+        'product_type': product.product_type,
+        'price': str(product.price),
+        'stock': product.stock,
+        'available': product.available,
+        'featured': product.featured,
+        'avg_rating': str(product.avg_rating),
+        'review_count': product.approved_review_count,
+        'image_url': _image_url(product.image),
+        'technical_data_sheet_url': _image_url(product.technical_data_sheet),
+        'specifications': [
+            {'group': spec.group, 'name': spec.spec_name, 'value': spec.spec_value, 'unit': spec.spec_unit}
+            for spec in product.technical_specs.all()
+        ],
+        'image_urls': [_image_url(image.image) for image in product.images.all()],
+    }
+
+
+def _testimonials(queryset):
+    return queryset.select_related('product').only(
+        'id', 'reviewer_name', 'rating', 'content', 'approved', 'featured', 'created',
+        'product__name', 'product__slug'
+    )
+
+
+def _testimonial_row(testimonial):
+    return {
+        'id': testimonial.id,
+        'product': testimonial.product.name,
+        'slug': testimonial.product.slug,
+        'reviewer_name': testimonial.reviewer_name,
+        'rating': testimonial.rating,
+        'approved': testimonial.approved,
+        'featured': testimonial.featured,
+        'created': testimonial.created.isoformat(),
+        'content': testimonial.content,
+    }
+
+
+# name: (model, prepare queryset, build row)
+EXPORTS = {
+    'orders': (Order, _orders, _order_row),
+    'products': (Product, _products, _product_row),
+    'testimonials': (Testimonial, _testimonials, _testimonial_row),
+}
+
+
+def export_rows(name, queryset=None, chunk_size=None):
+    """Yield one dict per row of ``queryset`` (default: every row)"""
+    model, prepare, build = EXPORTS[name]
+    if queryset is None:
+        queryset = model.objects.all()
+    # Primary key order keeps chunks stable and uses the primary key index
+    queryset = prepare(queryset.order_by('pk'))
+    for obj in queryset.iterator(chunk_size=chunk_size or _chunk_size()):
+        yield build(obj)
+
+
+# Formats ------------------------------------------------------------------
+
+class _Echo:
+    """File-like object whose write() returns the line, for csv.writer"""
+
+    def write(self, value):
+        return value
+
+
+def _csv_part(item):
+    if isinstance(item, dict):
+        return ' '.join(f'{key}={value}' for key, value in item.items() if value != '')
+    return str(item)
+
+
+def _csv_cell(value):
+    return '; '.join(_csv_part(item) for item in value) if isinstance(value, list) else value
+
+
+def _csv_lines(rows):
+    writer = csv.writer(_Echo())
+    header = None
+    for row in rows:
+        if header is None:
+            header = list(row)
+            yield writer.writerow(header)
+        yield writer.writerow([_csv_cell(row[field]) for field in header])
+
+
+def _jsonl_lines(rows):
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False) + '\n'
+
+
+def export_lines(name, fmt, queryset=None, chunk_size=None):
+    """Yield the export of ``name`` as CSV or JSON Lines text, line by line"""
+    rows = export_rows(name, queryset, chunk_size)
+    return _csv_lines(rows) if fmt == 'csv' else _jsonl_lines(rows)
+
+
+def streaming_response(name, fmt, queryset=None):
+    content_type, extension = FORMATS[fmt]
+    response = StreamingHttpResponse(export_lines(name, fmt, queryset), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{name}.{extension}"'
+    return response
@@ -0,0 +1,220 @@
+"""
+Faceted filtering for catalog listings.
+
+Facet counts come from one grouped query over the listing's base queryset,
+grouped by every facet dimension at once (category, product type, price
+bucket, in stock, has technical specs). That small cube is cached per scope
+and catalog generation; counts for any filter combination are then derived
+from it in Python, each facet counted against all *other* active filters so
+options within a facet stay selectable. Derived counts are cached under the
+normalized filter set.
+"""
+import hashlib
+from urllib.parse import urlencode
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, Count, IntegerField, Q, Value, When
+from . import invalidation
+from .models import Product
+
+# (key, label, minimum price inclusive, maximum price exclusive)
+PRICE_BUCKETS = [
+    ('0-100', 'Under ₵100', None, 100),
+    ('100-500', '₵100 – ₵500', 100, 500),
+    ('500-1000', '₵500 – ₵1,000', 500, 1000),
+    ('1000-5000', '₵1,000 – ₵5,000', 1000, 5000),
+    ('5000-20000', '₵5,000 – ₵20,000', 5000, 20000),
+    ('20000+', 'Over ₵20,000', 20000, None),
+]
+
+FACETS = ('category', 'type', 'price', 'in_stock', 'specs')
+BOOLEAN_FACETS = ('in_stock', 'specs')
+
+
+def _cache_timeout():
+    return getattr(settings, 'FACET_CACHE_TIMEOUT', 10 * 60)
+
+
+def normalize_filters(params):
+    """Turn query parameters into a canonical {facet: tuple(values)} dict"""
+    valid_types = {key for key, _ in Product.PRODUCT_TYPES}
+    valid_buckets = {key for key, *_ in PRICE_BUCKETS}
+    filters = {}
+
+    categories = sorted({slug for slug in params.getlist('category') if slug})
+    if categories:
+        filters['category'] = tuple(categories)
+    types = sorted(set(params.getlist('type')) & valid_types)
+    if types:
+        filters['type'] = tuple(types)
+    buckets = sorted(set(params.getlist('price')) & valid_buckets)
+    if buckets:
+        filters['price'] = tuple(buckets)
+    for facet in BOOLEAN_FACETS:
+        if params.get(facet) in ('1', 'true', 'on'):
+            filters[facet] = ('1',)
+    return filters
+
+
+def filters_key(filters):
+    return '&'.join(f'{facet}={",".join(filters[facet])}' for facet in FACETS if facet in filters)
+
+
+def scope_key(category_id=None, query=None):
+    """Cache scope for a listing's base queryset (category page and/or search)"""
+    scope = str(category_id or 'all')
+    if query:
+        scope += ':q' + hashlib.md5(query.strip().lower().encode()).hexdigest()
+    return scope
+
+
+def querystring(filters, **extra):
+    """Encode a filter set (plus extra parameters such as q) for links"""
+    params = [(key, value) for key, value in extra.items() if value]
+    for facet in FACETS:
+        params.extend((facet, value) for value in filters.get(facet, ()))
+    return urlencode(params)
+
+
+def toggle(filters, facet, value):
+    """Return a copy of ``filters`` with one facet value switched on or off"""
+    toggled = dict(filters)
+    values = set(toggled.get(facet, ()))
+    values.symmetric_difference_update({value})
+    if values:
+        toggled[facet] = tuple(sorted(values))
+    else:
+        toggled.pop(facet, None)
+    return toggled
+
+
+def _price_bucket_q(bucket_key):
+    for key, _, minimum, maximum in PRICE_BUCKETS:
+        if key == bucket_key:
+            q = Q()
+            if minimum is not None:
+                q &= Q(price__gte=minimum)
+            if maximum is not None:
+                q &= Q(price__lt=maximum)
+            return q
+    return Q()
+
+
+def apply_filters(queryset, filters):
+    """Narrow a product queryset by a normalized filter set"""
+    if 'category' in filters:
+        queryset = queryset.filter(category__slug__in=filters['category'])
+    if 'type' in filters:
+        queryset = queryset.filter(product_type__in=filters['type'])
+    if 'price' in filters:
+        price_q = Q()
+        for bucket in filters['price']:
+            price_q |= _price_bucket_q(bucket)
+        queryset = queryset.filter(price_q)
+    if 'in_stock' in filters:
+        queryset = queryset.filter(stock__gt=0)
+    if 'specs' in filters:
+        queryset = queryset.filter(has_technical_specs=True)
+    return queryset
+
+
+def _price_bucket_expression():
+    whens = [
+        When(_price_bucket_q(key), then=Value(i))
+        for i, (key, *_rest) in enumerate(PRICE_BUCKETS)
+    ]
+    return Case(*whens, default=Value(len(PRICE_BUCKETS) - 1), output_field=IntegerField())
+
+
+def _cube(base_queryset, scope):
+    """Grouped counts over every facet dimension: one query, cached per scope"""
+    key = f'store:facets:cube:{scope}:{invalidation.generation()}'
+    cube = cache.get(key)
+    invalidation.record('facets', cube is not None)
+    if cube is None:
+        rows = base_queryset.order_by().annotate(
+            price_bucket=_price_bucket_expression(),
+            in_stock_flag=Case(When(stock__gt=0, then=Value(1)), default=Value(0), output_field=IntegerField()),
+        ).values(
+            'category__slug', 'category__name', 'product_type',
+            'price_bucket', 'in_stock_flag', 'has_technical_specs'
+        ).annotate(count=Count('id'))
+        cube = {'rows': [], 'category_names': {}}
+        for row in rows:
+            cube['rows'].append((
+                row['category__slug'],
+                row['product_type'],
+                PRICE_BUCKETS[row['price_bucket']][0],
+                '1' if row['in_stock_flag'] else '0',
+                '1' if row['has_technical_specs'] else '0',
+                row['count'],
+            ))
+            cube['category_names'][row['category__slug']] = row['category__name']
+        cache.set(key, cube, _cache_timeout())
+    return cube
+
+
+def _row_matches(row, filters, skip=None):
+    for position, facet in enumerate(FACETS):
+        if facet == skip or facet not in filters:
+            continue
+        if row[position] not in filters[facet]:
+            return False
+    return True
+
+
+def facet_counts(base_queryset, filters, scope='all'):
+    """Return {'total': n, facet: {value: count}} for the given filters"""
+    digest = hashlib.md5(filters_key(filters).encode()).hexdigest()
+    key = f'store:facets:counts:{scope}:{invalidation.generation()}:{digest}'
+    counts = cache.get(key)
+    invalidation.record('facets', counts is not None)
+    if counts is not None:
+        return counts
+
+    cube = _cube(base_queryset, scope)
+    counts = {facet: {} for facet in FACETS}
+    counts['total'] = 0
+    counts['category_names'] = cube['category_names']
+    for row in cube['rows']:
+        if _row_matches(row, filters):
+            counts['total'] += row[-1]
+        for position, facet in enumerate(FACETS):
+            if _row_matches(row, filters, skip=facet):
+                value = row[position]
+                counts[facet][value] = counts[facet].get(value, 0) + row[-1]
+    cache.set(key, counts, _cache_timeout())
+    return counts
+
+
+def build_facets(base_queryset, filters, scope='all', query=None):
+    """Facet options with counts, selection state and toggle links for templates"""
+    counts = facet_counts(base_queryset, filters, scope)
+    category_names = counts['category_names']
+
+    def option(facet, value, label):
+        return {
+            'value': value,
+            'label': label,
+            'count': counts[facet].get(value, 0),
+            'selected': value in filters.get(facet, ()),
+            'querystring': querystring(toggle(filters, facet, value), q=query),
+        }
+
+    def options(facet, choices):
+        return [
+            option(facet, value, label)
+            for value, label in choices
+            if counts[facet].get(value, 0) or value in filters.get(facet, ())
+        ]
+
+    return {
+        'total': counts['total'],
+        'category': options('category', sorted(category_names.items(), key=lambda item: item[1])),
+        'type': options('type', Product.PRODUCT_TYPES),
+        'price': options('price', [(key, label) for key, label, *_ in PRICE_BUCKETS]),
+        'in_stock': option('in_stock', '1', 'In stock only'),
+        'specs': option('specs', '1', 'With technical specs'),
+        'is_filtered': bool(filters),
+        'clear_querystring': querystring({}, q=query),
+    }
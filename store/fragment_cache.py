@@ -0,0 +1,42 @@
+"""
+Versioned caching of rendered template fragments for catalog pages.
+
+The product grid cards, category sidebar, spec tables, reviews and related
+products render the same HTML for every visitor, so templates wrap them in
+``{% catalog_cache 'name' vary_on... product=id category=id %}`` (see
+``templatetags/catalog_cache``). Keys embed the generation of the product
+or category the fragment shows, or the catalog-wide generation when neither
+is given (see ``invalidation.py``); stale fragments are never deleted, they
+just stop being read and expire.
+
+Per-visitor state stays dynamic: fragments are rendered with a placeholder
+in place of the CSRF token, which is swapped for the real token on every
+request, and cart quantities are kept outside the cached blocks.
+"""
+import hashlib
+from django.conf import settings
+from django.core.cache import cache
+from . import invalidation
+
+CSRF_PLACEHOLDER = 'catalog-fragment-csrf-token'
+
+
+def _cache_timeout():
+    return getattr(settings, 'FRAGMENT_CACHE_TIMEOUT', 60 * 60)
+
+
+def fragment_key(name, vary_on=(), product=None, category=None):
+    digest = hashlib.md5(':'.join(str(value) for value in vary_on).encode()).hexdigest()
+    generation = invalidation.generation(product=product, category=category)
+    return f'store:fragments:{name}:{generation}:{digest}'
+
+
+def render_fragment(name, vary_on, render, csrf_token='', product=None, category=None):
+    """Return the cached fragment, rendering it with ``render()`` on a miss"""
+    key = fragment_key(name, vary_on, product, category)
+    content = cache.get(key)
+    invalidation.record('fragments', content is not None)
+    if content is None:
+        content = render(CSRF_PLACEHOLDER)
+        cache.set(key, content, _cache_timeout())
+    return content.replace(CSRF_PLACEHOLDER, str(csrf_token or ''))
@@ -0,0 +1,91 @@
+"""
+Responsive Cloudinary image URLs.
+
+Templates never link the original upload. Every place an image is shown is
+a *slot* in ``SLOTS``: the widths worth generating, the ``sizes`` hint that
+tells the browser how wide the image will be drawn, and whether it is
+scaled down (``c_limit``) or cropped to a square (``c_fill,g_auto``).
+``{% responsive_image %}`` (``store/templatetags/responsive_images.py``)
+renders an ``<img>`` whose ``srcset`` has one transformation URL per width,
+all with ``f_auto,q_auto`` so Cloudinary picks the format (WebP/AVIF) and
+quality per browser. Cloudinary derives and caches each size on its first
+request; a phone on a listing page downloads a 240px card image instead of
+the multi-megabyte original.
+
+Building the URLs is string work only, memoized per (public_id, version,
+format, slot) with ``functools.lru_cache`` (``IMAGE_URL_CACHE_SIZE`` entries
+per process), so after the first render it costs a dictionary lookup.
+"""
+from functools import lru_cache
+from cloudinary import CloudinaryResource
+from django.conf import settings
+
+SLOTS = {
+    # Listing cards, 2-4 per row
+    'card': {'widths': (240, 360, 480, 720), 'sizes': '(max-width: 576px) 50vw, (max-width: 992px) 33vw, 300px'},
+    # Main image on the product page
+    'detail': {'widths': (480, 768, 1080, 1440), 'sizes': '(max-width: 992px) 100vw, 50vw'},
+    # Full screen and zoom views
+    'zoom': {'widths': (1080, 1600, 2400), 'sizes': '100vw'},
+    # Cart lines
+    'thumb': {'widths': (80, 160), 'sizes': '80px', 'crop': 'fill'},
+    # Round featured-product badges
+    'avatar': {'widths': (70, 140), 'sizes': '70px', 'crop': 'fill'},
+    # Admin previews
+    'admin': {'widths': (50, 100), 'sizes': '50px', 'crop': 'fill'},
+}
+
+
+def _cache_size():
+    return getattr(settings, 'IMAGE_URL_CACHE_SIZE', 4096)
+
+
+def _transformation(width, crop):
+    if crop == 'fill':
+        return {'width': width, 'height': width, 'crop': 'fill', 'gravity': 'auto'}
+    return {'width': width, 'crop': 'limit'}
+
+
+@lru_cache(maxsize=_cache_size())
+def _urls(public_id, version, fmt, slot):
+    """(width, url) for every width of ``slot``"""
+    spec = SLOTS[slot]
+    resource = CloudinaryResource(public_id, format=fmt, version=version)
+    return tuple(
+        (width, resource.build_url(
+            fetch_format='auto', quality='auto', secure=True, **_transformation(width, spec.get('crop'))
+        ))
+        for width in spec['widths']
+    )
+
+
+def _slot_urls(image, slot):
+    if slot not in SLOTS:
+        raise ValueError(f'Unknown image slot {slot!r}; expected one of {", ".join(SLOTS)}')
+    return _urls(image.public_id, image.version, image.format, slot)
+
+
+def url(image, slot, width=None):
+    """One URL of ``image`` for ``slot``: the largest width, or the smallest at least ``width`` wide"""
+    if not image:
+        return ''
+    urls = _slot_urls(image, slot)
+    if width is not None:
+        for candidate, candidate_url in urls:
+            if candidate >= width:
+                return candidate_url
+    return urls[-1][1]
+
+
+def img_attrs(image, slot):
+    """``src``, ``srcset`` and ``sizes`` (plus ``width``/``height`` for square crops) of an <img>"""
+    urls = _slot_urls(image, slot)
+    spec = SLOTS[slot]
+    attrs = {
+        'src': urls[-1][1],
+        'srcset': ', '.join(f'{candidate_url} {width}w' for width, candidate_url in urls),
+        'sizes': spec['sizes'],
+    }
+    if spec.get('crop') == 'fill':
+        attrs['width'] = attrs['height'] = spec['widths'][0]
+    return attrs
@@ -0,0 +1,459 @@
+"""
+Bulk product import from supplier price lists (CSV, XLSX or JSON Lines).
+
+Files are read row by row and never loaded whole. Categories and the slug,
+name and editable columns of every existing product are preloaded once, so
+matching rows to products and finding free slugs happens in memory. New
+products are written with ``bulk_create`` and changed ones with
+``bulk_update`` of just the changed fields every ``batch_size`` rows;
+unchanged rows cost nothing.
+
+Rows are matched to existing products by ``slug`` when the file has one,
+otherwise by the slug generated from ``name`` when the existing product
+has the same name. Anything else is created with a new unique slug.
+
+The bulk writes skip ``Product.save()`` and its signals, so the importer
+does their work once at the end: category counts are refreshed in one
+UPDATE and search vectors of the touched products in one statement. Cache
+generations are bumped by ``InvalidatingQuerySet``. Changed prices are
+written to ``PriceHistory`` and stock changes to the ``StockMovement``
+ledger alongside each batch. The file's stock figures are counts, but a
+checkout may sell units between the preload and the batch's write, so a
+changed count is applied as its difference from the preloaded stock with
+the same relative UPDATE as every other movement
+(``ProductQuerySet.change_stock``): sales made meanwhile are kept and the
+ledger stays equal to ``Product.stock``.
+
+Supplier syncs (``supplier=...``) match rows by the supplier's stable SKU
+instead and store a hash of each row's cleaned content on the product. A
+row whose hash has not changed since the last sync is skipped without any
+comparison or write, changed rows update only the fields that differ, and
+with ``retire_missing`` the supplier's products missing from the feed are
+marked unavailable. Existing products without a SKU are adopted by slug or
+name on the first sync, so earlier imports are not duplicated.
+
+In a dry run nothing is written and ``changes`` lists what would be
+created or updated, field by field.
+"""
+import csv
+import hashlib
+import json
+import os
+import time
+from collections import Counter
+from decimal import Decimal, InvalidOperation
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import slugify
+from . import search
+from .models import Category, PriceHistory, Product, StockMovement
+
+# Header aliases found in supplier files
+COLUMN_ALIASES = {
+    'product': 'name',
+    'product_name': 'name',
+    'title': 'name',
+    'unit_price': 'price',
+    'price_ghs': 'price',
+    'qty': 'stock',
+    'quantity': 'stock',
+    'category_slug': 'category',
+    'type': 'product_type',
+    'supplier_sku': 'sku',
+    'external_id': 'sku',
+    'item_code': 'sku',
+    'item_no': 'sku',
+}
+
+# Product columns an import may set, in the order they are compared
+IMPORT_FIELDS = ('name', 'description', 'price', 'stock', 'category_id', 'product_type', 'available', 'featured')
+SUPPLIER_FIELDS = ('supplier', 'supplier_sku', 'supplier_hash')
+STORED_FIELDS = IMPORT_FIELDS + SUPPLIER_FIELDS
+
+SLUG_LENGTH = Product._meta.get_field('slug').max_length
+NAME_LENGTH = Product._meta.get_field('name').max_length
+PRODUCT_TYPES = {value for value, _ in Product.PRODUCT_TYPES}
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 'on'}
+
+
+class ImportFileError(ValueError):
+    """The file cannot be read as a price list"""
+
+
+# Readers ------------------------------------------------------------------
+
+def _column(header):
+    key = str(header or '').strip().lower().replace(' ', '_').replace('-', '_')
+    return COLUMN_ALIASES.get(key, key)
+
+
+def read_csv(path):
+    with open(path, newline='', encoding='utf-8-sig') as source:
+        sample = source.read(4096)
+        source.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+        except csv.Error:
+            dialect = csv.excel
+        reader = csv.reader(source, dialect)
+        header = [_column(cell) for cell in next(reader, [])]
+        for row in reader:
+            if any(cell.strip() for cell in row):
+                yield dict(zip(header, row))
+
+
+def read_jsonl(path):
+    with open(path, encoding='utf-8') as source:
+        for number, line in enumerate(source, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                raise ImportFileError(f'Line {number} is not valid JSON: {e}')
+            yield {_column(key): value for key, value in row.items()}
+
+
+def read_xlsx(path):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ImportFileError('Reading XLSX files needs openpyxl (pip install openpyxl)')
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [_column(cell) for cell in next(rows, ())]
+        for row in rows:
+            if any(cell not in (None, '') for cell in row):
+                yield dict(zip(header, row))
+    finally:
+        workbook.close()
+
+
+READERS = {'csv': read_csv, 'jsonl': read_jsonl, 'xlsx': read_xlsx}
+
+
+def read_rows(path, fmt=None):
+    """Yield one dict per data row, keyed by normalised column names"""
+    fmt = fmt or os.path.splitext(path)[1].lstrip('.').lower()
+    if fmt == 'json':
+        fmt = 'jsonl'
+    if fmt not in READERS:
+        raise ImportFileError(f'Unsupported file format: {fmt or "unknown"} (use csv, xlsx or jsonl)')
+    return READERS[fmt](path)
+
+
+# Importer -----------------------------------------------------------------
+
+def row_hash(values):
+    """Stable digest of a cleaned row, stored as Product.supplier_hash"""
+    return hashlib.sha256(json.dumps(values, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class ProductImporter:
+    def __init__(self, batch_size=1000, dry_run=False, update_existing=True,
+                 create_categories=False, product_type='tool', max_changes=None,
+                 supplier=None, retire_missing=False):
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.update_existing = update_existing
+        self.create_categories = create_categories
+        self.product_type = product_type
+        self.max_changes = max_changes
+        self.supplier = supplier
+        self.retire_missing = retire_missing
+
+        self.stats = Counter()
+        self.errors = []
+        self.changes = []
+        self._to_create = []
+        # frozenset of changed fields -> products, one bulk_update per set
+        self._to_update = {}
+        self._price_changes = []
+        self._stock_movements = []
+        # Unsaved adjustments to existing products, applied in flush()
+        self._stock_changes = []
+        self._pending = 0
+        self._touched = []
+        self._seen = set()
+        self._seen_skus = set()
+        self._suffixes = {}
+
+        self._categories = {}
+        for pk, slug, name in Category.objects.values_list('pk', 'slug', 'name'):
+            self._categories[slug] = pk
+            self._categories[name.lower()] = pk
+        # slug -> (pk, *STORED_FIELDS), and supplier SKU -> slug
+        self._existing = {
+            row[1]: (row[0],) + row[2:]
+            for row in Product.objects.order_by().values_list('pk', 'slug', *STORED_FIELDS).iterator()
+        }
+        self._by_sku = {}
+        if supplier:
+            self._by_sku = {
+                current[STORED_FIELDS.index('supplier_sku') + 1]: slug
+                for slug, current in self._existing.items()
+                if current[STORED_FIELDS.index('supplier') + 1] == supplier
+            }
+
+    # Row handling
+
+    def _category_id(self, value):
+        value = str(value or '').strip()
+        if not value:
+            raise ValueError('Missing category.')
+        pk = self._categories.get(value) or self._categories.get(value.lower()) or self._categories.get(slugify(value))
+        if pk is not None:
+            return pk
+        if not self.create_categories:
+            raise ValueError(f'Unknown category "{value}".')
+        if self.dry_run:
+            pk = f'new:{value}'
+        else:
+            pk = Category.objects.create(name=value, slug=slugify(value)[:50]).pk
+        self.stats['categories_created'] += 1
+        self._categories[value] = self._categories[value.lower()] = pk
+        return pk
+
+    def _unique_slug(self, base):
+        base = base[:SLUG_LENGTH] or 'product'
+        if base not in self._existing and base not in self._seen:
+            return base
+        counter = self._suffixes.get(base, 1)
+        while True:
+            counter += 1
+            suffix = f'-{counter}'
+            slug = f'{base[:SLUG_LENGTH - len(suffix)]}{suffix}'
+            if slug not in self._existing and slug not in self._seen:
+                self._suffixes[base] = counter
+                return slug
+
+    def _clean(self, row):
+        """Parse the columns present in ``row`` into Product field values"""
+        values = {}
+        name = str(row.get('name') or '').strip()
+        if not name:
+            raise ValueError('Missing name.')
+        values['name'] = name[:NAME_LENGTH]
+
+        if row.get('price') not in (None, ''):
+            try:
+                price = Decimal(str(row['price']).replace(',', '').strip()).quantize(Decimal('0.01'))
+            except InvalidOperation:
+                raise ValueError(f'Invalid price "{row["price"]}".')
+            if price <= 0:
+                raise ValueError('Price must be greater than zero.')
+            values['price'] = price
+        if row.get('stock') not in (None, ''):
+            try:
+                stock = int(Decimal(str(row['stock']).strip()))
+            except InvalidOperation:
+                raise ValueError(f'Invalid stock "{row["stock"]}".')
+            if stock < 0:
+                raise ValueError('Stock cannot be negative.')
+            values['stock'] = stock
+        if row.get('category') not in (None, ''):
+            values['category_id'] = self._category_id(row['category'])
+        if row.get('description'):
+            values['description'] = str(row['description']).strip()
+        if row.get('product_type'):
+            product_type = str(row['product_type']).strip().lower()
+            if product_type not in PRODUCT_TYPES:
+                raise ValueError(f'Unknown product type "{product_type}".')
+            values['product_type'] = product_type
+        for flag in ('available', 'featured'):
+            if row.get(flag) not in (None, ''):
+                values[flag] = row[flag] if isinstance(row[flag], bool) else str(row[flag]).strip().lower() in TRUE_VALUES
+        return values
+
+    def _match(self, row, values, sku=None):
+        """Return (slug, existing row or None) for this import row"""
+        if sku is not None and sku in self._by_sku:
+            return self._by_sku[sku], self._existing[self._by_sku[sku]]
+        slug = str(row.get('slug') or '').strip()[:SLUG_LENGTH]
+        if slug not in self._existing:
+            # Legacy uploads stored slugs that slugify() would rewrite (e.g. "--")
+            slug = slugify(slug)[:SLUG_LENGTH]
+        generated = slug or slugify(values['name'])[:SLUG_LENGTH]
+        if generated in self._seen:
+            # Same name (or slug) as an earlier row: reported as a duplicate
+            return generated, None
+        existing = self._existing.get(generated)
+        if existing is not None and self._claimed(existing, sku):
+            # Belongs to another supplier SKU: a different product
+            return self._unique_slug(generated), None
+        if slug or (existing is not None and existing[1].lower() == values['name'].lower()):
+            return generated, existing
+        return self._unique_slug(generated), None
+
+    def _claimed(self, existing, sku):
+        current = dict(zip(STORED_FIELDS, existing[1:]))
+        return sku is not None and current['supplier_sku'] not in (None, '', sku)
+
+    def add(self, number, row):
+        self.stats['rows'] += 1
+        try:
+            sku = None
+            if self.supplier:
+                sku = str(row.get('sku') or '').strip()
+                if not sku:
+                    raise ValueError('Missing SKU.')
+                if sku in self._seen_skus:
+                    raise ValueError(f'Duplicate SKU "{sku}".')
+                self._seen_skus.add(sku)
+            values = self._clean(row)
+            if sku is not None:
+                values.setdefault('available', True)
+                digest = row_hash(values)
+                values.update(supplier=self.supplier, supplier_sku=sku, supplier_hash=digest)
+            slug, existing = self._match(row, values, sku)
+            if slug in self._seen:
+                raise ValueError(f'Duplicate of an earlier row (slug "{slug}").')
+            if existing is None:
+                self._plan_create(slug, values)
+            else:
+                self._plan_update(slug, existing, values)
+            self._seen.add(slug)
+        except ValueError as e:
+            self.stats['errors'] += 1
+            self.errors.append(f'Row {number}: {e}')
+
+        if self._pending >= self.batch_size:
+            self.flush()
+
+    def _record(self, change):
+        if self.max_changes is None or len(self.changes) < self.max_changes:
+            self.changes.append(change)
+
+    def _plan_create(self, slug, values):
+        if 'category_id' not in values:
+            raise ValueError('Missing category.')
+        if 'price' not in values:
+            raise ValueError('Missing price.')
+        values.setdefault('description', values['name'])
+        values.setdefault('product_type', self.product_type)
+        self.stats['created'] += 1
+        self._record(('create', slug, {k: v for k, v in values.items() if k != 'supplier_hash'}))
+        if not self.dry_run:
+            product = Product(slug=slug, image='', **values)
+            # What save() would set; bulk_create skips it
+            product.low_stock_since = timezone.now() if product.stock <= product.reorder_level else None
+            self._to_create.append(product)
+            self._pending += 1
+
+    def _plan_update(self, slug, existing, values):
+        current = dict(zip(STORED_FIELDS, existing[1:]))
+        if 'supplier_hash' in values and current['supplier_hash'] == values['supplier_hash'] \
+                and current['available'] == values['available']:
+            # Same content as the last sync: nothing to compare or write
+            self.stats['unchanged'] += 1
+            return
+        diff = {
+            field: (current[field], value)
+            for field, value in values.items()
+            if current[field] != value
+        }
+        content = {field: change for field, change in diff.items() if field != 'supplier_hash'}
+        if not content:
+            # Only the stored hash is out of date: refresh it quietly
+            self.stats['unchanged'] += 1
+        elif not self.update_existing:
+            self.stats['skipped'] += 1
+            return
+        else:
+            self.stats['updated'] += 1
+            self._record(('update', slug, content))
+        if not diff:
+            return
+        current.update(values)
+        self._existing[slug] = (existing[0],) + tuple(current[field] for field in STORED_FIELDS)
+        if values.get('supplier_sku'):
+            self._by_sku[values['supplier_sku']] = slug
+        if not self.dry_run:
+            product = Product(pk=existing[0], updated=timezone.now(), **current)
+            # Stock moves by its difference in flush(), never by bulk_update
+            self._to_update.setdefault(frozenset(diff) - {'stock'}, []).append(product)
+            if 'price' in diff:
+                old_price, new_price = diff['price']
+                self._price_changes.append(PriceHistory(
+                    product_id=existing[0], old_price=old_price, new_price=new_price, source='import'
+                ))
+            if 'stock' in diff:
+                old_stock, new_stock = diff['stock']
+                self._stock_changes.append(StockMovement(
+                    product_id=existing[0], kind='adjustment', quantity=new_stock - old_stock, note='Imported'
+                ))
+            self._pending += 1
+
+    def _retire_missing(self):
+        """Mark this supplier's products that are missing from the feed unavailable"""
+        available = STORED_FIELDS.index('available') + 1
+        retired = [
+            self._existing[slug][0] for sku, slug in self._by_sku.items()
+            if sku not in self._seen_skus and self._existing[slug][available]
+        ]
+        self.stats['retired'] = len(retired)
+        if self.dry_run:
+            return
+        for start in range(0, len(retired), self.batch_size):
+            Product.objects.filter(pk__in=retired[start:start + self.batch_size]).update(
+                available=False, updated=timezone.now()
+            )
+        self._touched.extend(retired)
+
+    def flush(self):
+        if self._to_create:
+            created = Product.objects.bulk_create(self._to_create, batch_size=self.batch_size)
+            self._touched.extend(product.pk for product in created)
+            self._stock_movements.extend(
+                StockMovement(product_id=product.pk, kind='receipt', quantity=product.stock, note='Imported')
+                for product in created if product.stock
+            )
+        for fields, products in self._to_update.items():
+            Product.objects.bulk_update(products, sorted(fields) + ['updated'], batch_size=self.batch_size)
+            self._touched.extend(product.pk for product in products)
+        PriceHistory.objects.bulk_create(self._price_changes, batch_size=self.batch_size)
+        self._apply_stock_changes()
+        if self._stock_movements:
+            StockMovement.objects.bulk_create(self._stock_movements, batch_size=self.batch_size)
+            Product.objects.filter(
+                pk__in={movement.product_id for movement in self._stock_movements}
+            ).refresh_low_stock()
+        self._to_create, self._to_update, self._pending = [], {}, 0
+        self._price_changes, self._stock_movements, self._stock_changes = [], [], []
+
+    def _apply_stock_changes(self):
+        """Move existing products' stock by the imported differences"""
+        increases = {}
+        for movement in self._stock_changes:
+            if movement.quantity > 0:
+                increases.setdefault(movement.quantity, []).append(movement.product_id)
+                self._stock_movements.append(movement)
+                continue
+            products = Product.objects.filter(pk=movement.product_id)
+            if not products.change_stock(movement.quantity):
+                # Sold below the imported count since the preload: empty it
+                movement.quantity = -products.select_for_update().values_list('stock', flat=True).get()
+                products.change_stock(movement.quantity)
+            if movement.quantity:
+                self._stock_movements.append(movement)
+        # Increases cannot fail: one UPDATE per distinct amount
+        for delta, pks in increases.items():
+            Product.objects.filter(pk__in=pks).change_stock(delta)
+
+    def run(self, rows):
+        """Import every row; returns the stats Counter (plus ``seconds``)"""
+        started = time.perf_counter()
+        with transaction.atomic():
+            for number, row in enumerate(rows, start=1):
+                self.add(number, row)
+            if self.supplier and self.retire_missing:
+                self._retire_missing()
+            if not self.dry_run:
+                self.flush()
+                if self._touched:
+                    # What Product's save() signals would have maintained
+                    Category.objects.refresh_available_product_counts()
+                    search.rebuild_search_vectors(self._touched)
+        self.stats['seconds'] = time.perf_counter() - started
+        return self.stats
@@ -0,0 +1,348 @@
+"""
+Generational cache invalidation for the catalog.
+
+Nothing cached by the store is ever deleted. Instead every cache key embeds
+a *generation token* for the scope it depends on (one product, one
+category, or the whole catalog), and a write to any catalog model bumps the
+generations it affects so readers simply stop finding the old keys:
+
+    Product                 product, its category (old and new), global
+    Category                category, global
+    TechnicalSpecification  product, its category, global
+    Testimonial             product, its category, global
+    ProductImage            product
+    SpecificationGroup      global
+
+Top-rated leaderboards have a generation of their own, bumped only when an
+approved review is added, edited or removed or a reviewed product changes,
+so stock and catalog edits elsewhere leave them cached.
+
+Bumps come from the ``post_save``/``post_delete`` handlers in ``signals.py``
+and from ``InvalidatingQuerySet.update()``/``bulk_create()``, which signals
+never see (admin actions, ``bulk_update``, import scripts). They run on
+commit, so a rolled back edit invalidates nothing, and a cache error during
+a bump is logged rather than failing a write that has already committed.
+``invalidate_all()`` bumps an epoch that is part of every token.
+
+Generations live in the default cache without a timeout. That cache must be
+shared by every process (Redis or the database cache, see ``CACHES``) for a
+bump from one worker or management command to reach the others. If a
+generation is evicted it is re-seeded from the clock rather than from zero,
+so an old token can never come back into use.
+
+Every process also keeps the generations it has read in the ``generations``
+LocMemCache for its ``TIMEOUT`` (a few seconds), so a lookup on the hot path
+costs no round trip to the shared cache. A bump is seen at once by the
+process that made it and by the others within that timeout.
+
+Cache users report hits and misses through ``record()``. Counters are kept
+per process and flushed to the shared cache once ``CACHE_METRICS_FLUSH_EVERY``
+events have accumulated, at most every ``CACHE_METRICS_FLUSH_INTERVAL``
+seconds, and shown by ``manage.py cache_metrics``.
+"""
+import threading
+import time
+from collections import Counter
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db import models, transaction
+
+EPOCH_KEY = 'store:gen:epoch'
+GLOBAL_KEY = 'store:gen:global'
+CATEGORY_KEY = 'store:gen:category:{}'
+PRODUCT_KEY = 'store:gen:product:{}'
+LEADERBOARD_KEY = 'store:gen:leaderboard'
+METRIC_KEY = 'store:metrics:{name}:{event}'
+LOCAL_CACHE = 'generations'
+
+# Caches that report through record(), and what can be invalidated
+CACHE_NAMES = ('fragments', 'facets', 'leaderboard', 'search_index', 'typeahead')
+SCOPE_NAMES = ('product', 'category', 'global', 'leaderboard', 'all')
+
+
+def _bulk_threshold():
+    """Above this many affected rows an update invalidates everything"""
+    return getattr(settings, 'CACHE_INVALIDATION_BULK_THRESHOLD', 500)
+
+
+def _metrics_flush_every():
+    return getattr(settings, 'CACHE_METRICS_FLUSH_EVERY', 50)
+
+
+def _metrics_flush_interval():
+    return getattr(settings, 'CACHE_METRICS_FLUSH_INTERVAL', 60)
+
+
+def _local_generations():
+    """This process's short-lived copy of the generations it has read"""
+    return caches[LOCAL_CACHE]
+
+
+def _seed():
+    return time.time_ns()
+
+
+def _incr(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, _seed(), None)
+    _local_generations().delete(key)
+
+
+# Generations --------------------------------------------------------------
+
+def generation(product=None, category=None):
+    """Token for the given scope; with no arguments, the whole catalog"""
+    keys = [EPOCH_KEY]
+    if product is not None:
+        keys.append(PRODUCT_KEY.format(product))
+    if category is not None:
+        keys.append(CATEGORY_KEY.format(category))
+    if product is None and category is None:
+        keys.append(GLOBAL_KEY)
+    return _token(keys)
+
+
+def leaderboard_generation():
+    """Token for the top-rated leaderboards"""
+    return _token([EPOCH_KEY, LEADERBOARD_KEY])
+
+
+def _token(keys):
+    local = _local_generations()
+    values = local.get_many(keys)
+    missing = [key for key in keys if key not in values]
+    if missing:
+        shared = cache.get_many(missing)
+        unseeded = [key for key in missing if key not in shared]
+        if unseeded:
+            for key in unseeded:
+                cache.add(key, _seed(), None)
+            shared.update(cache.get_many(unseeded))
+        local.set_many(shared)
+        values.update(shared)
+    return '.'.join(str(values.get(key, 0)) for key in keys)
+
+
+def _bump(product_ids=(), category_ids=(), include_global=False, everything=False):
+    if everything:
+        _incr(EPOCH_KEY)
+        _count_invalidation('all')
+        return
+    for product_id in product_ids:
+        _incr(PRODUCT_KEY.format(product_id))
+        _count_invalidation('product')
+    for category_id in category_ids:
+        _incr(CATEGORY_KEY.format(category_id))
+        _count_invalidation('category')
+    if include_global:
+        _incr(GLOBAL_KEY)
+        _count_invalidation('global')
+
+
+def invalidate(product_ids=(), category_ids=(), include_global=False):
+    """Bump the given generations once the current transaction commits"""
+    product_ids = {pk for pk in product_ids if pk is not None}
+    category_ids = {pk for pk in category_ids if pk is not None}
+    if not (product_ids or category_ids or include_global):
+        return
+    transaction.on_commit(lambda: _bump(product_ids, category_ids, include_global), robust=True)
+
+
+def invalidate_leaderboard():
+    """Retire the cached leaderboards once the current transaction commits"""
+    transaction.on_commit(_bump_leaderboard, robust=True)
+
+
+def _bump_leaderboard():
+    _incr(LEADERBOARD_KEY)
+    _count_invalidation('leaderboard')
+
+
+def invalidate_all():
+    """Retire every cached catalog entry, e.g. after a raw bulk rebuild"""
+    transaction.on_commit(lambda: _bump(everything=True), robust=True)
+
+
+# Model mapping ------------------------------------------------------------
+
+def invalidate_instance(instance, previous_product_id=None, previous_category_id=None):
+    """Bump what a saved or deleted catalog object affects"""
+    name = type(instance).__name__
+    if name == 'Product':
+        invalidate([instance.pk], [instance.category_id, previous_category_id], include_global=True)
+        if instance.approved_review_count:
+            # Its name, price or availability may be on a leaderboard
+            invalidate_leaderboard()
+    elif name == 'Category':
+        invalidate(category_ids=[instance.pk], include_global=True)
+    elif name in ('TechnicalSpecification', 'Testimonial'):
+        product_ids = {instance.product_id, previous_product_id}
+        category_ids = _category_ids_for_products(product_ids)
+        invalidate(product_ids, category_ids, include_global=True)
+    elif name == 'ProductImage':
+        invalidate([instance.product_id, previous_product_id])
+    elif name == 'SpecificationGroup':
+        invalidate(include_global=True)
+
+
+def _category_ids_for_products(product_ids):
+    from .models import Product
+
+    return set(Product.objects.filter(pk__in=[pk for pk in product_ids if pk]).values_list(
+        'category_id', flat=True
+    ))
+
+
+def invalidate_queryset(queryset, extra_category_id=None):
+    """Bump what rows in ``queryset`` affect; called before they change"""
+    name = queryset.model.__name__
+    queryset = queryset.order_by()
+    limit = _bulk_threshold()
+
+    if name == 'Product':
+        rows = list(queryset.values_list('pk', 'category_id')[:limit + 1])
+    elif name == 'Category':
+        rows = [(None, pk) for pk in queryset.values_list('pk', flat=True)[:limit + 1]]
+    elif name in ('TechnicalSpecification', 'Testimonial', 'ProductImage'):
+        rows = list(queryset.values_list('product_id', 'product__category_id').distinct()[:limit + 1])
+    else:
+        invalidate(include_global=True)
+        return
+
+    if len(rows) > limit:
+        invalidate_all()
+        return
+    product_ids = {product_id for product_id, _ in rows}
+    category_ids = {category_id for _, category_id in rows} | {extra_category_id}
+    if name == 'ProductImage':
+        invalidate(product_ids)
+    elif rows:
+        invalidate(product_ids, category_ids, include_global=True)
+
+
+# Product fields a leaderboard entry shows, filters or ranks on
+LEADERBOARD_FIELDS = {
+    'name', 'slug', 'price', 'available', 'category', 'category_id',
+    'approved_review_count', 'rating_sum', 'avg_rating',
+}
+
+
+class InvalidatingQuerySet(models.QuerySet):
+    """QuerySet whose bulk writes bump cache generations like save() does"""
+
+    def update(self, **kwargs):
+        if self.model.__name__ == 'Product' and LEADERBOARD_FIELDS & set(kwargs):
+            invalidate_leaderboard()
+        category = kwargs.get('category', kwargs.get('category_id'))
+        if hasattr(category, 'resolve_expression'):
+            # Per-row categories (bulk_update's CASE): bump the rows'
+            # categories before and after the change
+            invalidate_queryset(self)
+            rows = super().update(**kwargs)
+            invalidate_queryset(self)
+            return rows
+        invalidate_queryset(self, getattr(category, 'pk', category))
+        return super().update(**kwargs)
+
+    update.alters_data = True
+
+    def update_denormalized(self, **kwargs):
+        """UPDATE maintained columns whose source write already invalidated"""
+        return super().update(**kwargs)
+
+    update_denormalized.alters_data = True
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = super().bulk_create(objs, *args, **kwargs)
+        if len(objs) > _bulk_threshold():
+            invalidate_all()
+        else:
+            for obj in objs:
+                invalidate_instance(obj)
+        return objs
+
+
+# Metrics ------------------------------------------------------------------
+
+_metrics = Counter()
+_metrics_pending = 0
+_metrics_flushed = time.monotonic()
+_metrics_lock = threading.Lock()
+
+
+def record(name, hit):
+    """Count one lookup against a named cache"""
+    _add_metric(name, 'hits' if hit else 'misses')
+
+
+def _count_invalidation(scope):
+    _add_metric('invalidations', scope)
+
+
+def _add_metric(name, event):
+    global _metrics_pending
+    with _metrics_lock:
+        _metrics[(name, event)] += 1
+        _metrics_pending += 1
+        should_flush = (
+            _metrics_pending >= _metrics_flush_every()
+            and time.monotonic() - _metrics_flushed >= _metrics_flush_interval()
+        )
+    if should_flush:
+        flush_metrics()
+
+
+def flush_metrics():
+    """Add this process's counters to the shared totals"""
+    global _metrics_pending, _metrics_flushed
+    with _metrics_lock:
+        pending = dict(_metrics)
+        _metrics.clear()
+        _metrics_pending = 0
+        _metrics_flushed = time.monotonic()
+    for (name, event), count in pending.items():
+        key = METRIC_KEY.format(name=name, event=event)
+        if not cache.add(key, count, None):
+            try:
+                cache.incr(key, count)
+            except ValueError:
+                cache.set(key, count, None)
+
+
+def metrics():
+    """Shared hit/miss totals per cache and invalidation totals per scope"""
+    flush_metrics()
+    keys = [METRIC_KEY.format(name=name, event=event)
+            for name in CACHE_NAMES for event in ('hits', 'misses')]
+    keys += [METRIC_KEY.format(name='invalidations', event=scope) for scope in SCOPE_NAMES]
+    values = cache.get_many(keys)
+
+    report = {}
+    for name in CACHE_NAMES:
+        hits = values.get(METRIC_KEY.format(name=name, event='hits'), 0)
+        misses = values.get(METRIC_KEY.format(name=name, event='misses'), 0)
+        lookups = hits + misses
+        report[name] = {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / lookups if lookups else None,
+        }
+    report['invalidations'] = {
+        scope: values.get(METRIC_KEY.format(name='invalidations', event=scope), 0)
+        for scope in SCOPE_NAMES
+    }
+    return report
+
+
+def reset_metrics():
+    global _metrics_pending
+    with _metrics_lock:
+        _metrics.clear()
+        _metrics_pending = 0
+    cache.delete_many(
+        [METRIC_KEY.format(name=name, event=event)
+         for name in CACHE_NAMES for event in ('hits', 'misses')]
+        + [METRIC_KEY.format(name='invalidations', event=scope) for scope in SCOPE_NAMES]
+    )
@@ -0,0 +1,94 @@
+"""
+Inventory ledger and low-stock queue.
+
+Every change to ``Product.stock`` is a ``StockMovement`` row: receipts and
+returns add units, sales remove them, adjustments do either. The ledger is
+append-only; a mistake is corrected with another adjustment.
+
+Stock is never read, changed in Python and written back. ``move()`` (and
+``place_order()`` for sales) applies each change with one conditional
+``UPDATE ... SET stock = stock + delta WHERE stock >= -delta``
+(``ProductQuerySet.change_stock``), so concurrent checkouts can neither
+oversell nor lose each other's updates, and no row is locked before the
+update itself, which holds its lock only until the short transaction that
+writes the movement commits. ``Product.save()`` never writes ``stock``.
+
+The same UPDATE maintains ``Product.low_stock_since``: it is set when stock
+falls to the reorder level and cleared when it rises above it, so the
+low-stock queue (``Product.objects.low_stock_queue()``, the "Low-stock
+queue" admin) is a partial-index scan instead of a pass over the catalog.
+
+``drift()`` compares every product's stock with the sum of its ledger in one
+query; ``reconcile()`` (``manage.py reconcile_stock``) reports the
+differences and, with ``fix``, resets the stock to the ledger balance.
+"""
+from django.db import transaction
+from django.db.models import F, IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from . import invalidation
+from .models import Product, StockMovement
+
+
+class InsufficientStock(Exception):
+    """The movement would take the product's stock below zero"""
+
+
+def move(product, kind, quantity, note='', order=None, user=None):
+    """
+    Apply ``quantity`` units (negative removes) to ``product`` and record
+    it in the ledger. Raises ``InsufficientStock`` instead of going below
+    zero. Returns the ``StockMovement``.
+    """
+    movement = StockMovement(
+        product_id=getattr(product, 'pk', product), kind=kind, quantity=quantity,
+        note=note, order=order, created_by=user,
+    )
+    return apply(movement)
+
+
+def apply(movement):
+    """Apply and save an unsaved ``StockMovement`` (e.g. from the admin)"""
+    movement.full_clean()
+    products = Product.objects.filter(pk=movement.product_id)
+    with transaction.atomic():
+        if not products.change_stock(movement.quantity):
+            raise InsufficientStock(f'Not enough stock to remove {-movement.quantity} units')
+        movement.save()
+        # Stock levels show on cached cards and detail pages
+        invalidation.invalidate_queryset(products)
+    return movement
+
+
+def ledger_balance():
+    """Subquery: the sum of the outer product's movements"""
+    movements = StockMovement.objects.filter(product=OuterRef('pk')).order_by().values('product')
+    return Coalesce(Subquery(movements.annotate(total=Sum('quantity')).values('total')), 0,
+                    output_field=IntegerField())
+
+
+def drift(queryset=None):
+    """Products whose stock differs from their ledger, annotated with ``ledger``"""
+    if queryset is None:
+        queryset = Product.objects.all()
+    return queryset.annotate(ledger=ledger_balance()).exclude(stock=F('ledger')).order_by('pk')
+
+
+def reconcile(fix=False):
+    """
+    List (product id, name, stock, ledger) for every product out of line
+    with its ledger; with ``fix``, set their stock to the ledger balance.
+    """
+    drifted = list(drift().values_list('pk', 'name', 'stock', 'ledger'))
+    if fix:
+        for pk, *_ in drifted:
+            # Lock the row so no checkout moves stock between reading the
+            # ledger and writing the balance; one short transaction each
+            with transaction.atomic():
+                products = Product.objects.select_for_update().filter(pk=pk)
+                balance = products.annotate(ledger=ledger_balance()).values_list('ledger', flat=True).first()
+                if balance is None:
+                    continue
+                products.update_denormalized(stock=max(balance, 0))
+                products.refresh_low_stock()
+                invalidation.invalidate_queryset(products)
+    return drifted
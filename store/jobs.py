@@ -0,0 +1,234 @@
+"""
+Background jobs for slow side effects.
+
+Sending email, computing image placeholders and other work that talks to
+outside services is queued instead of run inside the request. A job is a
+registered task name plus JSON arguments:
+
+    @jobs.task('send_email')
+    def send_email(subject, body, to, ...): ...
+
+    jobs.enqueue('send_email', {'subject': ..., 'to': [...]}, key=f'welcome:{user.pk}')
+
+``JOB_BACKEND`` selects where jobs run:
+
+* ``DatabaseBackend`` (the default) stores each job as a ``Job`` row in the
+  transaction that enqueues it, so a job exists exactly when the data it is
+  about was committed. ``manage.py run_jobs`` workers, or on Vercel the
+  cron calling the ``run_jobs`` view every minute, claim due jobs with
+  ``SELECT ... FOR UPDATE SKIP LOCKED`` plus a conditional UPDATE, so any
+  number of them can run side by side. A claim is a lease of
+  ``JOB_LEASE_SECONDS``; the job of a worker that died is taken up again
+  once it expires.
+* ``ThreadBackend`` runs jobs in a thread pool of the web process
+  (``JOB_THREAD_WORKERS``) once the transaction commits, for development
+  without a worker. Nothing survives a restart.
+
+A failing job is retried ``JOB_RETRY_DELAY`` seconds later, doubling with
+every attempt up to ``JOB_RETRY_MAX_DELAY``, until it has run
+``max_attempts`` times; then it is marked failed with its last error and
+kept for the admin. Tasks should therefore be safe to run twice.
+
+A job enqueued with an idempotency ``key`` is created once per key:
+enqueuing again returns the existing job (``DatabaseBackend``; succeeded
+jobs keep their key until purged after ``JOB_RETENTION_DAYS``) or does
+nothing (``ThreadBackend``, per process).
+"""
+import logging
+import threading
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.db import IntegrityError, connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+# Task name -> (function, max attempts)
+registry = {}
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def task(name, max_attempts=5):
+    """Register the decorated function as the task ``name``"""
+    def register(func):
+        registry[name] = (func, max_attempts)
+        return func
+    return register
+
+
+def retry_delay(attempts):
+    """Seconds to wait after the ``attempts``-th failed attempt"""
+    delay = _setting('JOB_RETRY_DELAY', 30) * 2 ** (attempts - 1)
+    return min(delay, _setting('JOB_RETRY_MAX_DELAY', 3600))
+
+
+def _call(name, arguments):
+    if name not in registry:
+        raise LookupError(f'No task registered as {name!r}')
+    func, _ = registry[name]
+    func(**arguments)
+
+
+# Database backend ---------------------------------------------------------
+
+class DatabaseBackend:
+    """Jobs are ``Job`` rows run by ``manage.py run_jobs``"""
+
+    def enqueue(self, name, arguments, key=None, run_at=None):
+        job = Job(
+            task=name, arguments=arguments, idempotency_key=key,
+            max_attempts=registry[name][1], run_at=run_at or timezone.now(),
+        )
+        if key is None:
+            job.save()
+            return job
+        try:
+            with transaction.atomic():
+                job.save()
+        except IntegrityError:
+            return Job.objects.get(idempotency_key=key)
+        return job
+
+
+def release_expired(now=None):
+    """Requeue running jobs whose worker's lease expired; returns jobs released"""
+    now = now or timezone.now()
+    return Job.objects.filter(status='running', locked_until__lt=now).update(status='queued', locked_by='')
+
+
+def claim(limit, now=None):
+    """Lease up to ``limit`` due jobs to this caller, oldest first"""
+    now = now or timezone.now()
+    token = uuid.uuid4().hex
+    with transaction.atomic():
+        due = Job.objects.select_for_update(skip_locked=True).filter(
+            status='queued', run_at__lte=now
+        ).order_by('run_at', 'pk').values_list('pk', flat=True)[:limit]
+        # The status condition keeps two workers from claiming one job on
+        # databases without row locks (SQLite)
+        Job.objects.filter(pk__in=list(due), status='queued').update(
+            status='running', attempts=F('attempts') + 1, locked_by=token,
+            locked_until=now + timedelta(seconds=_setting('JOB_LEASE_SECONDS', 300)),
+        )
+    return list(Job.objects.filter(locked_by=token, status='running').order_by('run_at', 'pk'))
+
+
+def run(job):
+    """Run a claimed job and record the outcome; returns True if it succeeded"""
+    try:
+        _call(job.task, job.arguments)
+    except Exception as exc:
+        now = timezone.now()
+        retry = job.attempts < job.max_attempts and job.task in registry
+        logger.warning('Job %s failed (attempt %s of %s)', job, job.attempts, job.max_attempts, exc_info=True)
+        Job.objects.filter(pk=job.pk, locked_by=job.locked_by).update(
+            status='queued' if retry else 'failed',
+            run_at=now + timedelta(seconds=retry_delay(job.attempts)) if retry else job.run_at,
+            finished_at=None if retry else now,
+            locked_by='', locked_until=None,
+            last_error=''.join(traceback.format_exception_only(type(exc), exc)).strip(),
+        )
+        return False
+    Job.objects.filter(pk=job.pk, locked_by=job.locked_by).update(
+        status='succeeded', finished_at=timezone.now(), locked_by='', locked_until=None, last_error='',
+    )
+    return True
+
+
+def run_due(limit=None):
+    """Run every due job (at most ``limit``); returns (succeeded, failed)"""
+    release_expired()
+    succeeded = failed = 0
+    batch = _setting('JOB_BATCH_SIZE', 10)
+    while limit is None or succeeded + failed < limit:
+        jobs = claim(batch if limit is None else min(batch, limit - succeeded - failed))
+        if not jobs:
+            break
+        for job in jobs:
+            if run(job):
+                succeeded += 1
+            else:
+                failed += 1
+    return succeeded, failed
+
+
+def purge(now=None):
+    """Delete succeeded jobs older than ``JOB_RETENTION_DAYS``; returns jobs deleted"""
+    now = now or timezone.now()
+    cutoff = now - timedelta(days=_setting('JOB_RETENTION_DAYS', 14))
+    deleted, _ = Job.objects.filter(status='succeeded', finished_at__lt=cutoff).delete()
+    return deleted
+
+
+# Thread backend -----------------------------------------------------------
+
+class ThreadBackend:
+    """Jobs run in this process's thread pool after commit (development)"""
+
+    def __init__(self):
+        self.executor = ThreadPoolExecutor(
+            max_workers=_setting('JOB_THREAD_WORKERS', 4), thread_name_prefix='jobs'
+        )
+        self.keys = set()
+        self.lock = threading.Lock()
+
+    def enqueue(self, name, arguments, key=None, run_at=None):
+        if key is not None:
+            with self.lock:
+                if key in self.keys:
+                    return None
+                self.keys.add(key)
+        delay = (run_at - timezone.now()).total_seconds() if run_at else 0
+        transaction.on_commit(lambda: self._submit(name, arguments, 1, delay))
+        return None
+
+    def _submit(self, name, arguments, attempt, delay=0):
+        if delay > 0:
+            timer = threading.Timer(delay, self.executor.submit, (self._run, name, arguments, attempt))
+            timer.daemon = True
+            timer.start()
+        else:
+            self.executor.submit(self._run, name, arguments, attempt)
+
+    def _run(self, name, arguments, attempt):
+        try:
+            _call(name, arguments)
+        except Exception:
+            max_attempts = registry[name][1] if name in registry else 0
+            logger.warning('Job %s failed (attempt %s of %s)', name, attempt, max_attempts, exc_info=True)
+            if attempt < max_attempts:
+                self._submit(name, arguments, attempt + 1, retry_delay(attempt))
+        finally:
+            connections.close_all()
+
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def get_backend():
+    path = _setting('JOB_BACKEND', 'store.jobs.DatabaseBackend')
+    with _backends_lock:
+        if path not in _backends:
+            _backends[path] = import_string(path)()
+        return _backends[path]
+
+
+def enqueue(name, arguments=None, key=None, run_at=None):
+    """
+    Queue the task ``name`` with JSON ``arguments``, once per ``key`` if
+    given, to run at ``run_at`` (default: now). Returns the ``Job`` with
+    the database backend.
+    """
+    if name not in registry:
+        raise LookupError(f'No task registered as {name!r}')
+    return get_backend().enqueue(name, arguments or {}, key=key, run_at=run_at)
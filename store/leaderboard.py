@@ -0,0 +1,93 @@
+"""
+Top-rated products leaderboard.
+
+Rankings use a Bayesian average so a single 5-star review cannot outrank a
+product with dozens of good reviews:
+
+    score = (C * m + rating_sum) / (C + approved_review_count)
+
+where ``m`` is the mean rating across the whole catalog and ``C`` is the
+prior weight (``TOP_RATED_PRIOR_WEIGHT``). Ranked lists are stored in the
+Django cache globally and per category, keyed by the leaderboard generation
+that the testimonial signals bump (see ``invalidation.py``).
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import ExpressionWrapper, F, FloatField, Sum, Value
+from django.db.models.functions import Cast
+from . import invalidation
+from .models import Product
+
+CACHE_KEY = 'store:top_rated:{scope}:{generation}'
+GLOBAL_SCOPE = 'all'
+
+
+def _limit():
+    return getattr(settings, 'TOP_RATED_LIMIT', 3)
+
+
+def _prior_weight():
+    return getattr(settings, 'TOP_RATED_PRIOR_WEIGHT', 5)
+
+
+def _cache_timeout():
+    return getattr(settings, 'TOP_RATED_CACHE_TIMEOUT', 60 * 60)
+
+
+def _cache_key(category_id=None):
+    return CACHE_KEY.format(scope=category_id or GLOBAL_SCOPE, generation=invalidation.leaderboard_generation())
+
+
+def catalog_mean_rating():
+    """Return the mean approved rating across all products (the prior)"""
+    totals = Product.objects.aggregate(
+        reviews=Sum('approved_review_count'),
+        ratings=Sum('rating_sum')
+    )
+    if not totals['reviews']:
+        return 0.0
+    return totals['ratings'] / totals['reviews']
+
+
+def compute_top_rated(category_id=None, limit=None):
+    """Rank products by Bayesian-weighted rating straight from the database"""
+    prior_weight = _prior_weight()
+    prior_mean = catalog_mean_rating()
+    products = Product.objects.filter(available=True, approved_review_count__gt=0)
+    if category_id:
+        products = products.filter(category_id=category_id)
+
+    products = products.annotate(
+        score=ExpressionWrapper(
+            (Value(prior_weight * prior_mean) + Cast(F('rating_sum'), FloatField()))
+            / (Value(prior_weight) + F('approved_review_count')),
+            output_field=FloatField()
+        )
+    ).order_by('-score', '-approved_review_count', 'id')
+
+    return [
+        {
+            'id': product.id,
+            'name': product.name,
+            'slug': product.slug,
+            'price': product.price,
+            'avg_rating': product.avg_rating,
+            'review_count': product.approved_review_count,
+            'score': product.score,
+        }
+        for product in products.only(
+            'id', 'name', 'slug', 'price', 'avg_rating', 'approved_review_count', 'rating_sum'
+        )[:limit or _limit()]
+    ]
+
+
+def get_top_rated(category_id=None):
+    """Return the cached leaderboard for the catalog or a single category"""
+    key = _cache_key(category_id)
+    entries = cache.get(key)
+    invalidation.record('leaderboard', entries is not None)
+    if entries is None:
+        entries = compute_top_rated(category_id)
+        cache.set(key, entries, _cache_timeout())
+    return entries
+
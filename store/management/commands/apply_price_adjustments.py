@@ -0,0 +1,13 @@
+# store/management/commands/apply_price_adjustments.py
+from django.core.management.base import BaseCommand
+from store import pricing
+
+
+class Command(BaseCommand):
+    help = 'Apply scheduled price adjustments whose effective time has passed (run from cron)'
+
+    def handle(self, *args, **options):
+        applied = pricing.apply_due_adjustments()
+        for adjustment, changed in applied:
+            self.stdout.write(f"💰 {adjustment}: {changed} products repriced")
+        self.stdout.write(self.style.SUCCESS(f"✅ {len(applied)} price adjustments applied"))
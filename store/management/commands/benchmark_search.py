@@ -0,0 +1,58 @@
+# store/management/commands/benchmark_search.py
+import statistics
+import time
+from django.core.management.base import BaseCommand
+from store import search
+from store.models import Product
+
+DEFAULT_QUERIES = [
+    'concrete mixer',
+    'JZC350',
+    'jzc',
+    'block machine',
+    'clamps 120',
+    'hoist',
+    'rebar cutter',
+    'wheel barrow',
+]
+
+
+class Command(BaseCommand):
+    help = 'Measure product search latency (p50/p95) against the active search backend'
+
+    def add_arguments(self, parser):
+        parser.add_argument('queries', nargs='*', help='Queries to run (defaults to a built-in set)')
+        parser.add_argument('--runs', type=int, default=50, help='Timed runs per query')
+        parser.add_argument('--page-size', type=int, default=12, help='Results fetched per query')
+
+    def handle(self, *args, **options):
+        queries = options['queries'] or DEFAULT_QUERIES
+        backend = 'postgresql' if search.using_postgres() else 'local inverted index'
+        base = Product.objects.filter(available=True).select_related('category')
+
+        # Warm up: builds the local index once, primes connections
+        for query in queries:
+            list(search.search_products(base, query)[:options['page_size']])
+
+        self.stdout.write(f"🔍 Backend: {backend} — {options['runs']} runs per query")
+        all_timings = []
+        for query in queries:
+            timings = []
+            for _ in range(options['runs']):
+                start = time.perf_counter()
+                results = list(search.search_products(base, query)[:options['page_size']])
+                timings.append((time.perf_counter() - start) * 1000)
+            all_timings.extend(timings)
+            self.stdout.write(
+                f"  {query!r:24} {len(results):3d} hits  "
+                f"p50 {statistics.median(timings):7.2f} ms  p95 {self.p95(timings):7.2f} ms"
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"📊 Overall p50 {statistics.median(all_timings):.2f} ms, p95 {self.p95(all_timings):.2f} ms"
+        ))
+
+    @staticmethod
+    def p95(timings):
+        ordered = sorted(timings)
+        return ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))]
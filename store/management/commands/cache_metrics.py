@@ -0,0 +1,41 @@
+# store/management/commands/cache_metrics.py
+from django.core.management.base import BaseCommand
+from store import invalidation
+
+
+class Command(BaseCommand):
+    help = 'Show cache hit/miss rates and invalidation counts for the catalog caches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Clear the shared counters after printing them',
+        )
+        parser.add_argument(
+            '--invalidate-all',
+            action='store_true',
+            help='Retire every cached catalog entry (bumps the generation epoch)',
+        )
+
+    def handle(self, *args, **options):
+        report = invalidation.metrics()
+
+        self.stdout.write("📊 Cache lookups")
+        for name in invalidation.CACHE_NAMES:
+            stats = report[name]
+            hit_rate = f"{stats['hit_rate']:.1%}" if stats['hit_rate'] is not None else '—'
+            self.stdout.write(
+                f"   {name:<14} hits {stats['hits']:>8}   misses {stats['misses']:>8}   hit rate {hit_rate}"
+            )
+
+        self.stdout.write("🔄 Invalidations")
+        for scope, count in report['invalidations'].items():
+            self.stdout.write(f"   {scope:<14} {count:>8}")
+
+        if options['reset']:
+            invalidation.reset_metrics()
+            self.stdout.write(self.style.SUCCESS("✅ Counters reset"))
+        if options['invalidate_all']:
+            invalidation.invalidate_all()
+            self.stdout.write(self.style.SUCCESS("✅ All catalog caches invalidated"))
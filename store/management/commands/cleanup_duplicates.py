@@ -0,0 +1,52 @@
+# store/management/commands/cleanup_duplicates.py
+from django.core.management.base import BaseCommand
+from store import dedupe
+from store.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Merge products with the same name into the oldest one, keeping their orders, reviews and images'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report the duplicate groups and what would be moved without writing anything',
+        )
+        parser.add_argument(
+            '--show',
+            type=int,
+            default=50,
+            help='Duplicate groups listed',
+        )
+
+    def handle(self, *args, **options):
+        groups = dedupe.find_duplicates()
+        if not groups.survivor_of:
+            self.stdout.write(self.style.SUCCESS("✅ No duplicate products"))
+            return
+
+        listed = groups.groups()
+        for survivor, duplicates in listed[:options['show']]:
+            ids = ', '.join(str(row['id']) for row in duplicates)
+            self.stdout.write(
+                self.style.WARNING(f"'{survivor['name']}' (#{survivor['id']}): merging {len(duplicates)} duplicates ({ids})")
+            )
+        if len(listed) > options['show']:
+            self.stdout.write(f"   … and {len(listed) - options['show']} more groups")
+
+        stats = dedupe.merge_duplicates(groups, dry_run=options['dry_run'])
+        if options['dry_run']:
+            self.stdout.write("🔍 Dry run, nothing written")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"✅ {stats['groups']} groups: {stats['products_deleted']} products "
+                f"{'would be ' if options['dry_run'] else ''}deleted; moved {stats['order_items']} order items "
+                f"({stats['order_lines_merged']} merged), {stats['cart_items']} cart items "
+                f"({stats['cart_lines_merged']} merged), {stats['testimonials']} testimonials "
+                f"({stats['testimonials_dropped']} dropped), {stats['images']} images, "
+                f"{stats['specifications']} specifications ({stats['specifications_dropped']} dropped); "
+                f"{stats['orders_refreshed']} orders refreshed"
+            )
+        )
+        self.stdout.write(self.style.SUCCESS(f"📊 Final count: {Product.objects.count()} products"))
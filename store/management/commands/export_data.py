@@ -0,0 +1,42 @@
+# store/management/commands/export_data.py
+from django.core.management.base import BaseCommand
+from store import exports
+
+
+class Command(BaseCommand):
+    help = 'Stream orders, products or testimonials as CSV or JSON Lines'
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', choices=sorted(exports.EXPORTS), help='What to export')
+        parser.add_argument(
+            '--format',
+            choices=sorted(exports.FORMATS),
+            default='csv',
+            help='Output format (default: csv)',
+        )
+        parser.add_argument(
+            '--output',
+            help='File to write to (default: standard output)',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=None,
+            help='Rows fetched (and prefetched) per database round trip',
+        )
+
+    def handle(self, *args, **options):
+        lines = exports.export_lines(options['name'], options['format'], chunk_size=options['chunk_size'])
+        if not options['output']:
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+
+        count = -1 if options['format'] == 'csv' else 0
+        with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+            for line in lines:
+                output.write(line)
+                count += 1
+        self.stdout.write(
+            self.style.SUCCESS(f"✅ Exported {max(count, 0)} {options['name']} to {options['output']}")
+        )
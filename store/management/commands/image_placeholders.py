@@ -0,0 +1,35 @@
+# store/management/commands/image_placeholders.py
+from django.core.management.base import BaseCommand
+from store import placeholders
+
+
+class Command(BaseCommand):
+    help = 'Compute image sizes, dominant colours and inline previews for product and category images'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Recompute every placeholder, not only missing or outdated ones',
+        )
+        parser.add_argument(
+            '--model',
+            choices=[model._meta.model_name for model in placeholders.placeholder_models()],
+            action='append',
+            help='Only process this model (repeatable)',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            help='Images downloaded and processed at once (default: IMAGE_PLACEHOLDER_WORKERS)',
+        )
+
+    def handle(self, *args, **options):
+        models = [
+            model for model in placeholders.placeholder_models()
+            if not options['model'] or model._meta.model_name in options['model']
+        ]
+        written, failed = placeholders.refresh(models, force=options['all'], workers=options['workers'])
+        self.stdout.write(self.style.SUCCESS(f"✅ {written} image placeholders written"))
+        if failed:
+            self.stdout.write(self.style.WARNING(f"⚠️ {failed} images could not be read; see the log"))
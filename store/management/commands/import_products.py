@@ -0,0 +1,102 @@
+# store/management/commands/import_products.py
+from django.core.management.base import BaseCommand, CommandError
+from store import importer
+
+
+class Command(BaseCommand):
+    help = 'Import or update products from a supplier price list (CSV, XLSX or JSON Lines)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Price list to import')
+        parser.add_argument(
+            '--format',
+            choices=sorted(importer.READERS),
+            help='File format (default: from the file extension)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Products written per bulk_create/bulk_update batch',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Show what would be created or changed without writing anything',
+        )
+        parser.add_argument(
+            '--no-update',
+            action='store_true',
+            help='Only create new products; leave existing ones untouched',
+        )
+        parser.add_argument(
+            '--create-categories',
+            action='store_true',
+            help='Create categories that do not exist yet instead of rejecting the row',
+        )
+        parser.add_argument(
+            '--product-type',
+            default='tool',
+            choices=sorted(importer.PRODUCT_TYPES),
+            help='Product type for new products whose row has none',
+        )
+        parser.add_argument(
+            '--supplier',
+            help='Sync mode: match rows to this supplier\'s products by the sku column',
+        )
+        parser.add_argument(
+            '--retire-missing',
+            action='store_true',
+            help='With --supplier, mark the supplier\'s products missing from the file unavailable',
+        )
+        parser.add_argument(
+            '--show',
+            type=int,
+            default=50,
+            help='Changes listed in a dry run, and errors listed after any run',
+        )
+
+    def handle(self, *args, **options):
+        if options['retire_missing'] and not options['supplier']:
+            raise CommandError('--retire-missing needs --supplier')
+        products = importer.ProductImporter(
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run'],
+            update_existing=not options['no_update'],
+            create_categories=options['create_categories'],
+            product_type=options['product_type'],
+            max_changes=options['show'],
+            supplier=options['supplier'],
+            retire_missing=options['retire_missing'],
+        )
+        try:
+            stats = products.run(importer.read_rows(options['path'], options['format']))
+        except (OSError, importer.ImportFileError) as e:
+            raise CommandError(str(e))
+
+        if options['dry_run']:
+            self.stdout.write("🔍 Dry run, nothing written")
+            for action, slug, values in products.changes:
+                if action == 'create':
+                    self.stdout.write(self.style.SUCCESS(f"   + {slug}: {values['name']} ₵{values['price']}"))
+                else:
+                    diff = ', '.join(f"{field} {old!r} → {new!r}" for field, (old, new) in values.items())
+                    self.stdout.write(self.style.WARNING(f"   ~ {slug}: {diff}"))
+            hidden = stats['created'] + stats['updated'] - len(products.changes)
+            if hidden > 0:
+                self.stdout.write(f"   … and {hidden} more")
+
+        for error in products.errors[:options['show']]:
+            self.stdout.write(self.style.ERROR(f"❌ {error}"))
+        if len(products.errors) > options['show']:
+            self.stdout.write(self.style.ERROR(f"❌ … and {len(products.errors) - options['show']} more errors"))
+
+        rate = stats['rows'] / stats['seconds'] if stats['seconds'] else 0
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"✅ {stats['rows']} rows in {stats['seconds']:.2f}s ({rate:,.0f} rows/s): "
+                f"{stats['created']} created, {stats['updated']} updated, {stats['unchanged']} unchanged, "
+                f"{stats['retired']} retired, {stats['skipped']} skipped, {stats['errors']} errors"
+                + (f", {stats['categories_created']} categories created" if stats['categories_created'] else '')
+            )
+        )
@@ -0,0 +1,46 @@
+# store/management/commands/rebuild_product_ratings.py
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Sum
+from store.models import Product, Testimonial, average_rating
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the denormalized rating aggregates on Product from approved testimonials'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of products written per bulk_update batch',
+        )
+
+    def handle(self, *args, **options):
+        aggregates = {
+            row['product_id']: (row['review_count'], row['rating_total'])
+            for row in Testimonial.objects.filter(approved=True)
+                                          .values('product_id')
+                                          .annotate(review_count=Count('id'), rating_total=Sum('rating'))
+                                          .order_by()
+        }
+
+        changed = []
+        with transaction.atomic():
+            products = Product.objects.select_for_update().only(*Product.RATING_FIELDS)
+            for product in products.iterator(chunk_size=options['batch_size']):
+                count, total = aggregates.get(product.id, (0, 0))
+                avg = average_rating(count, total)
+                if (product.approved_review_count, product.rating_sum, product.avg_rating) != (count, total, avg):
+                    product.approved_review_count = count
+                    product.rating_sum = total
+                    product.avg_rating = avg
+                    changed.append(product)
+
+            # bulk_update goes through InvalidatingQuerySet.update(), which
+            # retires the cached leaderboards once this transaction commits
+            Product.objects.bulk_update(changed, Product.RATING_FIELDS, batch_size=options['batch_size'])
+
+        self.stdout.write(
+            self.style.SUCCESS(f"✅ Rebuilt ratings: {len(changed)} products updated, {len(aggregates)} with reviews")
+        )
@@ -0,0 +1,18 @@
+# store/management/commands/rebuild_search_index.py
+from django.core.management.base import BaseCommand
+from store import invalidation, search
+
+
+class Command(BaseCommand):
+    help = 'Recompute product search vectors (PostgreSQL) and invalidate local search indexes'
+
+    def handle(self, *args, **options):
+        if search.using_postgres():
+            updated = search.rebuild_search_vectors()
+            self.stdout.write(self.style.SUCCESS(f"✅ Rebuilt search vectors for {updated} products"))
+        else:
+            index = search.InvertedIndex.build()
+            self.stdout.write(
+                self.style.SUCCESS(f"✅ Local index: {index.doc_count} products, {len(index.terms)} terms")
+            )
+        invalidation.invalidate_all()
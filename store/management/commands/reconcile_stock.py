@@ -0,0 +1,25 @@
+# store/management/commands/reconcile_stock.py
+from django.core.management.base import BaseCommand
+from store import inventory
+
+
+class Command(BaseCommand):
+    help = 'Compare every product\'s stock with its stock movement ledger'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fix',
+            action='store_true',
+            help='Set the stock of products that disagree to their ledger balance',
+        )
+
+    def handle(self, *args, **options):
+        drifted = inventory.reconcile(fix=options['fix'])
+        for pk, name, stock, ledger in drifted:
+            self.stdout.write(self.style.WARNING(f"⚠️ {name} (#{pk}): stock {stock}, ledger {ledger}"))
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS("✅ Every product's stock matches its ledger"))
+        elif options['fix']:
+            self.stdout.write(self.style.SUCCESS(f"✅ {len(drifted)} products reset to their ledger balance"))
+        else:
+            self.stdout.write(f"🔍 {len(drifted)} products differ; run with --fix to reset them to the ledger")
@@ -0,0 +1,39 @@
+# store/management/commands/rollup_sales.py
+from datetime import datetime
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from store import reports
+
+
+class Command(BaseCommand):
+    help = 'Update the daily sales rollups from orders changed since the last run'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Discard every rollup and rebuild from all orders (e.g. after deleting orders)',
+        )
+        parser.add_argument(
+            '--since',
+            help='Rebuild the days of orders changed on or after this date (YYYY-MM-DD)',
+        )
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            try:
+                since = datetime.strptime(options['since'], '%Y-%m-%d')
+            except ValueError:
+                raise CommandError('--since must be a date in YYYY-MM-DD format')
+            if settings.USE_TZ:
+                since = timezone.make_aware(since)
+
+        result = reports.refresh_rollups(rebuild=options['rebuild'], since=since)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"✅ Sales rollups updated: {result['orders']} orders, "
+                f"{result['days']} days rebuilt, {result['rows']} rows written"
+            )
+        )
@@ -0,0 +1,46 @@
+# store/management/commands/run_jobs.py
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from store import jobs
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs (email, image placeholders...) until stopped'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Run the jobs that are due and exit instead of waiting for more',
+        )
+        parser.add_argument(
+            '--purge',
+            action='store_true',
+            help='Delete succeeded jobs older than JOB_RETENTION_DAYS and exit',
+        )
+
+    def handle(self, *args, **options):
+        if options['purge']:
+            self.stdout.write(self.style.SUCCESS(f"✅ {jobs.purge()} finished jobs deleted"))
+            return
+        if options['once']:
+            self.report(*jobs.run_due())
+            return
+
+        poll = getattr(settings, 'JOB_POLL_SECONDS', 2)
+        self.stdout.write(f"🚀 Waiting for jobs (polling every {poll}s, Ctrl+C to stop)")
+        try:
+            while True:
+                succeeded, failed = jobs.run_due(limit=getattr(settings, 'JOB_BATCH_SIZE', 10))
+                if succeeded or failed:
+                    self.report(succeeded, failed)
+                else:
+                    time.sleep(poll)
+        except KeyboardInterrupt:
+            self.stdout.write("👋 Stopped")
+
+    def report(self, succeeded, failed):
+        self.stdout.write(self.style.SUCCESS(f"✅ {succeeded} jobs done"))
+        if failed:
+            self.stdout.write(self.style.WARNING(f"⚠️ {failed} jobs failed; they are retried with backoff"))
@@ -1,9 +1,10 @@
 # store/management/commands/upload_construction_machines.py
 import re
+from collections import Counter
 from decimal import Decimal
 from django.core.management.base import BaseCommand
-from django.db import transaction
-from store.models import Product, Category
+from store import importer
+from store.models import Category
 
 class Command(BaseCommand):
     help = 'Upload construction machines and heavy equipment'
@@ -145,75 +146,56 @@ class Command(BaseCommand):
         49 AUTOMATIC MACHINE PAVMENT MOULD 15294
         """
         
-        lines = raw_data.strip().split('\n')
-        created_count = 0
-        errors = []
-        
-        with transaction.atomic():
-            for line in lines:
-                product_data = self.parse_product_line(line)
-                if not product_data:
-                    continue
-                
-                try:
-                    # Categorize based on equipment type
-                    category_slug = self.categorize_product(product_data['id'], product_data['name'])
-                    category = Category.objects.get(slug=category_slug)
-                    
-                    # Create proper product name
-                    proper_name = self.generate_proper_name(product_data['name'])
-                    
-                    # Create slug
-                    slug = re.sub(r'[^\w\s-]', '', proper_name.lower()).strip().replace(' ', '-')[:200]
-                    
-                    # Ensure unique slug
-                    counter = 1
-                    original_slug = slug
-                    while Product.objects.filter(slug=slug).exists():
-                        slug = f"{original_slug}-{counter}"
-                        counter += 1
-                    
-                    # Skip products with price 0 or empty
-                    if product_data['price'] == 0:
-                        self.stdout.write(
-                            self.style.WARNING(f"⚠️ Skipping {product_data['id']:2d}. {proper_name} - Price is 0")
-                        )
-                        continue
-                    
-                    # Create product with 10% price increase and 20 stock
-                    product = Product(
-                        name=proper_name,
-                        slug=slug,
-                        description=self.generate_description(product_data['name'], category_slug),
-                        price=Decimal(product_data['price']),
-                        category=category,
-                        product_type='tool',
-                        stock=20,
-                        available=True,
-                        apply_price_increase=True  # This applies the 10% increase
-                    )
-                    product.save()
-                    
-                    created_count += 1
-                    self.stdout.write(
-                        self.style.SUCCESS(f"✅ {product_data['id']:2d}. {proper_name} - ₵{product.price} (Stock: 20)")
-                    )
-                    
-                except Exception as e:
-                    errors.append(f"Error {product_data['id']}: {str(e)}")
-                    self.stdout.write(
-                        self.style.ERROR(f"❌ {product_data['id']:2d}. {product_data.get('name', 'Unknown')} - {e}")
-                    )
-        
+        rows = []
+        slug_counts = Counter()
+        for line in raw_data.strip().split('\n'):
+            product_data = self.parse_product_line(line)
+            if not product_data:
+                continue
+            proper_name = self.generate_proper_name(product_data['name'])
+            # Skip products with price 0 or empty
+            if product_data['price'] == 0:
+                self.stdout.write(
+                    self.style.WARNING(f"⚠️ Skipping {product_data['id']:2d}. {proper_name} - Price is 0")
+                )
+                continue
+            category_slug = self.categorize_product(product_data['id'], product_data['name'])
+            # Same slugs as the per-row upload used to give (-1, -2 for repeated
+            # names), so running the upload again updates instead of duplicating
+            slug = re.sub(r'[^\w\s-]', '', proper_name.lower()).strip().replace(' ', '-')[:200]
+            slug_counts[slug] += 1
+            if slug_counts[slug] > 1:
+                slug = f"{slug}-{slug_counts[slug] - 1}"
+            rows.append({
+                'sku': str(product_data['id']),
+                'name': proper_name,
+                'slug': slug,
+                'category': category_slug,
+                'description': self.generate_description(product_data['name'], category_slug),
+                # 10% price increase and 20 units in stock
+                'price': (product_data['price'] * Decimal('1.10')).quantize(Decimal('0.01')),
+                'stock': 20,
+                'available': True,
+                'product_type': 'tool',
+            })
+
+        # Supplier sync keyed on the price list's item numbers: re-running
+        # only writes products whose line changed and never duplicates
+        products = importer.ProductImporter(supplier='einhell')
+        stats = products.run(rows)
+
         # Final report
         self.stdout.write("\n" + "="*60)
-        self.stdout.write(self.style.SUCCESS(f"🎉 UPLOAD COMPLETE: {created_count} construction machines created"))
+        self.stdout.write(self.style.SUCCESS(
+            f"🎉 UPLOAD COMPLETE: {stats['created']} construction machines created, "
+            f"{stats['updated']} updated, {stats['unchanged']} unchanged"
+        ))
         self.stdout.write(self.style.SUCCESS(f"💰 All prices include 10% increase"))
         self.stdout.write(self.style.SUCCESS(f"📦 All products have 20 units in stock"))
         
-        if errors:
-            self.stdout.write(self.style.ERROR(f"❌ {len(errors)} errors:"))
-            for error in errors[:10]:
+        if products.errors:
+            self.stdout.write(self.style.ERROR(f"❌ {len(products.errors)} errors:"))
+            for error in products.errors[:10]:
                 self.stdout.write(self.style.ERROR(f"  - {error}"))
     
     def parse_product_line(self, line):
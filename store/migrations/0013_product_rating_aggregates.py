@@ -0,0 +1,53 @@
+# Generated by Django 4.2.7 on 2026-10-18 01:17
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from store.models import average_rating
+
+
+def backfill_rating_aggregates(apps, schema_editor):
+    Product = apps.get_model('store', 'Product')
+    Testimonial = apps.get_model('store', 'Testimonial')
+    rows = (
+        Testimonial.objects.filter(approved=True)
+        .values('product_id')
+        .annotate(review_count=Count('id'), rating_total=Sum('rating'))
+        .order_by()
+    )
+    for row in rows:
+        Product.objects.filter(pk=row['product_id']).update(
+            approved_review_count=row['review_count'],
+            rating_sum=row['rating_total'],
+            avg_rating=average_rating(row['review_count'], row['rating_total']),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0012_specificationgroup_technicalspecification_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='approved_review_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='avg_rating',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), editable=False, max_digits=3),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['-avg_rating', '-approved_review_count'], name='store_produ_avg_rat_27c75e_idx'),
+        ),
+        migrations.RunPython(backfill_rating_aggregates, migrations.RunPython.noop),
+    ]
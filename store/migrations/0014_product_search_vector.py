@@ -0,0 +1,46 @@
+# Generated by Django 4.2.7 on 2026-10-18 01:20
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    """GIN index and initial vectors; other databases use the local index"""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS store_product_search_vector_gin "
+        "ON store_product USING gin (search_vector)"
+    )
+    schema_editor.execute("""
+        UPDATE store_product SET search_vector =
+            setweight(to_tsvector('simple', coalesce(name, '')), 'A') ||
+            setweight(to_tsvector('simple', coalesce((
+                SELECT string_agg(spec_value, ' ')
+                FROM store_technicalspecification
+                WHERE product_id = store_product.id
+            ), '')), 'B') ||
+            setweight(to_tsvector('simple', coalesce(description, '')), 'C')
+    """)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS store_product_search_vector_gin")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0013_product_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.7 on 2026-10-18 01:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0017_sales_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='supplier',
+            field=models.CharField(blank=True, help_text='Supplier whose price list this product syncs from', max_length=50),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='supplier_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='supplier_sku',
+            field=models.CharField(blank=True, help_text="Supplier's stable SKU or item code", max_length=100, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='product',
+            constraint=models.UniqueConstraint(condition=models.Q(('supplier_sku__isnull', False)), fields=('supplier', 'supplier_sku'), name='unique_supplier_sku'),
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 4.2.7 on 2026-10-18 01:52
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('store', '0018_product_supplier_sku'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceAdjustment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('description', models.CharField(blank=True, max_length=200)),
+                ('kind', models.CharField(choices=[('percent', 'Percentage'), ('amount', 'Fixed amount')], default='percent', max_length=10)),
+                ('value', models.DecimalField(decimal_places=2, help_text='Percent (10 = +10%) or cedis added to the price; negative values lower prices', max_digits=10)),
+                ('product_type', models.CharField(blank=True, choices=[('material', 'Building Material'), ('tool', 'Construction Tool'), ('safety', 'Safety Equipment'), ('plumbing', 'Plumbing Item'), ('electrical', 'Electrical Item'), ('finishing', 'Finishing Material'), ('roofing', 'Roofing Material')], max_length=20)),
+                ('supplier', models.CharField(blank=True, max_length=50)),
+                ('effective_at', models.DateTimeField(default=django.utils.timezone.now, help_text='Applied by manage.py apply_price_adjustments once this time has passed')),
+                ('status', models.CharField(choices=[('scheduled', 'Scheduled'), ('applied', 'Applied'), ('cancelled', 'Cancelled')], default='scheduled', editable=False, max_length=10)),
+                ('applied_at', models.DateTimeField(blank=True, editable=False, null=True)),
+                ('products_changed', models.PositiveIntegerField(default=0, editable=False)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='price_adjustments', to='store.category')),
+                ('created_by', models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-effective_at'],
+            },
+        ),
+        migrations.RemoveField(
+            model_name='product',
+            name='apply_price_increase',
+        ),
+        migrations.CreateModel(
+            name='PriceHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('old_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('new_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('effective_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('source', models.CharField(choices=[('adjustment', 'Price adjustment'), ('edit', 'Edited'), ('import', 'Imported')], default='edit', max_length=20)),
+                ('adjustment', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='history', to='store.priceadjustment')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='price_history', to='store.product')),
+            ],
+            options={
+                'verbose_name_plural': 'Price history',
+                'ordering': ['-effective_at', '-id'],
+                'indexes': [models.Index(fields=['product', '-effective_at'], name='store_price_product_5ee68a_idx')],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='priceadjustment',
+            index=models.Index(fields=['status', 'effective_at'], name='store_price_status_08308a_idx'),
+        ),
+    ]
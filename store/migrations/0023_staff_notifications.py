@@ -0,0 +1,34 @@
+# Generated by Django 4.2.7 on 2026-10-18 02:08
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0022_background_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StaffNotification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event', models.CharField(max_length=50)),
+                ('title', models.CharField(max_length=200)),
+                ('message', models.TextField(blank=True)),
+                ('read', models.BooleanField(default=False)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('order', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='notifications', to='store.order')),
+            ],
+            options={
+                'ordering': ['-created', '-id'],
+                'indexes': [models.Index(fields=['read', '-created'], name='store_staff_read_0dee11_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='staffnotification',
+            constraint=models.UniqueConstraint(fields=('event', 'order'), name='unique_order_notification'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 02:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0023_staff_notifications'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['available', '-featured', '-created', '-id'], name='store_produ_availab_c777dd_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 02:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0024_product_listing_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['updated'], name='store_order_updated_dccaf0_idx'),
+        ),
+    ]
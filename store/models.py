@@ -1,10 +1,19 @@
 from django.db import models
+from django.db.models import (
+    Case, Count, DecimalField, ExpressionWrapper, F, OuterRef, Q, Subquery, Sum, Value, When
+)
+from django.db.models.functions import Cast, Coalesce, Greatest, Now
+from django.db.models.lookups import GreaterThan
+from django.contrib.postgres.search import SearchVectorField
 from django.urls import reverse
 from cloudinary.models import CloudinaryField
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
-from decimal import Decimal
+from django.utils import timezone
+from decimal import Decimal, ROUND_HALF_UP
 import re
+from . import images
+from .invalidation import InvalidatingQuerySet
 
 
 class UserProfile(models.Model):
@@ -44,7 +53,57 @@ class UserProfile(models.Model):
         verbose_name_plural = "User Profiles"
 
 
-class Category(models.Model):
+class CategoryQuerySet(InvalidatingQuerySet):
+    def with_product_counts(self):
+        """Annotate live available-product counts in the same query"""
+        return self.annotate(
+            annotated_product_count=Count('products', filter=Q(products__available=True))
+        )
+
+    def refresh_available_product_counts(self):
+        """Recompute the stored counts with one UPDATE (after bulk writes)"""
+        available = Product.objects.filter(
+            category=OuterRef('pk'), available=True
+        ).order_by().values('category').annotate(total=Count('id')).values('total')
+        return self.update(available_product_count=Coalesce(Subquery(available), 0))
+
+    def adjust_product_count(self, category_id, delta):
+        if delta:
+            self.filter(pk=category_id).update_denormalized(
+                available_product_count=Greatest(F('available_product_count') + delta, 0)
+            )
+
+
+class ImagePlaceholder(models.Model):
+    """
+    Intrinsic size, dominant colour and a tiny inline preview of ``image``,
+    computed offline by store/placeholders.py and never written by save()
+    """
+    PLACEHOLDER_FIELDS = ('image_width', 'image_height', 'image_color', 'image_placeholder', 'image_placeholder_for')
+
+    image_width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    image_height = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    image_color = models.CharField(max_length=7, blank=True, editable=False)
+    image_placeholder = models.TextField(blank=True, editable=False, help_text="Data URI of a 16px preview")
+    # Stored image value the fields above were computed from
+    image_placeholder_for = models.CharField(max_length=255, blank=True, editable=False)
+
+    class Meta:
+        abstract = True
+
+    def placeholder_attrs(self):
+        """``width``/``height`` and a background ``style`` for the image's <img>, once computed"""
+        attrs = {}
+        if self.image_width and self.image_height:
+            attrs['width'], attrs['height'] = self.image_width, self.image_height
+        if self.image_placeholder:
+            attrs['style'] = f'background: {self.image_color} url({self.image_placeholder}) center / cover no-repeat'
+        elif self.image_color:
+            attrs['style'] = f'background-color: {self.image_color}'
+        return attrs
+
+
+class Category(ImagePlaceholder):
     SERVICE_CATEGORIES = [
         ('building-materials', 'Building Materials'),
         ('construction-tools', 'Construction Tools'),
@@ -85,9 +144,14 @@ class Category(models.Model):
         default=False,
         help_text="Display this category in featured sections"
     )
+    # Maintained by the Product signal handlers and ProductQuerySet.update();
+    # never written by save()
+    available_product_count = models.PositiveIntegerField(default=0, editable=False)
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
 
+    objects = CategoryQuerySet.as_manager()
+
     class Meta:
         verbose_name_plural = "Categories"
         ordering = ['display_order', 'name']
@@ -95,6 +159,15 @@ class Category(models.Model):
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in ('available_product_count',) + self.PLACEHOLDER_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
     def get_absolute_url(self):
         return reverse('store:service_category', args=[self.slug])
     
@@ -103,11 +176,18 @@ class Category(models.Model):
         if self.service_type:
             return reverse('store:service_category', args=[self.slug])
         return reverse('store:product_list_by_category', args=[self.slug])
+
+    def image_url(self, slot='card'):
+        """Sized, format-negotiated URL of the category image (see store/images.py)"""
+        return images.url(self.image, slot)
     
     @property
     def product_count(self):
         """Return count of available products in this category"""
-        return self.products.filter(available=True).count()
+        annotated = getattr(self, 'annotated_product_count', None)
+        if annotated is not None:
+            return annotated
+        return self.available_product_count
     
     @property
     def is_service_category(self):
@@ -126,6 +206,8 @@ class SpecificationGroup(models.Model):
         help_text="Font Awesome icon class for this group"
     )
 
+    objects = InvalidatingQuerySet.as_manager()
+
     class Meta:
         ordering = ['display_order', 'name']
 
@@ -133,7 +215,74 @@ class SpecificationGroup(models.Model):
         return self.display_name
 
 
-class Product(models.Model):
+def average_rating(count, total):
+    """Mean of ``total`` over ``count`` ratings to the cent, halves rounded up"""
+    if not count:
+        return Decimal('0.00')
+    return (Decimal(total) / count).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+
+def _average_rating_sql(count, total):
+    """``average_rating()`` as an expression: half-up cents in integer arithmetic, then a DECIMAL"""
+    cents = (total * 200 + count) / (count * 2)
+    return Cast(cents, DecimalField(max_digits=5, decimal_places=2)) * Value(Decimal('0.01'))
+
+
+def _low_stock_since(stock=F('stock'), level=F('reorder_level')):
+    """When the row went low on stock: kept while low, set on crossing, cleared above the level"""
+    return Case(
+        When(GreaterThan(stock, level), then=Value(None)),
+        When(low_stock_since__isnull=True, then=Value(timezone.now())),
+        default=F('low_stock_since'),
+        output_field=models.DateTimeField(),
+    )
+
+
+class ProductQuerySet(InvalidatingQuerySet):
+    def update(self, **kwargs):
+        """
+        Also recount ``Category.available_product_count`` for the categories
+        the rows leave and join when the UPDATE sets ``available`` or the
+        category, which the Product signal handlers never see
+        """
+        if not {'available', 'category', 'category_id'} & set(kwargs):
+            return super().update(**kwargs)
+        rows = self.order_by()
+        category_ids = set(rows.values_list('category_id', flat=True).distinct())
+        category = kwargs.get('category', kwargs.get('category_id'))
+        moved = list(rows.values_list('pk', flat=True)) if hasattr(category, 'resolve_expression') else ()
+        updated = super().update(**kwargs)
+        if moved:
+            # Per-row categories (bulk_update's CASE)
+            category_ids.update(self.model.objects.filter(pk__in=moved).values_list('category_id', flat=True))
+        elif category is not None:
+            category_ids.add(getattr(category, 'pk', category))
+        if category_ids:
+            Category.objects.filter(pk__in=category_ids).refresh_available_product_counts()
+        return updated
+
+    update.alters_data = True
+
+    def change_stock(self, delta):
+        """
+        Add ``delta`` units (negative removes) with one UPDATE that skips
+        rows it would take below zero; returns rows changed. Use
+        ``inventory.move()`` so the change is also recorded in the ledger.
+        """
+        rows = self.filter(stock__gte=-delta) if delta < 0 else self
+        stock = F('stock') + delta
+        return rows.update_denormalized(stock=stock, low_stock_since=_low_stock_since(stock))
+
+    def refresh_low_stock(self):
+        """Recompute the low-stock queue entries with one UPDATE (after bulk writes)"""
+        return self.update_denormalized(low_stock_since=_low_stock_since())
+
+    def low_stock_queue(self):
+        """Products at or below their reorder level, longest waiting first (partial index)"""
+        return self.filter(low_stock_since__isnull=False).order_by('low_stock_since', 'pk')
+
+
+class Product(ImagePlaceholder):
     PRODUCT_TYPES = [
         ('material', 'Building Material'),
         ('tool', 'Construction Tool'),
@@ -144,6 +293,12 @@ class Product(models.Model):
         ('roofing', 'Roofing Material'),
     ]
 
+    RATING_FIELDS = ('approved_review_count', 'rating_sum', 'avg_rating')
+    # Stock only moves through conditional updates (see store/inventory.py)
+    STOCK_FIELDS = ('stock', 'low_stock_since')
+    # Columns written only through queryset updates, never by save()
+    MAINTAINED_FIELDS = RATING_FIELDS + ('search_vector',) + STOCK_FIELDS + ImagePlaceholder.PLACEHOLDER_FIELDS
+
     name = models.CharField(max_length=200)
     slug = models.SlugField(unique=True, help_text="URL-friendly version of the name")
     description = models.TextField()
@@ -152,15 +307,14 @@ class Product(models.Model):
     product_type = models.CharField(max_length=20, choices=PRODUCT_TYPES)
     image = CloudinaryField('product_image', folder='buildkit/products/')
     stock = models.PositiveIntegerField(default=0)
+    reorder_level = models.PositiveIntegerField(default=10, help_text="Low on stock at or below this many units")
+    # Set while stock <= reorder_level; the low-stock queue, partially indexed
+    low_stock_since = models.DateTimeField(null=True, blank=True, editable=False)
     available = models.BooleanField(default=True)
     featured = models.BooleanField(
         default=False,
         help_text="Feature this product on the homepage"
     )
-    apply_price_increase = models.BooleanField(
-        default=False,
-        help_text="Apply 10% price increase when saving this product"
-    )
     
     # New Technical Data Fields
     has_technical_specs = models.BooleanField(
@@ -175,16 +329,51 @@ class Product(models.Model):
         help_text="Upload PDF technical data sheet"
     )
     
+    # Denormalized rating aggregates, maintained from Testimonial writes
+    approved_review_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    avg_rating = models.DecimalField(
+        max_digits=3,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        editable=False
+    )
+
+    # Weighted full-text document, GIN indexed on PostgreSQL (see store/search.py)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    # Supplier catalog sync (see store/importer.py)
+    supplier = models.CharField(max_length=50, blank=True, help_text="Supplier whose price list this product syncs from")
+    supplier_sku = models.CharField(max_length=100, null=True, blank=True, help_text="Supplier's stable SKU or item code")
+    supplier_hash = models.CharField(max_length=64, blank=True, editable=False)
+    
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
 
+    objects = ProductQuerySet.as_manager()
+
     class Meta:
         ordering = ['-featured', '-created']
         indexes = [
+            models.Index(
+                fields=['low_stock_since'],
+                condition=Q(low_stock_since__isnull=False),
+                name='product_low_stock_queue',
+            ),
             models.Index(fields=['category', 'available']),
             models.Index(fields=['product_type', 'available']),
             models.Index(fields=['featured', 'available']),
             models.Index(fields=['has_technical_specs']),
+            models.Index(fields=['-avg_rating', '-approved_review_count']),
+            # Keyset pagination of the listing (see pagination.py)
+            models.Index(fields=['available', '-featured', '-created', '-id']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['supplier', 'supplier_sku'],
+                condition=Q(supplier_sku__isnull=False),
+                name='unique_supplier_sku',
+            ),
         ]
 
     def __str__(self):
@@ -193,6 +382,10 @@ class Product(models.Model):
     def get_absolute_url(self):
         return reverse('store:product_detail', args=[self.slug])
 
+    def image_url(self, slot='detail'):
+        """Sized, format-negotiated URL of the product image (see store/images.py)"""
+        return images.url(self.image, slot)
+
     def clean(self):
         """Validate product data"""
         if self.price <= 0:
@@ -201,31 +394,31 @@ class Product(models.Model):
             raise ValidationError({'stock': 'Stock cannot be negative'})
 
     def save(self, *args, **kwargs):
-        # Apply 10% price increase if the option is selected
-        if self.apply_price_increase and self.price:
-            self.price = self.price * Decimal('1.10')
-            # Reset the flag so it doesn't apply again on next save
-            self.apply_price_increase = False
-        
         # Update has_technical_specs based on whether specs exist
-        if hasattr(self, 'technical_specs'):
+        # (reverse managers raise ValueError on unsaved instances)
+        if self.pk:
             self.has_technical_specs = self.technical_specs.exists()
-        
-        self.full_clean()
-        super().save(*args, **kwargs)
 
-    def apply_ten_percent_increase(self):
-        """Method to manually apply 10% price increase"""
-        if self.price:
-            self.price = self.price * Decimal('1.10')
-            self.save()
+        # Never write back stale rating aggregates or search vectors held in
+        # memory; they are maintained with queryset updates by signal handlers
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.MAINTAINED_FIELDS
+            ]
 
-    @property
-    def price_with_increase(self):
-        """Get the price with 10% increase without saving"""
-        if self.price:
-            return self.price * Decimal('1.10')
-        return self.price
+        self.full_clean()
+        refresh_stock = False
+        if self._state.adding:
+            self.low_stock_since = timezone.now() if self.stock <= self.reorder_level else None
+        elif 'reorder_level' in (kwargs.get('update_fields') or ()):
+            # Compare the stored stock with the new level in the same UPDATE
+            self.low_stock_since = _low_stock_since(level=Value(self.reorder_level))
+            kwargs['update_fields'] = list(kwargs['update_fields']) + ['low_stock_since']
+            refresh_stock = True
+        super().save(*args, **kwargs)
+        if refresh_stock:
+            self.refresh_from_db(fields=self.STOCK_FIELDS)
 
     @property
     def is_in_stock(self):
@@ -233,8 +426,8 @@ class Product(models.Model):
     
     @property
     def low_stock(self):
-        """Check if product has low stock (less than 10 items)"""
-        return 0 < self.stock <= 10
+        """Check if product has low stock (at or below its reorder level)"""
+        return 0 < self.stock <= self.reorder_level
     
     @property
     def stock_status(self):
@@ -267,6 +460,24 @@ class Product(models.Model):
         """Get important specifications for quick view"""
         return self.technical_specs.filter(is_important=True).order_by('display_order')
     
+    @classmethod
+    def apply_rating_delta(cls, product_id, count_delta, sum_delta):
+        """Adjust the stored rating aggregates of one product in a single UPDATE"""
+        if not count_delta and not sum_delta:
+            return False
+        new_count = F('approved_review_count') + count_delta
+        new_sum = F('rating_sum') + sum_delta
+        cls.objects.filter(pk=product_id).update_denormalized(
+            approved_review_count=new_count,
+            rating_sum=new_sum,
+            avg_rating=Case(
+                When(approved_review_count__gt=-count_delta, then=_average_rating_sql(new_count, new_sum)),
+                default=Value(Decimal('0.00')),
+                output_field=DecimalField(max_digits=3, decimal_places=2)
+            )
+        )
+        return True
+
     def get_specs_by_group(self):
         """Get specifications grouped by category"""
         groups = {}
@@ -311,6 +522,8 @@ class TechnicalSpecification(models.Model):
         help_text="Mark as important to show in quick specs summary"
     )
 
+    objects = InvalidatingQuerySet.as_manager()
+
     class Meta:
         ordering = ['group', 'display_order', 'spec_name']
         verbose_name = "Technical Specification"
@@ -327,7 +540,7 @@ class TechnicalSpecification(models.Model):
         return self.spec_value
 
 
-class ProductImage(models.Model):
+class ProductImage(ImagePlaceholder):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='images')
     image = CloudinaryField('product_gallery', folder='buildkit/products/gallery/')
     alt_text = models.CharField(max_length=100, blank=True, help_text="Alternative text for accessibility")
@@ -337,12 +550,18 @@ class ProductImage(models.Model):
         help_text="Order in which images are displayed"
     )
 
+    objects = InvalidatingQuerySet.as_manager()
+
     class Meta:
         ordering = ['-is_primary', 'display_order', 'id']
 
     def __str__(self):
         return f"Image for {self.product.name}"
 
+    def image_url(self, slot='detail'):
+        """Sized, format-negotiated URL of the image (see store/images.py)"""
+        return images.url(self.image, slot)
+
     def save(self, *args, **kwargs):
         if not self.alt_text:
             self.alt_text = f"Image of {self.product.name}"
@@ -353,7 +572,12 @@ class ProductImage(models.Model):
                 product=self.product, 
                 is_primary=True
             ).exclude(pk=self.pk).update(is_primary=False)
-        
+
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.PLACEHOLDER_FIELDS
+            ]
         super().save(*args, **kwargs)
 
 
@@ -373,6 +597,8 @@ class Testimonial(models.Model):
         help_text="Feature this testimonial on product pages"
     )
 
+    objects = InvalidatingQuerySet.as_manager()
+
     class Meta:
         ordering = ['-featured', '-created']
         unique_together = ['product', 'user']
@@ -390,6 +616,45 @@ class Testimonial(models.Model):
         self.full_clean()
         super().save(*args, **kwargs)
 
+    @property
+    def rating_contribution(self):
+        """Return the (count, sum) this testimonial adds to its product's rating"""
+        if self.approved:
+            return 1, int(self.rating)
+        return 0, 0
+
+
+MONEY = DecimalField(max_digits=12, decimal_places=2)
+
+
+def _line_cost(prefix=''):
+    return ExpressionWrapper(F(f'{prefix}price') * F(f'{prefix}quantity'), output_field=MONEY)
+
+
+class OrderQuerySet(models.QuerySet):
+    def with_computed_totals(self):
+        """Annotate totals recomputed from the items, e.g. to audit the stored ones"""
+        return self.annotate(
+            computed_items_count=Coalesce(Sum('items__quantity'), 0),
+            computed_items_subtotal=Coalesce(Sum(_line_cost('items__')), Decimal('0.00'), output_field=MONEY),
+        )
+
+    def refresh_totals(self):
+        """Recompute the stored totals from the items with one UPDATE"""
+        items = OrderItem.objects.filter(order=OuterRef('pk')).order_by().values('order')
+        subtotal = Coalesce(
+            Subquery(items.annotate(total=Sum(_line_cost())).values('total')),
+            Decimal('0.00'),
+            output_field=MONEY
+        )
+        return self.update(
+            items_subtotal=subtotal,
+            items_count=Coalesce(Subquery(items.annotate(total=Sum('quantity')).values('total')), 0),
+            grand_total=ExpressionWrapper(subtotal + F('delivery_cost'), output_field=MONEY),
+            # Item edits count as order changes for the sales rollups
+            updated=Now(),
+        )
+
 
 class Order(models.Model):
     STATUS_CHOICES = [
@@ -424,20 +689,31 @@ class Order(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     notes = models.TextField(blank=True, help_text="Additional order notes")
 
+    # Stored totals, set when the order is placed and maintained from
+    # OrderItem writes (see signals.py)
+    items_subtotal = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'), editable=False)
+    items_count = models.PositiveIntegerField(default=0, editable=False)
+    grand_total = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'), editable=False)
+
+    TOTAL_FIELDS = ('items_subtotal', 'items_count', 'grand_total')
+
+    objects = OrderQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created']
         indexes = [
             models.Index(fields=['user', 'created']),
             models.Index(fields=['status', 'created']),
             models.Index(fields=['paid', 'created']),
+            # Incremental sales rollups (see reports.py)
+            models.Index(fields=['updated']),
         ]
 
     def __str__(self):
         return f'Order {self.id} - {self.full_name}'
 
     def get_total_cost(self):
-        items_total = sum(item.get_cost() for item in self.items.all())
-        return items_total + self.delivery_cost
+        return self.grand_total
 
     def get_total_cost_display(self):
         return f"₵{self.get_total_cost():.2f}"
@@ -446,10 +722,6 @@ class Order(models.Model):
     def full_name(self):
         return f"{self.first_name} {self.last_name}"
     
-    @property
-    def items_count(self):
-        return sum(item.quantity for item in self.items.all())
-    
     @property
     def status_class(self):
         """Get Bootstrap class for order status"""
@@ -469,7 +741,21 @@ class Order(models.Model):
 
     def save(self, *args, **kwargs):
         self.full_clean()
+        if self._state.adding:
+            self.grand_total = self.items_subtotal + self.delivery_cost
+            super().save(*args, **kwargs)
+            return
+
+        # Totals held in memory may be stale; recompute them in the database
+        # instead (delivery_cost may have changed)
+        if kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.TOTAL_FIELDS
+            ]
         super().save(*args, **kwargs)
+        type(self).objects.filter(pk=self.pk).refresh_totals()
+        self.refresh_from_db(fields=self.TOTAL_FIELDS)
 
 
 class OrderItem(models.Model):
@@ -501,4 +787,237 @@ class OrderItem(models.Model):
             # Get the current product price
             self.price = self.product.price
         self.full_clean()
-        super().save(*args, **kwargs)
\ No newline at end of file
+        super().save(*args, **kwargs)
+
+
+class DailySalesRollup(models.Model):
+    """Sales per day, region, category and product, filled by ``manage.py rollup_sales``"""
+    day = models.DateField()
+    region = models.CharField(max_length=100)
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='sales_rollups')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='sales_rollups')
+    # One order item per (order, product), so this is also the number of
+    # orders that included the product
+    order_lines = models.PositiveIntegerField(default=0)
+    units_sold = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+
+    class Meta:
+        ordering = ['-day', 'region']
+        unique_together = ['day', 'region', 'category', 'product']
+        indexes = [
+            models.Index(fields=['category', 'day']),
+            models.Index(fields=['product', 'day']),
+        ]
+        verbose_name = "Daily Sales Rollup"
+        verbose_name_plural = "Daily Sales Rollups"
+
+    def __str__(self):
+        return f'{self.day} {self.region} - {self.product_id}: {self.units_sold} sold'
+
+
+class ReportWatermark(models.Model):
+    """How far a report rollup has processed the orders table"""
+    name = models.CharField(max_length=50, unique=True)
+    processed_until = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f'{self.name}: {self.processed_until or "never run"}'
+
+
+class PriceAdjustment(models.Model):
+    """A percentage or fixed price change for a filtered set of products (see store/pricing.py)"""
+    KINDS = [
+        ('percent', 'Percentage'),
+        ('amount', 'Fixed amount'),
+    ]
+    STATUSES = [
+        ('scheduled', 'Scheduled'),
+        ('applied', 'Applied'),
+        ('cancelled', 'Cancelled'),
+    ]
+
+    description = models.CharField(max_length=200, blank=True)
+    kind = models.CharField(max_length=10, choices=KINDS, default='percent')
+    value = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        help_text="Percent (10 = +10%) or cedis added to the price; negative values lower prices"
+    )
+    # Filters; empty ones match every product
+    category = models.ForeignKey(
+        Category, on_delete=models.PROTECT, null=True, blank=True, related_name='price_adjustments'
+    )
+    product_type = models.CharField(max_length=20, choices=Product.PRODUCT_TYPES, blank=True)
+    supplier = models.CharField(max_length=50, blank=True)
+
+    effective_at = models.DateTimeField(
+        default=timezone.now,
+        help_text="Applied by manage.py apply_price_adjustments once this time has passed"
+    )
+    status = models.CharField(max_length=10, choices=STATUSES, default='scheduled', editable=False)
+    applied_at = models.DateTimeField(null=True, blank=True, editable=False)
+    products_changed = models.PositiveIntegerField(default=0, editable=False)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, editable=False)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-effective_at']
+        indexes = [
+            models.Index(fields=['status', 'effective_at']),
+        ]
+
+    def __str__(self):
+        change = f"{self.value:+}%" if self.kind == 'percent' else f"₵{self.value:+}"
+        return f"{self.description or 'Price adjustment'} ({change})"
+
+    def clean(self):
+        if self.kind == 'percent' and self.value <= -100:
+            raise ValidationError({'value': 'A percentage cut must be smaller than 100%'})
+
+    def products(self):
+        """The products this adjustment applies to"""
+        products = Product.objects.all()
+        if self.category_id:
+            products = products.filter(category_id=self.category_id)
+        if self.product_type:
+            products = products.filter(product_type=self.product_type)
+        if self.supplier:
+            products = products.filter(supplier=self.supplier)
+        return products
+
+
+class PriceHistory(models.Model):
+    """One product price change and when it took effect"""
+    SOURCES = [
+        ('adjustment', 'Price adjustment'),
+        ('edit', 'Edited'),
+        ('import', 'Imported'),
+    ]
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='price_history')
+    old_price = models.DecimalField(max_digits=10, decimal_places=2)
+    new_price = models.DecimalField(max_digits=10, decimal_places=2)
+    effective_at = models.DateTimeField(default=timezone.now)
+    source = models.CharField(max_length=20, choices=SOURCES, default='edit')
+    adjustment = models.ForeignKey(
+        PriceAdjustment, on_delete=models.SET_NULL, null=True, blank=True, related_name='history'
+    )
+
+    class Meta:
+        ordering = ['-effective_at', '-id']
+        indexes = [
+            models.Index(fields=['product', '-effective_at']),
+        ]
+        verbose_name_plural = "Price history"
+
+    def __str__(self):
+        return f'{self.product_id}: ₵{self.old_price} → ₵{self.new_price} ({self.effective_at:%Y-%m-%d})'
+
+
+class StockMovement(models.Model):
+    """One change to a product's stock; the ledger is append-only (see store/inventory.py)"""
+    KINDS = [
+        ('receipt', 'Receipt'),
+        ('sale', 'Sale'),
+        ('return', 'Return'),
+        ('adjustment', 'Adjustment'),
+    ]
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_movements')
+    kind = models.CharField(max_length=20, choices=KINDS)
+    quantity = models.IntegerField(help_text="Units added (positive) or removed (negative)")
+    order = models.ForeignKey(
+        Order, on_delete=models.SET_NULL, null=True, blank=True, related_name='stock_movements'
+    )
+    note = models.CharField(max_length=200, blank=True)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, editable=False)
+    created = models.DateTimeField(default=timezone.now, editable=False)
+
+    class Meta:
+        ordering = ['-created', '-id']
+        indexes = [
+            models.Index(fields=['product', 'created']),
+        ]
+
+    def __str__(self):
+        return f'{self.get_kind_display()} {self.quantity:+} x {self.product_id}'
+
+    def clean(self):
+        if not self.quantity:
+            raise ValidationError({'quantity': 'Quantity cannot be zero'})
+        if self.kind in ('receipt', 'return') and self.quantity < 0:
+            raise ValidationError({'quantity': f'A {self.get_kind_display().lower()} adds stock; use a positive quantity'})
+        if self.kind == 'sale' and self.quantity > 0:
+            raise ValidationError({'quantity': 'A sale removes stock; use a negative quantity'})
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValidationError('Stock movements cannot be changed; record a correcting adjustment instead')
+        super().save(*args, **kwargs)
+
+
+class LowStockProduct(Product):
+    """The low-stock queue as its own admin changelist"""
+
+    class Meta:
+        proxy = True
+        verbose_name = "Low-stock product"
+        verbose_name_plural = "Low-stock queue"
+
+
+class Job(models.Model):
+    """A side effect queued for ``manage.py run_jobs`` (see store/jobs.py)"""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+    ]
+
+    task = models.CharField(max_length=100)
+    arguments = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    # Enqueuing again with the same key returns the existing job
+    idempotency_key = models.CharField(max_length=200, unique=True, null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    # Claim of the worker running it; taken over once the lease expires
+    locked_by = models.CharField(max_length=32, blank=True)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created', '-id']
+        indexes = [
+            models.Index(fields=['run_at'], condition=Q(status='queued'), name='job_queue'),
+            models.Index(fields=['locked_until'], condition=Q(status='running'), name='job_leases'),
+        ]
+
+    def __str__(self):
+        return f'{self.task} #{self.pk} ({self.status})'
+
+
+class StaffNotification(models.Model):
+    """An entry in the admin's notification feed (see store/events.py)"""
+    event = models.CharField(max_length=50)
+    order = models.ForeignKey(Order, on_delete=models.SET_NULL, null=True, blank=True, related_name='notifications')
+    title = models.CharField(max_length=200)
+    message = models.TextField(blank=True)
+    read = models.BooleanField(default=False)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created', '-id']
+        constraints = [
+            models.UniqueConstraint(fields=['event', 'order'], name='unique_order_notification'),
+        ]
+        indexes = [
+            models.Index(fields=['read', '-created']),
+        ]
+
+    def __str__(self):
+        return self.title
@@ -0,0 +1,121 @@
+"""
+Placing orders.
+
+``place_order()`` turns cart lines into an ``Order`` inside one transaction:
+every line is checked against the products as read, stock is taken with a
+conditional ``UPDATE ... WHERE stock >= qty`` per product (in primary key
+order, so two checkouts never wait on each other in opposite orders), and
+the order items and their ``sale`` stock movements are written with one
+``bulk_create`` each (the order's stored totals come from the same lines).
+If any line cannot be filled nothing is written and
+``OrderPlacementError`` carries one entry per failed line. A placed order
+emits ``order_placed`` to the notification sinks (see store/events.py).
+
+The conditional update is what prevents overselling, so nothing is locked
+up front: a product sold out by a concurrent checkout after it was read
+fails its update and is reported with the stock left. The updated rows stay
+locked only until the order is committed right after (see
+store/inventory.py).
+"""
+from decimal import Decimal
+from django.db import transaction
+from . import events, invalidation
+from .models import Order, OrderItem, Product, StockMovement
+
+
+class OrderPlacementError(Exception):
+    """Some lines could not be filled; ``failures`` describes each of them"""
+
+    def __init__(self, failures):
+        self.failures = failures
+        super().__init__('; '.join(failure['error'] for failure in failures))
+
+
+def _failure(product_id, name, requested, available, error):
+    return {
+        'product_id': product_id,
+        'name': name,
+        'requested': requested,
+        'available': available,
+        'error': error,
+    }
+
+
+def _merge_lines(lines):
+    """Combine repeated products into {product_id: (quantity, price)}"""
+    merged = {}
+    for product_id, quantity, price in lines:
+        product_id = int(product_id)
+        previous = merged.get(product_id, (0, None))[0]
+        merged[product_id] = (previous + int(quantity), Decimal(str(price)))
+    return merged
+
+
+def place_order(lines, **order_fields):
+    """
+    Create an order from (product_id, quantity, unit price) lines and take
+    the stock for it. ``order_fields`` are passed to ``Order``.
+    """
+    lines = _merge_lines(lines)
+    if not lines:
+        raise OrderPlacementError([_failure(None, None, 0, 0, 'The order has no items.')])
+
+    with transaction.atomic():
+        products = Product.objects.filter(pk__in=lines.keys()).order_by('pk').only(
+            'id', 'name', 'stock', 'available', 'category_id'
+        )
+        by_id = {product.pk: product for product in products}
+
+        failures = []
+        for product_id, (quantity, price) in sorted(lines.items()):
+            product = by_id.get(product_id)
+            if product is None:
+                failures.append(_failure(product_id, None, quantity, 0, 'This product no longer exists.'))
+            elif not product.available:
+                failures.append(_failure(product_id, product.name, quantity, 0, f'{product.name} is no longer available.'))
+            elif quantity <= 0 or price <= 0:
+                failures.append(_failure(product_id, product.name, quantity, product.stock, f'{product.name} has an invalid quantity or price.'))
+            elif quantity > product.stock:
+                failures.append(_failure(
+                    product_id, product.name, quantity, product.stock,
+                    f'Only {product.stock} of {product.name} left in stock.'
+                ))
+        if failures:
+            raise OrderPlacementError(failures)
+
+        for product_id, (quantity, _) in sorted(lines.items()):
+            taken = Product.objects.filter(pk=product_id).change_stock(-quantity)
+            if not taken:
+                stock = Product.objects.filter(pk=product_id).values_list('stock', flat=True).first() or 0
+                failures.append(_failure(
+                    product_id, by_id[product_id].name, quantity, stock,
+                    f'Only {stock} of {by_id[product_id].name} left in stock.'
+                ))
+        if failures:
+            # Rolls back the stock already taken for earlier lines
+            raise OrderPlacementError(failures)
+
+        order = Order.objects.create(
+            items_subtotal=sum(price * quantity for quantity, price in lines.values()),
+            items_count=sum(quantity for quantity, _ in lines.values()),
+            **order_fields
+        )
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product_id=product_id, quantity=quantity, price=price)
+            for product_id, (quantity, price) in sorted(lines.items())
+        ])
+        StockMovement.objects.bulk_create([
+            StockMovement(product_id=product_id, kind='sale', quantity=-quantity, order=order)
+            for product_id, (quantity, _) in sorted(lines.items())
+        ])
+        # Stock levels show on the purchased products' cards and pages; the
+        # catalog-wide caches (facets' in-stock counts) only change when a
+        # line sells out
+        invalidation.invalidate(
+            lines.keys(),
+            {product.category_id for product in by_id.values()},
+            include_global=Product.objects.filter(pk__in=lines.keys(), stock__lte=0).exists()
+        )
+        # One queued job, delivered to the notification sinks after commit
+        events.emit('order_placed', order)
+    return order
@@ -0,0 +1,151 @@
+"""
+Keyset (cursor) pagination for product listings.
+
+``Paginator`` runs a ``COUNT(*)`` per request and an ``OFFSET`` that gets
+slower the deeper you page. ``CursorPaginator`` instead filters on the last
+row seen, using the same ordering as ``Product.Meta.ordering`` plus ``id`` as
+a tie-breaker, so every page of available products is one range scan of
+the matching ``(available, -featured, -created, -id)`` index. Cursors are
+signed, opaque tokens and the total is an estimate that is cached.
+"""
+import hashlib
+import json
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+CURSOR_SALT = 'store.pagination.cursor'
+PRODUCT_ORDERING = ('-featured', '-created', '-id')
+
+
+def _count_cache_timeout():
+    return getattr(settings, 'APPROXIMATE_COUNT_CACHE_TIMEOUT', 5 * 60)
+
+
+def approximate_count(queryset):
+    """Estimated row count, cached per query
+
+    PostgreSQL uses the planner's row estimate (from the same statistics as
+    ``pg_class.reltuples``); other databases cache an exact COUNT.
+    """
+    sql, params = queryset.order_by().query.sql_with_params()
+    key = 'store:approx_count:' + hashlib.md5(f'{sql}|{params}'.encode()).hexdigest()
+    count = cache.get(key)
+    if count is None:
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+                plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            count = int(plan[0]['Plan']['Plan Rows'])
+        else:
+            count = queryset.count()
+        cache.set(key, count, _count_cache_timeout())
+    return count
+
+
+def _field_name(ordering):
+    return ordering.lstrip('-')
+
+
+def _serialize(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+def _keyset_filter(ordering, values, forward):
+    """Build ``(a, b, c) < (x, y, z)``-style conditions for mixed directions"""
+    condition = Q()
+    equal_so_far = Q()
+    for field, value in zip(ordering, values):
+        name = _field_name(field)
+        descending = field.startswith('-')
+        lookup = 'lt' if descending == forward else 'gt'
+        condition |= equal_so_far & Q(**{f'{name}__{lookup}': value})
+        equal_so_far &= Q(**{name: value})
+    return condition
+
+
+def _reverse_ordering(ordering):
+    return [field[1:] if field.startswith('-') else f'-{field}' for field in ordering]
+
+
+class CursorPage:
+    is_cursor_page = True
+
+    def __init__(self, object_list, next_cursor, previous_cursor, approx_count):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.approx_count = approx_count
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    def __init__(self, queryset, per_page, ordering=PRODUCT_ORDERING):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = list(ordering)
+
+    def _encode(self, obj, direction):
+        values = [_serialize(getattr(obj, _field_name(field))) for field in self.ordering]
+        return signing.dumps({'v': values, 'd': direction}, salt=CURSOR_SALT, compress=True)
+
+    def _decode(self, token):
+        """Return (values, direction) or None for a missing or tampered cursor"""
+        if not token:
+            return None
+        try:
+            payload = signing.loads(token, salt=CURSOR_SALT)
+            values = list(payload['v'])
+            direction = payload['d']
+        except (signing.BadSignature, KeyError, TypeError, ValueError):
+            return None
+        if len(values) != len(self.ordering) or direction not in ('n', 'p'):
+            return None
+        for i, field in enumerate(self.ordering):
+            model_field = self.queryset.model._meta.get_field(_field_name(field))
+            if model_field.get_internal_type() == 'DateTimeField' and isinstance(values[i], str):
+                values[i] = parse_datetime(values[i])
+        return values, direction
+
+    def get_page(self, token):
+        decoded = self._decode(token)
+        queryset = self.queryset
+        if decoded is None:
+            rows = list(queryset.order_by(*self.ordering)[:self.per_page + 1])
+            has_more, has_before = len(rows) > self.per_page, False
+            rows = rows[:self.per_page]
+        else:
+            values, direction = decoded
+            forward = direction == 'n'
+            queryset = queryset.filter(_keyset_filter(self.ordering, values, forward))
+            if forward:
+                rows = list(queryset.order_by(*self.ordering)[:self.per_page + 1])
+                has_more, has_before = len(rows) > self.per_page, True
+                rows = rows[:self.per_page]
+            else:
+                rows = list(queryset.order_by(*_reverse_ordering(self.ordering))[:self.per_page + 1])
+                has_more, has_before = True, len(rows) > self.per_page
+                rows = list(reversed(rows[:self.per_page]))
+
+        next_cursor = self._encode(rows[-1], 'n') if rows and has_more else None
+        previous_cursor = self._encode(rows[0], 'p') if rows and has_before else None
+        return CursorPage(rows, next_cursor, previous_cursor, approximate_count(self.queryset))
@@ -0,0 +1,233 @@
+"""
+Image placeholders computed offline.
+
+Every ``Product.image``, ``ProductImage.image`` and ``Category.image`` gets
+its intrinsic size, dominant colour and a 16px WebP preview stored on the
+row (``ImagePlaceholder`` fields). ``{% responsive_image %}`` renders them as
+the <img>'s ``width``/``height`` and an inline background, so the browser
+reserves the right box and paints the blurry preview (a few hundred bytes of
+data URI) before the Cloudinary image arrives. Nothing is computed while a
+page renders.
+
+Originals are read through a *source*: ``CloudinarySource`` downloads them,
+``LocalSource`` reads ``<IMAGE_SOURCE_ROOT>/<public_id>.<format>`` files for
+working without Cloudinary. ``IMAGE_SOURCE`` selects one.
+
+Downloading and decoding run in a thread pool of
+``IMAGE_PLACEHOLDER_WORKERS`` threads with at most twice as many images in
+flight; the pool never touches the database. Results are written from the
+calling thread, each guarded by the image value it was computed from
+(``image_placeholder_for``), so a placeholder never lands on an image that
+was replaced meanwhile. ``refresh()`` (``manage.py image_placeholders``)
+processes every image whose placeholder is missing or out of date; saving a
+model with a new image clears its placeholder and queues an
+``image_placeholder`` job that computes the new one.
+"""
+import base64
+import io
+import logging
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import requests
+from PIL import Image, ImageOps
+from django.conf import settings
+from django.db.models import CharField, F
+from django.db.models.functions import Cast
+from django.utils.module_loading import import_string
+from . import invalidation, jobs
+
+logger = logging.getLogger(__name__)
+
+PREVIEW_SIZE = 16
+ANALYSIS_SIZE = 64
+ORIENTATION = 0x0112
+
+
+def _workers():
+    return getattr(settings, 'IMAGE_PLACEHOLDER_WORKERS', 4)
+
+
+def _on_upload():
+    return getattr(settings, 'IMAGE_PLACEHOLDERS_ON_UPLOAD', True)
+
+
+class CloudinarySource:
+    """Downloads originals from Cloudinary"""
+
+    timeout = 15
+
+    def read(self, image):
+        response = requests.get(image.build_url(secure=True), timeout=self.timeout)
+        response.raise_for_status()
+        return response.content
+
+
+class LocalSource:
+    """Reads originals from ``IMAGE_SOURCE_ROOT``, for development and tests"""
+
+    def __init__(self, root=None):
+        self.root = root or settings.IMAGE_SOURCE_ROOT
+
+    def read(self, image):
+        name = f'{image.public_id}.{image.format}' if image.format else image.public_id
+        with open(os.path.join(self.root, name), 'rb') as file:
+            return file.read()
+
+
+def get_source():
+    return import_string(getattr(settings, 'IMAGE_SOURCE', 'store.placeholders.CloudinarySource'))()
+
+
+def placeholder_models():
+    from .models import Category, Product, ProductImage
+
+    return (Product, ProductImage, Category)
+
+
+# Computing ----------------------------------------------------------------
+
+def _dominant_color(image):
+    """Most common colour of an 8-colour quantization, as #rrggbb"""
+    quantized = image.quantize(colors=8)
+    _, index = max(quantized.getcolors())
+    red, green, blue = quantized.getpalette()[index * 3:index * 3 + 3]
+    return f'#{red:02x}{green:02x}{blue:02x}'
+
+
+def compute(data):
+    """Placeholder fields for the image in ``data`` (bytes)"""
+    with Image.open(io.BytesIO(data)) as image:
+        width, height = image.size
+        # Browsers apply the EXIF orientation, so report the turned size
+        if image.getexif().get(ORIENTATION) in (5, 6, 7, 8):
+            width, height = height, width
+        # JPEGs decode straight to a fraction of their size
+        image.draft('RGB', (ANALYSIS_SIZE, ANALYSIS_SIZE))
+        image = ImageOps.exif_transpose(image)
+        if image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info:
+            rgba = image.convert('RGBA')
+            image = Image.new('RGB', rgba.size, 'white')
+            image.paste(rgba, mask=rgba)
+        small = image.convert('RGB')
+    small.thumbnail((ANALYSIS_SIZE, ANALYSIS_SIZE))
+
+    preview = small.copy()
+    preview.thumbnail((PREVIEW_SIZE, PREVIEW_SIZE))
+    buffer = io.BytesIO()
+    preview.save(buffer, 'WEBP', quality=40)
+    return {
+        'image_width': width,
+        'image_height': height,
+        'image_color': _dominant_color(small),
+        'image_placeholder': 'data:image/webp;base64,' + base64.b64encode(buffer.getvalue()).decode('ascii'),
+    }
+
+
+def _read_and_compute(source, model, raw):
+    """Runs in the pool: fetch and analyse one image, no database access"""
+    image = model._meta.get_field('image').to_python(raw)
+    return compute(source.read(image))
+
+
+# Storing ------------------------------------------------------------------
+
+def _store(model, pk, raw, fields):
+    """Write the placeholder unless the image changed since; returns rows written"""
+    return model.objects.filter(pk=pk, image=raw).update_denormalized(image_placeholder_for=raw, **fields)
+
+
+def stale(model):
+    """``model`` rows with an image whose placeholder is missing or out of date"""
+    return model.objects.exclude(image__isnull=True).exclude(image='').exclude(
+        image_placeholder_for=F('image')
+    )
+
+
+def _rows(model, queryset):
+    # The stored string, not the CloudinaryResource parsed from it
+    return queryset.order_by('pk').annotate(raw=Cast('image', CharField())).values_list('pk', 'raw')
+
+
+def process(jobs, source=None, workers=None):
+    """
+    Compute and store placeholders for ``jobs``, an iterable of (model, pk,
+    stored image value). Returns (written, failed) counts.
+    """
+    source = source or get_source()
+    workers = workers or _workers()
+    written = failed = 0
+    written_pks = {}
+    jobs = iter(jobs)
+
+    def flush():
+        for model, pks in written_pks.items():
+            invalidation.invalidate_queryset(model.objects.filter(pk__in=pks))
+        written_pks.clear()
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='placeholders') as pool:
+        pending = {}
+        while True:
+            # Keep the pool busy without queueing the whole catalog
+            while len(pending) < workers * 2:
+                job = next(jobs, None)
+                if job is None:
+                    break
+                pending[pool.submit(_read_and_compute, source, job[0], job[2])] = job
+            if not pending:
+                break
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                model, pk, raw = pending.pop(future)
+                try:
+                    fields = future.result()
+                except Exception:
+                    failed += 1
+                    logger.warning('Could not compute the placeholder of %s %s (%s)', model.__name__, pk, raw,
+                                   exc_info=True)
+                    continue
+                if _store(model, pk, raw, fields):
+                    written += 1
+                    written_pks.setdefault(model, []).append(pk)
+            if sum(map(len, written_pks.values())) >= 100:
+                flush()
+    flush()
+    return written, failed
+
+
+def refresh(models=None, force=False, source=None, workers=None):
+    """Compute missing or outdated placeholders (all of them with ``force``); returns (written, failed)"""
+    def jobs():
+        for model in models or placeholder_models():
+            queryset = model.objects.exclude(image__isnull=True).exclude(image='') if force else stale(model)
+            # Read up front: the rows are written while the pool works through them
+            for pk, raw in list(_rows(model, queryset)):
+                yield model, pk, raw
+
+    return process(jobs(), source=source, workers=workers)
+
+
+# Upload hook --------------------------------------------------------------
+
+def refresh_image(model, pk):
+    """Compute the placeholder of one row if it is missing or outdated; returns True if written"""
+    for pk, raw in _rows(model, stale(model).filter(pk=pk)):
+        if _store(model, pk, raw, _read_and_compute(get_source(), model, raw)):
+            invalidation.invalidate_queryset(model.objects.filter(pk=pk))
+            return True
+    return False
+
+
+def image_saved(instance):
+    """
+    Clear the placeholder of a saved instance whose image changed and queue
+    the job computing the new one (see store/jobs.py).
+    """
+    model = type(instance)
+    # Freshly uploaded images carry their size in the upload response
+    metadata = getattr(instance.image, 'metadata', None) or {}
+    cleared = stale(model).filter(pk=instance.pk).update_denormalized(
+        image_width=metadata.get('width'), image_height=metadata.get('height'),
+        image_color='', image_placeholder='',
+    )
+    if cleared and _on_upload():
+        jobs.enqueue('image_placeholder', {'model': model._meta.label_lower, 'pk': instance.pk})
@@ -0,0 +1,106 @@
+"""
+Bulk price adjustments with price history.
+
+``adjust_prices()`` reprices a whole queryset of products with one
+``UPDATE ... SET price = ROUND(price * factor, 2)`` (or ``price + amount``
+for fixed adjustments), whatever its size. The same expression is first
+evaluated by one ``INSERT ... SELECT`` into ``PriceHistory``, so every
+changed product gets an (old, new, effective_at) row without being loaded
+into Python. Products whose price would not change are skipped by both
+statements, and no price is lowered below ₵0.01.
+
+A ``PriceAdjustment`` stores an adjustment together with its filters
+(category, product type, supplier) and the time it takes effect. Due ones
+are applied by ``apply_due_adjustments()`` (``manage.py
+apply_price_adjustments``, run from cron) or straight away when saved in
+the admin with an effective time that has already passed.
+
+Single-product edits are recorded by the ``Product`` signals and supplier
+imports by the importer, so the history covers every price change.
+"""
+from decimal import Decimal
+from django.db import connection, transaction
+from django.db.models import DecimalField, F, Value
+from django.db.models.functions import Greatest, Round
+from django.utils import timezone
+from .models import PriceAdjustment, PriceHistory
+
+PRICE = DecimalField(max_digits=10, decimal_places=2)
+MIN_PRICE = Decimal('0.01')
+
+
+def new_price(kind, value):
+    """SQL expression for the adjusted price of each row"""
+    value = Decimal(value)
+    if kind == 'percent':
+        adjusted = Round(F('price') * Value(1 + value / 100, output_field=PRICE), 2, output_field=PRICE)
+    elif kind == 'amount':
+        adjusted = F('price') + Value(value, output_field=PRICE)
+    else:
+        raise ValueError(f'Unknown adjustment kind {kind!r}')
+    return Greatest(adjusted, Value(MIN_PRICE, output_field=PRICE), output_field=PRICE)
+
+
+def _record_history(changes, price, effective_at, source, adjustment):
+    """INSERT ... SELECT one PriceHistory row per product in ``changes``"""
+    select = changes.order_by().annotate(new_price=price).values('pk', 'price', 'new_price')
+    sql, params = select.query.sql_with_params()
+    table = PriceHistory._meta.db_table
+    columns = ', '.join(
+        connection.ops.quote_name(PriceHistory._meta.get_field(name).column)
+        for name in ('product', 'old_price', 'new_price', 'effective_at', 'source', 'adjustment')
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {connection.ops.quote_name(table)} ({columns}) '
+            f'SELECT changes.*, %s, %s, %s FROM ({sql}) changes',
+            (connection.ops.adapt_datetimefield_value(effective_at), source,
+             adjustment.pk if adjustment else None, *params)
+        )
+
+
+def adjust_prices(queryset, kind, value, effective_at=None, adjustment=None, source='adjustment'):
+    """
+    Adjust the price of every product in ``queryset`` by ``value`` percent
+    (``kind='percent'``) or cedis (``kind='amount'``) and record the
+    changes. Two statements in one transaction; returns products changed.
+    """
+    price = new_price(kind, value)
+    effective_at = effective_at or timezone.now()
+    # Filtering by the expression keeps both statements to the rows that change
+    changes = queryset.model.objects.filter(pk__in=queryset.values('pk')).exclude(price=price)
+    with transaction.atomic():
+        _record_history(changes, price, effective_at, source, adjustment)
+        # InvalidatingQuerySet.update() retires the cached listings on commit
+        return changes.update(price=price, updated=timezone.now())
+
+
+def apply_adjustment(adjustment, now=None):
+    """Apply a scheduled adjustment now; returns products changed"""
+    now = now or timezone.now()
+    with transaction.atomic():
+        adjustment = PriceAdjustment.objects.select_for_update().get(pk=adjustment.pk)
+        if adjustment.status != 'scheduled':
+            return 0
+        changed = adjust_prices(
+            adjustment.products(), adjustment.kind, adjustment.value,
+            effective_at=now, adjustment=adjustment,
+        )
+        adjustment.status = 'applied'
+        adjustment.applied_at = now
+        adjustment.products_changed = changed
+        adjustment.save(update_fields=['status', 'applied_at', 'products_changed'])
+    return changed
+
+
+def apply_due_adjustments(now=None):
+    """Apply every scheduled adjustment whose time has come, oldest first"""
+    now = now or timezone.now()
+    due = PriceAdjustment.objects.filter(status='scheduled', effective_at__lte=now).order_by('effective_at', 'pk')
+    return [(adjustment, apply_adjustment(adjustment, now)) for adjustment in due]
+
+
+def price_at(product, when):
+    """The product's price at ``when``, from its history (current price if unchanged since)"""
+    later = PriceHistory.objects.filter(product=product, effective_at__gt=when).order_by('effective_at', 'id').first()
+    return later.old_price if later else product.price
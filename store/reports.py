@@ -0,0 +1,148 @@
+"""
+Sales reporting from pre-aggregated daily rollups.
+
+``DailySalesRollup`` holds one row per (day, region, category, product) with
+the order lines, units and revenue of every order that was not cancelled.
+Reports and exports read only these rows, so a year of sales is a few
+thousand rows instead of every order item.
+
+``refresh_rollups()`` (``manage.py rollup_sales``) is incremental. It finds
+the days of orders whose ``updated`` timestamp is past the last watermark
+and rebuilds those whole days from the raw rows, so edits, item changes
+(which touch ``Order.updated``, see ``OrderQuerySet.refresh_totals``) and
+cancellations are all picked up. The watermark is moved back by
+``SALES_ROLLUP_OVERLAP_MINUTES`` on each run to catch transactions that
+committed late. Deleted orders leave no trace to find; run with
+``--rebuild`` after deleting orders.
+"""
+from datetime import timedelta
+from decimal import Decimal
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+from .models import DailySalesRollup, Order, OrderItem, Product, ReportWatermark
+
+WATERMARK = 'daily_sales'
+EXCLUDED_STATUSES = ('cancelled',)
+
+MONEY = DecimalField(max_digits=14, decimal_places=2)
+
+# Report groupings: the rollup columns each one is keyed on
+GROUPINGS = {
+    'day': ('day',),
+    'region': ('region',),
+    'category': ('category_id', 'category__name'),
+    'product': ('product_id', 'product__name', 'category__name'),
+}
+
+
+def _overlap():
+    return timedelta(minutes=getattr(settings, 'SALES_ROLLUP_OVERLAP_MINUTES', 10))
+
+
+def _days_per_batch():
+    return getattr(settings, 'SALES_ROLLUP_DAYS_PER_BATCH', 31)
+
+
+def _sold_items(days=None):
+    items = OrderItem.objects.exclude(order__status__in=EXCLUDED_STATUSES)
+    if days is not None:
+        items = items.filter(order__created__date__in=days)
+    return items.annotate(day=TruncDate('order__created')).values(
+        'day', 'order__region', 'product__category_id', 'product_id'
+    ).annotate(
+        lines=Count('id'),
+        units=Sum('quantity'),
+        revenue=Sum(ExpressionWrapper(F('price') * F('quantity'), output_field=MONEY)),
+    ).order_by()
+
+
+def rebuild_days(days):
+    """Replace the rollup rows of ``days`` with fresh aggregates; returns rows written"""
+    days = sorted(days)
+    written = 0
+    for start in range(0, len(days), _days_per_batch()):
+        batch = days[start:start + _days_per_batch()]
+        with transaction.atomic():
+            DailySalesRollup.objects.filter(day__in=batch).delete()
+            written += len(DailySalesRollup.objects.bulk_create([
+                DailySalesRollup(
+                    day=row['day'],
+                    region=row['order__region'],
+                    category_id=row['product__category_id'],
+                    product_id=row['product_id'],
+                    order_lines=row['lines'],
+                    units_sold=row['units'],
+                    revenue=row['revenue'],
+                )
+                for row in _sold_items(batch)
+            ], batch_size=500))
+    return written
+
+
+def refresh_rollups(rebuild=False, since=None):
+    """
+    Bring the rollups up to date and move the watermark. ``since`` forces
+    the days of every order changed after that moment to be rebuilt.
+    Returns {'orders', 'days', 'rows'}.
+    """
+    started = timezone.now()
+    watermark, _ = ReportWatermark.objects.get_or_create(name=WATERMARK)
+
+    if rebuild:
+        changed = Order.objects.all()
+        DailySalesRollup.objects.all().delete()
+    else:
+        if since is None and watermark.processed_until is not None:
+            since = watermark.processed_until - _overlap()
+        changed = Order.objects.all() if since is None else Order.objects.filter(updated__gte=since)
+
+    days = list(changed.dates('created', 'day'))
+    rows = rebuild_days(days)
+
+    watermark.processed_until = started
+    watermark.save(update_fields=['processed_until'])
+    return {'orders': changed.count(), 'days': len(days), 'rows': rows}
+
+
+def summarize(rollups, by):
+    """Totals of a (filtered) rollup queryset grouped by one of GROUPINGS"""
+    fields = GROUPINGS[by]
+    ordering = ['day'] if by == 'day' else ['-revenue']
+    return rollups.values(*fields).annotate(
+        lines=Sum('order_lines'),
+        units=Sum('units_sold'),
+        revenue=Sum('revenue'),
+    ).order_by(*ordering)
+
+
+def totals(rollups):
+    return rollups.aggregate(
+        lines=Coalesce(Sum('order_lines'), 0),
+        units=Coalesce(Sum('units_sold'), 0),
+        revenue=Coalesce(Sum('revenue'), Decimal('0.00'), output_field=MONEY),
+    )
+
+
+def inventory_summary():
+    """Products, units and stock value on hand per category (live, one query)"""
+    return Product.objects.filter(available=True).values('category__name').annotate(
+        products=Count('id'),
+        units=Coalesce(Sum('stock'), 0),
+        value=Coalesce(
+            Sum(ExpressionWrapper(F('price') * F('stock'), output_field=MONEY)),
+            Decimal('0.00'),
+            output_field=MONEY
+        ),
+    ).order_by('-value')
+
+
+def with_bars(rows, field='revenue'):
+    """Add a 0-100 ``bar`` width to each row for the admin charts"""
+    rows = list(rows)
+    peak = max((row[field] or 0 for row in rows), default=0)
+    for row in rows:
+        row['bar'] = round(100 * (row[field] or 0) / peak) if peak else 0
+    return rows
@@ -0,0 +1,248 @@
+"""
+Product search behind the ``q`` parameter of ``product_list``.
+
+On PostgreSQL queries run against ``Product.search_vector`` (GIN indexed and
+weighted name > spec values > description) and are ordered by
+``SearchRank``. Other databases use an in-process inverted index built from
+the same fields. Both backends AND the query terms together and match each
+term as a prefix, so "JZC350" finds "Concrete Mixer JZC350-DH".
+
+The local index is rebuilt lazily: every process rebuilds its index the
+next time it sees a new catalog generation (see ``invalidation.py``).
+"""
+import bisect
+import logging
+import math
+import re
+import threading
+from collections import defaultdict
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Case, F, IntegerField, Value, When
+from . import invalidation
+from .models import Product, TechnicalSpecification
+
+logger = logging.getLogger(__name__)
+
+SEARCH_CONFIG = 'simple'
+
+# Field weights for the local index (PostgreSQL uses A/B/C weights)
+FIELD_WEIGHTS = {
+    'name': 3.0,
+    'spec': 2.0,
+    'description': 1.0,
+}
+PREFIX_MATCH_FACTOR = 0.6
+MAX_QUERY_TERMS = 8
+
+WORD_RE = re.compile(r'[^\W_]+(?:[-/.][^\W_]+)*')
+PART_SPLIT_RE = re.compile(r'[-/.]')
+ALNUM_RUN_RE = re.compile(r'[^\W\d_]+|\d+')
+
+
+def _max_results():
+    return getattr(settings, 'SEARCH_MAX_RESULTS', 500)
+
+
+def using_postgres():
+    return connection.vendor == 'postgresql'
+
+
+def tokenize(text):
+    """Split text into index terms, keeping model codes searchable"""
+    tokens = []
+    for word in WORD_RE.findall((text or '').lower()):
+        parts = PART_SPLIT_RE.split(word)
+        tokens.extend(parts)
+        if len(parts) > 1:
+            # "jzc350-dh" is also indexed as "jzc350dh"
+            tokens.append(''.join(parts))
+        for part in parts:
+            runs = ALNUM_RUN_RE.findall(part)
+            if len(runs) > 1:
+                # "jzc350" is also indexed as "jzc" and "350"
+                tokens.extend(runs)
+    return tokens
+
+
+def query_terms(query):
+    """Split a user query into at most MAX_QUERY_TERMS distinct terms"""
+    terms = []
+    for word in WORD_RE.findall((query or '').lower()):
+        for part in PART_SPLIT_RE.split(word):
+            if part and part not in terms:
+                terms.append(part)
+    return terms[:MAX_QUERY_TERMS]
+
+
+class InvertedIndex:
+    """Weighted term -> {product_id: score} postings with prefix lookup"""
+
+    def __init__(self):
+        self.postings = defaultdict(dict)
+        self.terms = []
+        self.doc_count = 0
+
+    @classmethod
+    def build(cls):
+        index = cls()
+        specs = defaultdict(list)
+        for product_id, spec_value in TechnicalSpecification.objects.filter(
+            product__available=True
+        ).values_list('product_id', 'spec_value'):
+            specs[product_id].append(spec_value)
+
+        products = Product.objects.filter(available=True).values_list('id', 'name', 'description')
+        for product_id, name, description in products.iterator(chunk_size=2000):
+            index.add(product_id, {
+                'name': name,
+                'spec': ' '.join(specs.get(product_id, ())),
+                'description': description,
+            })
+        index.terms = sorted(index.postings)
+        return index
+
+    def add(self, product_id, fields):
+        frequencies = defaultdict(float)
+        for field, text in fields.items():
+            for token in tokenize(text):
+                frequencies[token] += FIELD_WEIGHTS[field]
+        for token, frequency in frequencies.items():
+            self.postings[token][product_id] = 1 + math.log(frequency)
+        self.doc_count += 1
+
+    def _idf(self, term):
+        return math.log(1 + self.doc_count / len(self.postings[term]))
+
+    def _matches(self, query_term):
+        """Score every product matching one query term exactly or by prefix"""
+        scores = {}
+        start = bisect.bisect_left(self.terms, query_term)
+        for term in self.terms[start:]:
+            if not term.startswith(query_term):
+                break
+            factor = 1.0 if term == query_term else PREFIX_MATCH_FACTOR
+            idf = self._idf(term)
+            for product_id, weight in self.postings[term].items():
+                score = weight * idf * factor
+                if score > scores.get(product_id, 0):
+                    scores[product_id] = score
+        return scores
+
+    def search(self, query, limit=None):
+        """Return product ids matching every query term, best first"""
+        totals = None
+        for term in query_terms(query):
+            matches = self._matches(term)
+            if totals is None:
+                totals = matches
+            else:
+                totals = {
+                    product_id: score + matches[product_id]
+                    for product_id, score in totals.items()
+                    if product_id in matches
+                }
+            if not totals:
+                return []
+        if not totals:
+            return []
+        ranked = sorted(totals.items(), key=lambda item: (-item[1], item[0]))
+        return [product_id for product_id, _ in ranked[:limit or _max_results()]]
+
+
+_local_index = None
+_local_index_version = None
+_local_index_lock = threading.Lock()
+
+
+def get_local_index():
+    """Return this process's inverted index, rebuilding it if the catalog changed"""
+    global _local_index, _local_index_version
+    version = invalidation.generation()
+    fresh = _local_index is not None and _local_index_version == version
+    invalidation.record('search_index', fresh)
+    if not fresh:
+        with _local_index_lock:
+            if _local_index is None or _local_index_version != version:
+                _local_index = InvertedIndex.build()
+                _local_index_version = version
+                logger.info(f"Built local search index: {_local_index.doc_count} products, {len(_local_index.terms)} terms")
+    return _local_index
+
+
+def _postgres_search(queryset, terms):
+    from django.contrib.postgres.search import SearchQuery, SearchRank
+
+    search_query = SearchQuery(
+        ' & '.join(f'{term}:*' for term in terms),
+        search_type='raw',
+        config=SEARCH_CONFIG
+    )
+    return queryset.filter(search_vector=search_query).annotate(
+        rank=SearchRank(F('search_vector'), search_query)
+    ).order_by('-rank', 'id')
+
+
+def _local_search(queryset, query):
+    product_ids = get_local_index().search(query)
+    if not product_ids:
+        return queryset.none()
+    position = Case(
+        *[When(pk=product_id, then=Value(i)) for i, product_id in enumerate(product_ids)],
+        output_field=IntegerField()
+    )
+    return queryset.filter(pk__in=product_ids).order_by(position)
+
+
+def search_products(queryset, query):
+    """Filter ``queryset`` to products matching ``query``, ordered by relevance"""
+    terms = query_terms(query)
+    if not terms:
+        return queryset.none()
+    if using_postgres():
+        return _postgres_search(queryset, terms)
+    return _local_search(queryset, query)
+
+
+def update_search_vector(product_id):
+    """Recompute one product's stored search vector (PostgreSQL only)"""
+    if not using_postgres():
+        return
+    from django.contrib.postgres.search import SearchVector
+    from django.db.models import CharField
+
+    spec_text = ' '.join(
+        TechnicalSpecification.objects.filter(product_id=product_id).values_list('spec_value', flat=True)
+    )
+    Product.objects.filter(pk=product_id).update_denormalized(
+        search_vector=(
+            SearchVector('name', weight='A', config=SEARCH_CONFIG)
+            + SearchVector(Value(spec_text, output_field=CharField()), weight='B', config=SEARCH_CONFIG)
+            + SearchVector('description', weight='C', config=SEARCH_CONFIG)
+        )
+    )
+
+
+REBUILD_SEARCH_VECTORS_SQL = f"""
+    UPDATE store_product SET search_vector =
+        setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('{SEARCH_CONFIG}', coalesce((
+            SELECT string_agg(spec_value, ' ')
+            FROM store_technicalspecification
+            WHERE product_id = store_product.id
+        ), '')), 'B') ||
+        setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(description, '')), 'C')
+"""
+
+
+def rebuild_search_vectors(product_ids=None):
+    """Recompute search vectors in one statement, optionally only for ``product_ids`` (PostgreSQL only)"""
+    if not using_postgres():
+        return 0
+    with connection.cursor() as cursor:
+        if product_ids is None:
+            cursor.execute(REBUILD_SEARCH_VECTORS_SQL)
+        else:
+            cursor.execute(REBUILD_SEARCH_VECTORS_SQL + ' WHERE id = ANY(%s)', [list(product_ids)])
+        return cursor.rowcount
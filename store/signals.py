@@ -0,0 +1,182 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from . import invalidation, placeholders, search
+from .models import (
+    Category, Order, OrderItem, PriceHistory, Product, ProductImage, SpecificationGroup, StockMovement,
+    TechnicalSpecification, Testimonial
+)
+
+
+@receiver(pre_save, sender=Testimonial)
+def remember_testimonial_rating_state(sender, instance, raw=False, **kwargs):
+    """Stash the stored (product, count, sum) contribution before it changes"""
+    instance._previous_rating_state = None
+    instance._previous_product_id = None
+    if raw or not instance.pk:
+        return
+    previous = sender.objects.filter(pk=instance.pk).values(
+        'product_id', 'approved', 'rating'
+    ).first()
+    if previous:
+        instance._previous_product_id = previous['product_id']
+    if previous and previous['approved']:
+        instance._previous_rating_state = (previous['product_id'], 1, previous['rating'])
+
+
+@receiver(post_save, sender=Testimonial)
+def update_product_rating_on_save(sender, instance, raw=False, **kwargs):
+    """Apply the difference between the old and new contribution"""
+    if raw:
+        return
+    previous = getattr(instance, '_previous_rating_state', None)
+    count, total = instance.rating_contribution
+
+    if previous and previous[0] != instance.product_id:
+        # Testimonial moved to another product
+        Product.apply_rating_delta(previous[0], -previous[1], -previous[2])
+        invalidation.invalidate_leaderboard()
+        previous = None
+
+    old_count, old_total = (previous[1], previous[2]) if previous else (0, 0)
+    if Product.apply_rating_delta(instance.product_id, count - old_count, total - old_total):
+        invalidation.invalidate_leaderboard()
+    instance._previous_rating_state = None
+
+
+@receiver(post_delete, sender=Testimonial)
+def update_product_rating_on_delete(sender, instance, **kwargs):
+    count, total = instance.rating_contribution
+    if Product.apply_rating_delta(instance.product_id, -count, -total):
+        invalidation.invalidate_leaderboard()
+
+
+@receiver(pre_save, sender=Product)
+def remember_product_listing_state(sender, instance, raw=False, **kwargs):
+    """Stash the stored (category, available) pair and price before they change"""
+    instance._previous_listing_state = None
+    instance._previous_price = None
+    if raw or instance._state.adding:
+        return
+    previous = sender.objects.filter(pk=instance.pk).values_list(
+        'category_id', 'available', 'price'
+    ).first()
+    if previous:
+        instance._previous_listing_state = previous[:2]
+        instance._previous_price = previous[2]
+
+
+@receiver(post_save, sender=Product)
+def update_category_count_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous_listing_state', None) or (None, False)
+    if previous == (instance.category_id, instance.available):
+        return
+    if previous[1]:
+        Category.objects.adjust_product_count(previous[0], -1)
+    if instance.available:
+        Category.objects.adjust_product_count(instance.category_id, 1)
+
+
+@receiver(post_save, sender=Product)
+def record_price_change(sender, instance, raw=False, **kwargs):
+    previous = getattr(instance, '_previous_price', None)
+    if raw or previous is None or previous == instance.price:
+        return
+    PriceHistory.objects.create(product=instance, old_price=previous, new_price=instance.price, source='edit')
+    instance._previous_price = instance.price
+
+
+@receiver(post_save, sender=Product)
+def record_initial_stock(sender, instance, created=False, raw=False, **kwargs):
+    """Open the ledger of a new product with the stock it was created with"""
+    if raw or not created or not instance.stock:
+        return
+    StockMovement.objects.create(product=instance, kind='receipt', quantity=instance.stock, note='Initial stock')
+
+
+@receiver(post_delete, sender=Product)
+def update_category_count_on_delete(sender, instance, **kwargs):
+    if instance.available:
+        Category.objects.adjust_product_count(instance.category_id, -1)
+
+
+@receiver(post_save, sender=Product)
+def refresh_product_search_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    search.update_search_vector(instance.pk)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_save, sender=Category)
+def refresh_image_placeholder(sender, instance, raw=False, **kwargs):
+    """Replace the placeholder of a new or changed image (see placeholders.py)"""
+    if raw:
+        return
+    placeholders.image_saved(instance)
+
+
+@receiver(post_save, sender=TechnicalSpecification)
+@receiver(post_delete, sender=TechnicalSpecification)
+def refresh_spec_search(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    search.update_search_vector(instance.product_id)
+
+
+@receiver(pre_save, sender=TechnicalSpecification)
+@receiver(pre_save, sender=ProductImage)
+def remember_parent_product(sender, instance, raw=False, **kwargs):
+    """Stash the stored product so moving a row invalidates both products"""
+    instance._previous_product_id = None
+    if raw or instance._state.adding:
+        return
+    instance._previous_product_id = sender.objects.filter(pk=instance.pk).values_list(
+        'product_id', flat=True
+    ).first()
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Testimonial)
+@receiver(post_delete, sender=Testimonial)
+@receiver(post_save, sender=TechnicalSpecification)
+@receiver(post_delete, sender=TechnicalSpecification)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_save, sender=SpecificationGroup)
+@receiver(post_delete, sender=SpecificationGroup)
+def invalidate_cached_catalog(sender, instance, raw=False, **kwargs):
+    """Bump the cache generations this write affects (see invalidation.py)"""
+    if raw:
+        return
+    previous_listing = getattr(instance, '_previous_listing_state', None) or (None, None)
+    invalidation.invalidate_instance(
+        instance,
+        previous_product_id=getattr(instance, '_previous_product_id', None),
+        previous_category_id=previous_listing[0],
+    )
+
+
+@receiver(pre_save, sender=OrderItem)
+def remember_item_order(sender, instance, raw=False, **kwargs):
+    """Stash the stored order so moving an item refreshes both orders' totals"""
+    instance._previous_order_id = None
+    if raw or instance._state.adding:
+        return
+    instance._previous_order_id = sender.objects.filter(pk=instance.pk).values_list(
+        'order_id', flat=True
+    ).first()
+
+
+@receiver(post_save, sender=OrderItem)
+@receiver(post_delete, sender=OrderItem)
+def refresh_order_totals(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    order_ids = {instance.order_id, getattr(instance, '_previous_order_id', None)} - {None}
+    Order.objects.filter(pk__in=order_ids).refresh_totals()
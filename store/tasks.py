@@ -0,0 +1,40 @@
+"""
+Background tasks (see store/jobs.py).
+
+Imported by ``StoreConfig.ready()`` so the web process and the
+``run_jobs`` workers share one registry.
+"""
+from django.apps import apps
+from django.core.mail import EmailMultiAlternatives
+from . import events, jobs, placeholders
+
+
+@jobs.task('send_email')
+def send_email(subject, body, to, from_email=None, html=None):
+    """Send one email; SMTP errors and timeouts are retried by the queue"""
+    message = EmailMultiAlternatives(subject, body, from_email, to)
+    if html:
+        message.attach_alternative(html, 'text/html')
+    message.send()
+
+
+def queue_email(subject, body, to, from_email=None, html=None, key=None):
+    """Send an email from a job instead of inside the request"""
+    return jobs.enqueue('send_email', {
+        'subject': subject, 'body': body, 'to': list(to), 'from_email': from_email, 'html': html,
+    }, key=key)
+
+
+@jobs.task('image_placeholder', max_attempts=3)
+def image_placeholder(model, pk):
+    placeholders.refresh_image(apps.get_model(model), pk)
+
+
+@jobs.task('order_event')
+def order_event(event, order_id):
+    events.fan_out(event, order_id)
+
+
+@jobs.task('deliver_order_event', max_attempts=8)
+def deliver_order_event(sink, event, payload):
+    events.deliver(sink, event, payload)
@@ -0,0 +1,51 @@
+from django import template
+from django.utils.safestring import mark_safe
+from store import fragment_cache
+
+register = template.Library()
+
+
+class CatalogCacheNode(template.Node):
+    def __init__(self, nodelist, fragment_name, vary_on, scopes):
+        self.nodelist = nodelist
+        self.fragment_name = fragment_name
+        self.vary_on = vary_on
+        self.scopes = scopes
+
+    def render(self, context):
+        vary_on = [var.resolve(context) for var in self.vary_on]
+        scopes = {name: var.resolve(context) for name, var in self.scopes.items()}
+
+        def render_nodelist(csrf_placeholder):
+            with context.push(csrf_token=csrf_placeholder):
+                return self.nodelist.render(context)
+
+        return mark_safe(fragment_cache.render_fragment(
+            self.fragment_name, vary_on, render_nodelist, context.get('csrf_token'), **scopes
+        ))
+
+
+@register.tag('catalog_cache')
+def do_catalog_cache(parser, token):
+    """
+    Cache a catalog fragment until the product and/or category it shows
+    changes (the whole catalog if neither is given)::
+
+        {% catalog_cache 'product_card' product=product.id category=product.category_id %}
+        ...
+        {% endcatalog_cache %}
+    """
+    nodelist = parser.parse(('endcatalog_cache',))
+    parser.delete_first_token()
+    bits = token.split_contents()
+    if len(bits) < 2:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' tag requires a fragment name.")
+    fragment_name = bits[1].strip('\'"')
+    vary_on, scopes = [], {}
+    for bit in bits[2:]:
+        name, sep, value = bit.partition('=')
+        if sep and name in ('product', 'category'):
+            scopes[name] = parser.compile_filter(value)
+        else:
+            vary_on.append(parser.compile_filter(bit))
+    return CatalogCacheNode(nodelist, fragment_name, vary_on, scopes)
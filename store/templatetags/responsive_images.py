@@ -0,0 +1,41 @@
+from django import template
+from django.forms.utils import flatatt
+from django.utils.html import format_html
+from store import images
+
+register = template.Library()
+
+
+@register.simple_tag
+def responsive_image(image, slot, **attrs):
+    """
+    Render an <img> of a Cloudinary image for a slot in ``store.images.SLOTS``:
+
+        {% responsive_image product 'card' alt=product.name class="card-img-top" %}
+
+    Given the model (``product``) rather than its ``image``, the stored
+    placeholder is inlined too: intrinsic ``width``/``height`` and a
+    background of the dominant colour and preview (see store/placeholders.py).
+    Extra keyword arguments become attributes, with underscores turned into
+    dashes (``data_bs_toggle="modal"``); a ``style`` is added after the
+    placeholder's. Images load lazily unless ``loading="eager"`` is given.
+    Renders nothing without an image.
+    """
+    tag = {'loading': 'lazy', 'decoding': 'async'}
+    if hasattr(image, 'placeholder_attrs'):
+        tag.update(image.placeholder_attrs())
+        image = image.image
+    if not image:
+        return ''
+    tag.update(images.img_attrs(image, slot))
+    style = attrs.pop('style', None)
+    tag.update({name.replace('_', '-'): value for name, value in attrs.items()})
+    if style:
+        tag['style'] = f"{tag['style']}; {style}" if 'style' in tag else style
+    return format_html('<img{}>', flatatt(tag))
+
+
+@register.filter
+def image_url(image, slot):
+    """Largest URL of a Cloudinary image for ``slot``, e.g. for JavaScript: ``{{ product.image|image_url:'zoom' }}``"""
+    return images.url(image, slot)
@@ -0,0 +1,162 @@
+"""
+Search-as-you-type suggestions served from a per-process prefix trie.
+
+The trie is built over category names, product names and technical spec
+values. Every node keeps the best ``NODE_CAPACITY`` entries reachable below
+it, so a one-word lookup walks at most ``len(prefix)`` nodes and never
+touches the database. Nodes also keep the entries whose words end there, so
+a multi-word query can collect every entry under its rarest prefix and
+filter those by the other words. The trie is rebuilt lazily when the
+catalog generation changes; the generation comes from this process's copy
+of the tokens (see ``invalidation.py``), so a keystroke normally costs no
+cache round trip either.
+"""
+import logging
+import threading
+from urllib.parse import urlencode
+from django.urls import reverse
+from . import invalidation, search
+from .models import Category, Product, TechnicalSpecification
+
+logger = logging.getLogger(__name__)
+
+NODE_CAPACITY = 20
+MAX_LABEL_LENGTH = 80
+
+# Lower sorts first when several entries share a prefix
+KIND_PRIORITY = {
+    'category': 0,
+    'product': 1,
+    'spec': 2,
+}
+
+
+class TrieNode:
+    __slots__ = ('children', 'entries', 'postings', 'size')
+
+    def __init__(self):
+        self.children = {}
+        # Best entries below this node, entries whose word ends here, and
+        # how many words end below it
+        self.entries = []
+        self.postings = []
+        self.size = 0
+
+
+class SuggestionTrie:
+    def __init__(self):
+        self.root = TrieNode()
+        self.entries = []
+        self.tokens = []
+
+    @classmethod
+    def build(cls):
+        trie = cls()
+        candidates = []
+
+        for name, slug, service_type in Category.objects.values_list('name', 'slug', 'service_type'):
+            if service_type:
+                url = reverse('store:service_category', args=[slug])
+            else:
+                url = reverse('store:product_list_by_category', args=[slug])
+            candidates.append(('category', name, url, 0))
+
+        products = Product.objects.filter(available=True).values_list('name', 'slug', 'featured')
+        for name, slug, featured in products.iterator(chunk_size=2000):
+            url = reverse('store:product_detail', args=[slug])
+            candidates.append(('product', name, url, 0 if featured else 1))
+
+        product_list_url = reverse('store:product_list')
+        spec_values = TechnicalSpecification.objects.filter(
+            product__available=True
+        ).values_list('spec_value', flat=True).distinct()
+        for value in spec_values:
+            url = f"{product_list_url}?{urlencode({'q': value})}"
+            candidates.append(('spec', value, url, 0))
+
+        candidates.sort(key=lambda c: (KIND_PRIORITY[c[0]], c[3], len(c[1]), c[1].lower()))
+        seen = set()
+        for kind, label, url, _ in candidates:
+            key = (kind, label.lower())
+            if key in seen:
+                continue
+            seen.add(key)
+            trie.add(kind, label[:MAX_LABEL_LENGTH], url)
+        return trie
+
+    def add(self, kind, label, url):
+        """Insert an entry; callers add entries best-first"""
+        entry_id = len(self.entries)
+        tokens = set(search.query_terms(label)) | set(search.tokenize(label))
+        self.entries.append({'label': label, 'type': kind, 'url': url})
+        self.tokens.append(tokens)
+        for token in tokens:
+            node = self.root
+            for char in token:
+                node = node.children.setdefault(char, TrieNode())
+                node.size += 1
+                if len(node.entries) < NODE_CAPACITY and entry_id not in node.entries:
+                    node.entries.append(entry_id)
+            node.postings.append(entry_id)
+
+    def _node(self, prefix):
+        node = self.root
+        for char in prefix:
+            node = node.children.get(char)
+            if node is None:
+                return None
+        return node
+
+    @staticmethod
+    def _all_entries(node):
+        """Every entry with a word under ``node``, best first"""
+        if len(node.entries) < NODE_CAPACITY:
+            return node.entries
+        found, stack = set(), [node]
+        while stack:
+            node = stack.pop()
+            found.update(node.postings)
+            stack.extend(node.children.values())
+        return sorted(found)
+
+    def suggest(self, query, limit):
+        """Return entries whose words start with every term of ``query``"""
+        terms = search.query_terms(query)
+        nodes = [self._node(term) for term in terms]
+        if not nodes or None in nodes:
+            return []
+        if len(nodes) == 1:
+            return [self.entries[entry_id] for entry_id in nodes[0].entries[:limit]]
+        rarest = min(nodes, key=lambda node: node.size)
+        results = []
+        for entry_id in self._all_entries(rarest):
+            tokens = self.tokens[entry_id]
+            if all(any(token.startswith(term) for token in tokens) for term in terms):
+                results.append(self.entries[entry_id])
+                if len(results) >= limit:
+                    break
+        return results
+
+
+_trie = None
+_trie_version = None
+_trie_lock = threading.Lock()
+
+
+def get_trie():
+    """Return this process's trie, rebuilding it if the catalog changed"""
+    global _trie, _trie_version
+    version = invalidation.generation()
+    fresh = _trie is not None and _trie_version == version
+    invalidation.record('typeahead', fresh)
+    if not fresh:
+        with _trie_lock:
+            if _trie is None or _trie_version != version:
+                _trie = SuggestionTrie.build()
+                _trie_version = version
+                logger.info(f"Built typeahead trie: {len(_trie.entries)} entries")
+    return _trie
+
+
+def suggest(query, limit=8):
+    return get_trie().suggest(query, limit)
@@ -9,6 +9,7 @@ app_name = 'store'
 urlpatterns = [
     path('', views.index, name='index'),
     path('products/', views.product_list, name='product_list'),
+    path('products/suggest/', views.search_suggestions, name='search_suggestions'),
     path('products/category/<slug:category_slug>/', views.product_list, name='product_list_by_category'),
     path('product/<slug:slug>/', views.product_detail, name='product_detail'),
     path('login/', LoginView.as_view(template_name='auth/login.html', redirect_authenticated_user=True), name='login'),
@@ -16,6 +17,7 @@ urlpatterns = [
     path('register/', views.register, name='register'),
     path('products/<int:product_id>/review/', views.add_review, name='add_review'),
     path('admin-redirect/', views.redirect_to_admin, name='admin_redirect'),
+    path('jobs/run/', views.run_jobs, name='run_jobs'),
     
     # Firebase OTP endpoints
     path('resend-verification/', views.resend_verification, name='resend_verification'),
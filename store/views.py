@@ -1,6 +1,5 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.core.paginator import Paginator
-from django.db.models import Q, Avg, Count
 from django.contrib.auth import login, authenticate
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.views import LoginView, LogoutView
@@ -8,6 +7,8 @@ from django.contrib.auth.decorators import login_required,user_passes_test
 from django.contrib import messages
 from django.db import transaction, IntegrityError
 from .models import Category, Product, Testimonial, UserProfile
+from .pagination import PRODUCT_ORDERING, CursorPaginator
+from . import facets, jobs, leaderboard, search, typeahead
 from cart.forms import CartAddProductForm
 from .forms import RegistrationForm, VerificationForm
 import random
@@ -17,11 +18,13 @@ import json
 from .firebase_utils import send_firebase_otp, verify_firebase_otp, format_phone_for_firebase
 import time
 from django.contrib.auth import get_user_model
-from django.http import JsonResponse
+from django.http import HttpResponseForbidden, JsonResponse
 from django.views.decorators.csrf import csrf_exempt
-from django.views.decorators.http import require_POST
+from django.views.decorators.http import require_GET, require_POST
 from django.conf import settings
 from django.views.decorators.csrf import ensure_csrf_cookie
+from django.utils.cache import patch_cache_control
+from django.utils.crypto import constant_time_compare
 import os
 User = get_user_model()
 logger = logging.getLogger(__name__)
@@ -125,13 +128,9 @@ def index(request):
         service_type__isnull=False
     ).exclude(service_type='').order_by('display_order', 'name')[:50]
     
-    print("🔍 DEBUG - Service categories in index view:")
-    for i, cat in enumerate(service_categories):
-        print(f"   {i+1}. {cat.name} (slug: {cat.slug})")
-    print(f"   Total categories found: {service_categories.count()}")
-    
+    # Querysets stay lazy so cached homepage fragments skip them entirely
     featured_products = Product.objects.filter(featured=True, available=True)[:8]
-    testimonials = Testimonial.objects.filter(approved=True).order_by('-created')[:4]
+    testimonials = Testimonial.objects.filter(approved=True).select_related('product').order_by('-created')[:4]
     
     context = {
         'featured_categories': service_categories,
@@ -143,7 +142,7 @@ def index(request):
 def product_list(request, category_slug=None):
     category = None
     categories = Category.objects.all()
-    products = Product.objects.filter(available=True).select_related('category').order_by('id')
+    products = Product.objects.filter(available=True).select_related('category').order_by(*PRODUCT_ORDERING)
     
     if category_slug:
         category = get_object_or_404(Category, slug=category_slug)
@@ -151,20 +150,30 @@ def product_list(request, category_slug=None):
     
     query = request.GET.get('q')
     if query:
-        products = products.filter(
-            Q(name__icontains=query) | 
-            Q(description__icontains=query)
-        )
+        products = search.search_products(products, query)
     
-    paginator = Paginator(products, 12)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Facet counts come from one cached grouped query over the unfiltered listing
+    filters = facets.normalize_filters(request.GET)
+    facet_data = facets.build_facets(
+        products, filters, facets.scope_key(category.id if category else None, query), query
+    )
+    products = facets.apply_filters(products, filters)
     
-    top_rated_products = Product.objects.filter(
-        testimonials__approved=True
-    ).annotate(
-        avg_rating=Avg('testimonials__rating')
-    ).order_by('-avg_rating')[:3]
+    # Opt-in keyset pagination: no COUNT(*) and no OFFSET, so deep pages cost
+    # the same as page 1. Search results keep offset pages (relevance order).
+    use_cursor = not query and (
+        'cursor' in request.GET or getattr(settings, 'PRODUCT_LIST_CURSOR_PAGINATION', False)
+    )
+    page_range = None
+    if use_cursor:
+        page_obj = CursorPaginator(products, 12).get_page(request.GET.get('cursor'))
+    else:
+        paginator = Paginator(products, 12)
+        page_number = request.GET.get('page')
+        page_obj = paginator.get_page(page_number)
+        page_range = paginator.get_elided_page_range(page_obj.number, on_each_side=4, on_ends=1)
+    
+    top_rated_products = leaderboard.get_top_rated(category.id if category else None)
     
     product_forms = {product.id: CartAddProductForm(initial={'quantity': 1, 'override': False}) for product in page_obj}
     
@@ -172,48 +181,72 @@ def product_list(request, category_slug=None):
         'category': category,
         'categories': categories,
         'products': page_obj,
+        'page_range': page_range,
+        'facets': facet_data,
+        'filter_querystring': facets.querystring(filters),
         'query': query,
         'top_rated_products': top_rated_products,
         'product_forms': product_forms,
     }
     return render(request, 'store/index.html', context)
 
+@require_GET
+def search_suggestions(request):
+    """Typeahead suggestions as compact JSON, served from the in-memory trie"""
+    query = request.GET.get('q', '').strip()
+    try:
+        limit = min(max(int(request.GET.get('limit', 8)), 1), 10)
+    except ValueError:
+        limit = 8
+
+    suggestions = typeahead.suggest(query, limit) if len(query) >= 2 else []
+    response = JsonResponse(
+        {'query': query, 'suggestions': suggestions},
+        json_dumps_params={'separators': (',', ':'), 'ensure_ascii': False}
+    )
+    patch_cache_control(response, public=True, max_age=60)
+    return response
+
+@require_GET
+def run_jobs(request):
+    """
+    Run due background jobs (see store/jobs.py) for hosts without a worker
+    process. The Vercel cron in vercel.json calls this every minute with
+    ``Authorization: Bearer <CRON_SECRET>``; without the secret it is closed.
+    """
+    secret = getattr(settings, 'JOB_CRON_SECRET', '')
+    authorization = request.headers.get('Authorization', '')
+    if not secret or not constant_time_compare(authorization, f'Bearer {secret}'):
+        return HttpResponseForbidden()
+    succeeded, failed = jobs.run_due(limit=getattr(settings, 'JOB_CRON_LIMIT', 20))
+    response = JsonResponse({'succeeded': succeeded, 'failed': failed, 'purged': jobs.purge()})
+    patch_cache_control(response, no_store=True)
+    return response
+
 def product_detail(request, slug):
     product = get_object_or_404(
-        Product.objects.select_related('category')
-                      .prefetch_related('images', 'testimonials', 'technical_specs'),
+        Product.objects.select_related('category'),
         slug=slug, 
         available=True
     )
     
     cart_product_form = CartAddProductForm(initial={'quantity': 1, 'override': False})
-    approved_testimonials = product.testimonials.filter(approved=True)
-    avg_rating = approved_testimonials.aggregate(avg_rating=Avg('rating'))['avg_rating'] or 0
-    review_count = approved_testimonials.count()
     
+    # Left as lazy querysets: they are only evaluated when the cached
+    # fragments (reviews, specs, related products) have to be re-rendered
+    approved_testimonials = product.testimonials.filter(approved=True)
     related_products = Product.objects.filter(
         category=product.category, 
         available=True
     ).exclude(id=product.id)[:4]
     
-    related_products_with_ratings = []
-    for related_product in related_products:
-        related_approved = related_product.testimonials.filter(approved=True)
-        related_avg_rating = related_approved.aggregate(avg_rating=Avg('rating'))['avg_rating'] or 0
-        related_review_count = related_approved.count()
-        related_products_with_ratings.append({
-            'product': related_product,
-            'avg_rating': related_avg_rating,
-            'review_count': related_review_count,
-        })
-    
     context = {
         'product': product,
         'cart_product_form': cart_product_form,
-        'avg_rating': avg_rating,
-        'review_count': review_count,
+        'avg_rating': product.avg_rating,
+        'review_count': product.approved_review_count,
         'approved_testimonials': approved_testimonials,
-        'related_products_with_ratings': related_products_with_ratings,
+        'related_products': related_products,
     }
     return render(request, 'store/detail.html', context)
 
@@ -243,11 +276,7 @@ def store(request):
     building_materials = Product.objects.filter(product_type='material', available=True)[:50]
     construction_tools = Product.objects.filter(product_type='tool', available=True)[:50]
     categories = Category.objects.all()
-    top_rated_products = Product.objects.filter(
-        testimonials__approved=True
-    ).annotate(
-        avg_rating=Avg('testimonials__rating')
-    ).order_by('-avg_rating')[:3]
+    top_rated_products = leaderboard.get_top_rated()
     
     product_forms = {
         product.id: CartAddProductForm(initial={'quantity': 1, 'override': False})
@@ -731,13 +760,9 @@ def logout_view(request):
 
 def product_list_by_category(request, category_slug):
     category = get_object_or_404(Category, slug=category_slug)
-    products = Product.objects.filter(category=category, available=True).order_by('id')
+    products = Product.objects.filter(category=category, available=True).order_by(*PRODUCT_ORDERING)
     categories = Category.objects.all()
-    top_rated_products = Product.objects.filter(
-        testimonials__approved=True
-    ).annotate(
-        avg_rating=Avg('testimonials__rating')
-    ).order_by('-avg_rating')[:3]
+    top_rated_products = leaderboard.get_top_rated(category.id)
     
     product_forms = {product.id: CartAddProductForm(initial={'quantity': 1, 'override': False}) for product in products}
     
@@ -761,7 +786,7 @@ def service_category(request, category_slug):
     products = Product.objects.filter(
         category=category, 
         available=True
-    ).select_related('category').prefetch_related('testimonials')
+    ).select_related('category')
     
     # Use category's own icon and color properties, fallback to defaults
     icon = category.icon_class if category.icon_class else 'fa-box'
@@ -776,10 +801,13 @@ def service_category(request, category_slug):
     # Get featured products from this category
     featured_products = products.filter(featured=True)[:3]
     
-    # Get product types distribution for this category - FIXED: Use Count instead of models.Count
-    product_types = products.values('product_type').annotate(
-        count=Count('id')
-    ).order_by('-count')
+    # Product type distribution and total come from the cached facet counts
+    # (one grouped query shared with the product_list category page)
+    counts = facets.facet_counts(products, {}, facets.scope_key(category.id))
+    product_types = sorted(
+        ({'product_type': product_type, 'count': count} for product_type, count in counts['type'].items()),
+        key=lambda item: -item['count']
+    )
     
     context = {
         'category': category,
@@ -790,7 +818,7 @@ def service_category(request, category_slug):
         'related_categories': related_categories,
         'featured_products': featured_products,
         'product_types': product_types,
-        'product_count': products.count(),
+        'product_count': counts['total'],
     }
     
     return render(request, 'services/service_category.html', context)